@@ -10,7 +10,9 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Nothing here uses these; PIL was only ever imported, never used
+    excludes=['PIL', 'unittest', 'doctest', 'pydoc', 'pdb', 'lib2to3', 'tkinter.test', 'setuptools',
+              'pip', 'distutils', 'matplotlib', 'scipy', 'pandas', 'IPython'],
     noarchive=False,
     optimize=0,
 )
@@ -0,0 +1,442 @@
+"""
+Loopback benchmark for every VLC Stream Hub streaming mode.
+
+Runs headless on Linux. Servers are started by the app's own launcher
+(stream_launcher.start_server: same sout plan, argv, in-process services
+and session manager), but with fake_vlc.py in place of VLC, so results
+don't depend on codecs or a display. A swarm of 1..N clients in a child process reads each stream
+over loopback and reports time-to-first-byte, throughput and loss (every
+synthetic TS packet carries a counter). The server side is sampled from
+/proc for CPU and RSS, and teardown is timed from stop() to reap.
+
+    python bench.py                          # all modes, 1/4/16 clients
+    python bench.py --modes HTTP,RTP --clients 1,8 --output before.json
+    python bench.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_vlc import write_synthetic_file
+from hls_server import HLS_SEGMENT_SECONDS
+from mpegts import RTP_HEADER_SIZE, TS_PACKET_SIZE
+from multicast_pool import join_group
+from session_manager import SessionManager
+from stream_commands import MULTICAST_IP, client_url
+from stream_launcher import start_server as launch_server
+
+# --- BENCHMARK CONFIGURATION ---
+BENCH_MODES = ["HTTP", "HTTP Relay", "Direct HTTP", "HLS", "RTP", "UDP", "RTP native", "UDP native",
+               "UDP native remux"]
+BENCH_CLIENTS = (1, 4, 16)
+BENCH_DURATION = 5.0                 # seconds each client reads for
+BENCH_BITRATE = 8_000_000            # synthetic stream bitrate, bit/s
+BENCH_CONNECT_TIMEOUT = 10.0         # a client with no data after this long counts as failed
+BENCH_SAMPLE_INTERVAL = 0.25         # /proc sampling period
+BENCH_HOST = "127.0.0.1"
+FAKE_VLC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_vlc.py")
+
+# Metrics shown by --compare, with the direction that counts as better
+COMPARE_METRICS = {"ttfb_ms": "lower", "throughput_mbps": "higher", "loss_pct": "lower",
+                   "teardown_ms": "lower", "cpu_pct": "lower", "rss_mb": "lower"}
+
+_COUNTER = struct.Struct(">I")
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+# ================= CLIENT SWARM =================
+class _Reader:
+    # Per-client tallies. Loss comes from the packet counters at the end of
+    # each synthetic TS packet: (last - first + 1) - packets seen.
+    def __init__(self):
+        self.first_byte_at = None
+        self.last_byte_at = None
+        self.bytes = 0
+        self.packets = 0
+        self.first_counter = None
+        self.last_counter = None
+
+    def feed(self, payload):
+        now = time.time()
+        if self.first_byte_at is None:
+            self.first_byte_at = now
+        self.last_byte_at = now
+        self.bytes += len(payload)
+        count = len(payload) // TS_PACKET_SIZE
+        if not count:
+            return
+        if self.first_counter is None:
+            self.first_counter = _COUNTER.unpack_from(payload, TS_PACKET_SIZE - 4)[0]
+        self.last_counter = _COUNTER.unpack_from(payload, count * TS_PACKET_SIZE - 4)[0]
+        self.packets += count
+
+    def result(self):
+        expected = (self.last_counter - self.first_counter + 1) if self.packets else 0
+        return {"first_byte_at": self.first_byte_at, "last_byte_at": self.last_byte_at,
+                "bytes": self.bytes, "packets": self.packets, "lost": max(0, expected - self.packets)}
+
+
+def _deadline(reader, start, duration):
+    # Up to BENCH_CONNECT_TIMEOUT to get going, then `duration` of reading
+    if reader.first_byte_at is None:
+        return start + BENCH_CONNECT_TIMEOUT
+    return reader.first_byte_at + duration
+
+
+async def _http_client(port, start, duration):
+    reader = _Reader()
+    while True:
+        try:
+            stream, writer = await asyncio.open_connection(BENCH_HOST, port)
+            break
+        except OSError:
+            if time.time() >= start + BENCH_CONNECT_TIMEOUT:
+                return reader.result()
+            await asyncio.sleep(0.01)
+    writer.write(b"GET / HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+    pending = bytearray()
+    header_done = False
+    try:
+        while True:
+            remaining = _deadline(reader, start, duration) - time.time()
+            if remaining <= 0:
+                break
+            chunk = await asyncio.wait_for(stream.read(256 * 1024), remaining)
+            if not chunk:
+                break
+            pending += chunk
+            if not header_done:
+                end = pending.find(b"\r\n\r\n")
+                if end < 0:
+                    continue
+                del pending[:end + 4]
+                header_done = True
+            whole = len(pending) // TS_PACKET_SIZE * TS_PACKET_SIZE
+            if whole:
+                reader.feed(bytes(pending[:whole]))
+                del pending[:whole]
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    writer.close()
+    return reader.result()
+
+
+async def _http_get(port, path):
+    # One request per connection; -> body bytes, or None on any error status
+    stream, writer = await asyncio.open_connection(BENCH_HOST, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n".encode())
+    data = await stream.read()
+    writer.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    return body if head.split(b" ", 2)[1:2] == [b"200"] else None
+
+
+async def _hls_client(port, path, start, duration):
+    # Polls the playlist like a player and fetches each new segment once.
+    # Segments come in bursts a few seconds apart, so the rate is taken over
+    # the whole reading window ("window") rather than first to last byte
+    reader = _Reader()
+    fetched = set()
+    while time.time() < _deadline(reader, start, duration):
+        try:
+            playlist = await _http_get(port, path)
+        except OSError:
+            playlist = None
+        if playlist:
+            for name in playlist.decode().split():
+                if name.startswith("#") or name in fetched:
+                    continue
+                fetched.add(name)
+                body = await _http_get(port, "/" + name)
+                if body:
+                    reader.feed(body)
+        await asyncio.sleep(HLS_SEGMENT_SECONDS / 2 if playlist else 0.05)
+    result = reader.result()
+    if reader.first_byte_at is not None:
+        result["window"] = time.time() - reader.first_byte_at
+    return result
+
+
+class _DatagramReader(asyncio.DatagramProtocol):
+    def __init__(self, rtp):
+        self.rtp = rtp
+        self.reader = _Reader()
+
+    def datagram_received(self, data, addr):
+        self.reader.feed(data[RTP_HEADER_SIZE:] if self.rtp else data)
+
+
+def _udp_socket(group, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    if group:
+        join_group(sock, group, port, BENCH_HOST)
+    else:
+        sock.bind(("", port))
+    return sock
+
+
+async def _udp_client(sock, rtp, start, duration):
+    transport, protocol = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: _DatagramReader(rtp), sock=sock)
+    while True:
+        remaining = _deadline(protocol.reader, start, duration) - time.time()
+        if remaining <= 0:
+            break
+        await asyncio.sleep(min(remaining, 0.05))
+    transport.close()
+    return protocol.reader.result()
+
+
+async def _swarm(url, clients, duration, conn):
+    scheme, _, rest = url.partition("://")
+    host, _, port = rest.lstrip("@").split("/")[0].rpartition(":")
+    port = int(port)
+    # Receivers are bound before "ready" and HTTP clients dial from the start
+    # signal on, so TTFB includes the server's own start-up
+    group = host if host == MULTICAST_IP else None
+    socks = [] if scheme == "http" else [_udp_socket(group, port) for _ in range(clients)]
+    conn.send("ready")
+    start = conn.recv()
+    if url.endswith(".m3u8"):
+        path = "/" + url.rsplit("/", 1)[1]
+        tasks = [_hls_client(port, path, start, duration) for _ in range(clients)]
+    elif scheme == "http":
+        tasks = [_http_client(port, start, duration) for _ in range(clients)]
+    else:
+        tasks = [_udp_client(sock, scheme == "rtp", start, duration) for sock in socks]
+    return await asyncio.gather(*tasks)
+
+
+def _swarm_process(url, clients, duration, conn):
+    # Runs in its own process so the clients don't share the servers' GIL
+    try:
+        conn.send(asyncio.run(_swarm(url, clients, duration, conn)))
+    finally:
+        conn.close()
+
+
+# ================= SERVER SIDE =================
+def _free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind((BENCH_HOST, 0))
+        return s.getsockname()[1]
+
+
+def start_server(sessions, mode, vlc, source_file, port):
+    # The app's own launcher (stream_launcher.start_server: planner, stats
+    # port, in-process servers), kept on loopback. Left out on purpose: SAP
+    # announcements, the multicast pool (RTP goes to MULTICAST_IP), FEC and
+    # ladders, none of which the modes measured here use. Returns the session.
+    protocol, native, variant = mode.partition(" native")
+    if variant == " remux":
+        # The launcher remuxes anything that isn't a .ts file through VLC
+        remux_source = os.path.splitext(source_file)[0] + ".m2t"
+        if not os.path.exists(remux_source):
+            os.symlink(source_file, remux_source)
+        source_file = remux_source
+    return launch_server(sessions, [source_file], protocol, port, BENCH_HOST, vlc, native=bool(native),
+                         announce=False, bind_host=BENCH_HOST)
+
+
+def _proc_sample(pid):
+    # -> (cpu seconds, rss bytes) from /proc, or None once the process is gone
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    cpu = (int(fields[11]) + int(fields[12])) / _CLK_TCK
+    return cpu, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def run_case(mode, clients, vlc, source_file, duration=BENCH_DURATION):
+    import multiprocessing
+
+    protocol = mode.partition(" native")[0]
+    sock_kind = socket.SOCK_STREAM if "HTTP" in protocol else socket.SOCK_DGRAM
+    port = _free_port(sock_kind)
+    url = client_url(protocol, MULTICAST_IP if protocol == "RTP" else BENCH_HOST, port)
+
+    parent, child = multiprocessing.Pipe()
+    swarm = multiprocessing.Process(target=_swarm_process, args=(url, clients, duration, child))
+    swarm.start()
+    parent.recv()                        # clients are listening / ready to dial
+
+    sessions = SessionManager()
+    host_cpu0 = time.process_time()
+    started_at = time.time()
+    parent.send(started_at)
+    try:
+        session = start_server(sessions, mode, vlc, source_file, port)
+    except Exception:
+        swarm.terminate()
+        sessions.shutdown()
+        raise
+
+    samples = []
+    cpu0 = None
+    window_end = started_at + BENCH_CONNECT_TIMEOUT + duration
+    while not parent.poll(BENCH_SAMPLE_INTERVAL):
+        if session.pid:
+            sample = _proc_sample(session.pid)
+            if sample:
+                if cpu0 is None:
+                    cpu0 = (time.time(), sample[0])
+                samples.append((time.time(), sample))
+        if time.time() > window_end + 5:
+            break
+    readers = parent.recv() if parent.poll(5) else []
+    swarm.join(timeout=5)
+    host_cpu = time.process_time() - host_cpu0
+    host_wall = time.time() - started_at
+
+    stop_at = time.perf_counter()
+    sessions.stop(session.id)
+    while session.alive:
+        sessions.reap()
+        time.sleep(0.005)
+    teardown_ms = (time.perf_counter() - stop_at) * 1000
+
+    return _summarise(mode, clients, started_at, readers, samples, cpu0, host_cpu, host_wall,
+                      teardown_ms, duration)
+
+
+def _summarise(mode, clients, started_at, readers, samples, cpu0, host_cpu, host_wall, teardown_ms,
+               duration):
+    got = [r for r in readers if r["first_byte_at"]]
+    ttfb = sorted((r["first_byte_at"] - started_at) * 1000 for r in got)
+    rates = []
+    for r in got:
+        span = r.get("window") or min(r["last_byte_at"] - r["first_byte_at"], duration) or 1e-3
+        rates.append(r["bytes"] * 8 / span / 1e6)
+    packets = sum(r["packets"] for r in got)
+    lost = sum(r["lost"] for r in got)
+
+    cpu_pct = rss_mb = None
+    if samples and cpu0:
+        t_end, (cpu_end, _) = samples[-1]
+        if t_end > cpu0[0]:
+            cpu_pct = round((cpu_end - cpu0[1]) / (t_end - cpu0[0]) * 100, 1)
+        rss_mb = round(max(s[1][1] for s in samples) / 2 ** 20, 1)
+
+    return {
+        "mode": mode,
+        "clients": clients,
+        "connected": len(got),
+        "ttfb_ms": round(ttfb[0], 1) if ttfb else None,
+        "ttfb_ms_max": round(ttfb[-1], 1) if ttfb else None,
+        "throughput_mbps": round(sum(rates) / len(rates), 2) if rates else 0.0,
+        "throughput_mbps_min": round(min(rates), 2) if rates else 0.0,
+        "packets": packets,
+        "lost_packets": lost,
+        "loss_pct": round(lost * 100 / (packets + lost), 3) if packets + lost else None,
+        "teardown_ms": round(teardown_ms, 1),
+        "cpu_pct": cpu_pct,                              # VLC (stand-in) process
+        "rss_mb": rss_mb,
+        "host_cpu_pct": round(host_cpu / host_wall * 100, 1),   # relay / file server / sender threads
+    }
+
+
+# ================= RUNNER =================
+def _metadata(args):
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        rev = None
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_rev": rev,
+            "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "bitrate": args.bitrate, "duration": args.duration}
+
+
+def run(args):
+    vlc = [sys.executable, FAKE_VLC]
+    os.environ["FAKE_VLC_BITRATE"] = str(args.bitrate)
+    os.environ["FAKE_VLC_MCAST_IF"] = BENCH_HOST
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="vlc-bench-") as tmp:
+        source = write_synthetic_file(os.path.join(tmp, "synthetic.ts"), args.duration + BENCH_CONNECT_TIMEOUT,
+                                      args.bitrate)
+        for mode in args.modes:
+            for clients in args.clients:
+                if mode.startswith("UDP") and clients > 1:
+                    continue                # unicast UDP has exactly one receiver
+                result = run_case(mode, clients, vlc, source, args.duration)
+                results.append(result)
+                print(f"{mode:18s} {clients:4d} clients  ttfb {_fmt(result['ttfb_ms'])} ms  "
+                      f"{result['throughput_mbps']:9.2f} Mbit/s  loss {_fmt(result['loss_pct'])}%  "
+                      f"teardown {result['teardown_ms']:7.1f} ms  cpu {_fmt(result['cpu_pct'])}%  "
+                      f"rss {_fmt(result['rss_mb'])} MB  host cpu {result['host_cpu_pct']}%")
+
+    report = {"meta": _metadata(args), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return report
+
+
+def _fmt(value):
+    return "-" if value is None else value
+
+
+def compare(old_path, new_path):
+    # Side by side per (mode, clients); flags changes over 10% in the wrong direction
+    with open(old_path) as f:
+        old = {(r["mode"], r["clients"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = {(r["mode"], r["clients"]): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        cells = []
+        for metric, better in COMPARE_METRICS.items():
+            a, b = old[key].get(metric), new[key].get(metric)
+            if a is None or b is None:
+                continue
+            change = (b - a) / a * 100 if a else 0.0
+            worse = change > 10 if better == "lower" else change < -10
+            regressions += worse
+            cells.append(f"{metric} {a}->{b} ({change:+.0f}%){' !' if worse else ''}")
+        print(f"{key[0]:18s} {key[1]:4d}  " + "  ".join(cells))
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f"{key[0]:18s} {key[1]:4d}  only in {'old' if key in old else 'new'}")
+    print(f"{regressions} metric(s) regressed by more than 10%")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VLC Stream Hub loopback benchmark")
+    parser.add_argument("--modes", default=",".join(BENCH_MODES), help="comma separated modes")
+    parser.add_argument("--clients", default=",".join(map(str, BENCH_CLIENTS)), help="comma separated client counts")
+    parser.add_argument("--duration", type=float, default=BENCH_DURATION, help="seconds per case")
+    parser.add_argument("--bitrate", type=float, default=BENCH_BITRATE, help="stream bitrate in bit/s")
+    parser.add_argument("--output", help="write JSON results here")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+    args.modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in args.modes if m not in BENCH_MODES]
+    if unknown:
+        parser.error(f"unknown mode(s): {', '.join(unknown)}")
+    args.clients = [int(c) for c in args.clients.split(",")]
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
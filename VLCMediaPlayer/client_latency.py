@@ -0,0 +1,171 @@
+"""
+Client latency tuning for VLC Stream Hub.
+
+Before a client VLC opens a live stream, probe_stream() listens to it for a
+couple of seconds with the stream analyzer and measures how unevenly it
+arrives (peak-to-peak PCR arrival jitter, RTP inter-arrival jitter) and how
+much of it is lost. tune() turns that into the smallest :network-caching
+and :clock-jitter that still absorb the measured jitter with the mode's
+safety margin:
+
+  Auto          everyday viewing; never below 200 ms, more on a bad network
+  Low latency   monitoring screens; a tight margin and a 40 ms floor
+  VLC default   no probe, VLC's own caching (the behaviour before tuning)
+
+Every connection's probe and chosen values end up in its session
+(details["latency"], exported by metrics.py) and in client_latency.jsonl.
+
+  python client_latency.py rtp://@239.255.1.17:5004 [--mode "Low latency"]
+"""
+import argparse
+import json
+import math
+import time
+
+# --- LATENCY CONFIGURATION ---
+# mode: (jitter safety margin, caching floor ms, clock-jitter floor ms); None: don't probe or tune
+LATENCY_MODES = {
+    "Auto": (4.0, 200, 200),
+    "Low latency": (2.0, 40, 0),
+    "VLC default": None,
+}
+DEFAULT_LATENCY_MODE = "Auto"
+LATENCY_PROBE_SECONDS = 2.0
+LATENCY_PROBE_INTERVAL = 0.5         # analyzer report interval; the first (connect burst) is dropped
+LATENCY_MAX_CACHING_MS = 5000
+LATENCY_LOSS_THRESHOLD = 0.001       # above this the margin grows by half
+LATENCY_RTP_JITTER_FACTOR = 4.0      # RFC 3550 jitter is a smoothed mean; peaks run several times higher
+LATENCY_LOG_FILE = "client_latency.jsonl"
+# Only the MPEG-TS modes can be probed: plain HTTP streams MKV, HLS buffers
+# whole segments and Direct HTTP is a file download. (Ladder renditions are
+# TS over HTTP; the ladder client probes them itself and passes the probe in.)
+PROBED_PROTOCOLS = ("HTTP Relay", "RTP", "UDP")
+
+
+def probe_stream(url, seconds=LATENCY_PROBE_SECONDS, interface="0.0.0.0"):
+    # Listens to url for seconds -> summary dict (see summarize_probe).
+    # Raises OSError if the stream can't be opened, ValueError if it isn't TS.
+    from stream_analyzer import StreamAnalyzer
+
+    reports = []
+    analyzer = StreamAnalyzer(url, LATENCY_PROBE_INTERVAL, on_report=reports.append, interface=interface)
+    started = time.monotonic()
+    analyzer.run(seconds)
+    return summarize_probe(reports[1:] or reports, time.monotonic() - started)
+
+
+def summarize_probe(reports, elapsed):
+    # Worst interval wins: the buffer has to ride out the bad moments, not the average
+    pcr = [r["pcr_jitter_ms"] for r in reports if r.get("pcr_jitter_ms") is not None]
+    rtp = [r["rtp_jitter_ms"] for r in reports if r.get("rtp_received")]
+    packets = sum(r["packets"] for r in reports)
+    if any("rtp_received" in r for r in reports):
+        lost = sum(r["rtp_lost"] for r in reports)
+        received = sum(r["rtp_received"] for r in reports)
+        loss = lost / (lost + received) if lost + received else 0.0
+    else:
+        loss = sum(r["cc_errors"] for r in reports) / packets if packets else 0.0
+    jitter = None
+    if pcr or rtp:
+        jitter = max(max(pcr, default=0.0), LATENCY_RTP_JITTER_FACTOR * max(rtp, default=0.0))
+    return {
+        "seconds": round(elapsed, 2),
+        "packets": packets,
+        "bitrate_mbps": round(sum(r["bitrate_mbps"] for r in reports) / len(reports), 3) if reports else 0.0,
+        "pcr_jitter_ms": max(pcr) if pcr else None,
+        "rtp_jitter_ms": max(rtp) if rtp else None,
+        "jitter_ms": round(jitter, 3) if jitter is not None else None,
+        "loss_ratio": round(loss, 6),
+    }
+
+
+def tune(probe, mode=DEFAULT_LATENCY_MODE):
+    # -> (network_caching_ms, clock_jitter_ms), or (None, None) to leave VLC's defaults
+    params = LATENCY_MODES[mode]
+    if params is None or not probe or probe.get("jitter_ms") is None:
+        return None, None
+    margin, floor, clock_floor = params
+    if probe["loss_ratio"] > LATENCY_LOSS_THRESHOLD:
+        margin *= 1.5
+    jitter = probe["jitter_ms"]
+    caching = min(LATENCY_MAX_CACHING_MS, _round_up(max(floor, margin * jitter)))
+    # The clock follows arrival jitter up to a bit over what was measured, never past the cache
+    clock_jitter = min(caching, _round_up(max(clock_floor, 2 * jitter)))
+    return caching, clock_jitter
+
+
+def tune_connection(protocol, url, mode=DEFAULT_LATENCY_MODE, interface="0.0.0.0",
+                    seconds=LATENCY_PROBE_SECONDS, probe=None):
+    # Probe + tune for one connection -> its record (also what gets logged).
+    # probe: a fresh probe_stream() result of url to use instead of probing again
+    if mode not in LATENCY_MODES:
+        raise ValueError(f"Unknown latency mode: {mode}")
+    record = {"at": time.time(), "url": url, "protocol": protocol, "mode": mode, "probe": None,
+              "network_caching_ms": None, "clock_jitter_ms": None}
+    if LATENCY_MODES[mode] is None:
+        return record
+    if probe is None and protocol not in PROBED_PROTOCOLS:
+        record["note"] = f"{protocol} isn't probed"
+        return record
+    try:
+        record["probe"] = probe or probe_stream(url, seconds, interface)
+    except (OSError, ValueError, ImportError) as e:
+        record["note"] = f"probe failed: {e}"
+        return record
+    record["network_caching_ms"], record["clock_jitter_ms"] = tune(record["probe"], mode)
+    if record["network_caching_ms"] is None:
+        record["note"] = "no timing in the stream"
+    return record
+
+
+def vlc_options(record):
+    # Input options for the client VLC's command line, after the URL
+    options = []
+    if record and record.get("network_caching_ms") is not None:
+        options.append(f":network-caching={record['network_caching_ms']}")
+    if record and record.get("clock_jitter_ms") is not None:
+        options.append(f":clock-jitter={record['clock_jitter_ms']}")
+    return options
+
+
+def describe(record):
+    # One line for status labels / the CLI
+    if not record or record.get("network_caching_ms") is None:
+        note = record.get("note") if record else None
+        return f"VLC default caching ({note})" if note else "VLC default caching"
+    probe = record["probe"]
+    return (f"{record['mode']}: caching {record['network_caching_ms']} ms, clock jitter "
+            f"{record['clock_jitter_ms']} ms (measured jitter {probe['jitter_ms']:.1f} ms, "
+            f"loss {probe['loss_ratio'] * 100:.2f}%)")
+
+
+def log_connection(record, path=LATENCY_LOG_FILE):
+    # One JSON line per connection, for comparing sites over time
+    try:
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Could not record latency settings in {path}: {e}")  # For debugging
+
+
+def _round_up(ms, step=10):
+    return int(math.ceil(ms / step) * step)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Probe a stream and pick client caching settings")
+    parser.add_argument("url", help="udp://@ip:port, rtp://@ip:port or http://ip:port/ (a TS feed)")
+    parser.add_argument("--mode", choices=[m for m, p in LATENCY_MODES.items() if p], default=DEFAULT_LATENCY_MODE)
+    parser.add_argument("--seconds", type=float, default=LATENCY_PROBE_SECONDS)
+    parser.add_argument("--interface", default="0.0.0.0", help="local address to join multicast on")
+    args = parser.parse_args(argv)
+    # An http:// URL given here is taken to be TS (an HTTP Relay or a ladder rendition)
+    protocol = {"rtp": "RTP", "udp": "UDP"}.get(args.url.split(":", 1)[0].lower(), "HTTP Relay")
+    record = tune_connection(protocol, args.url, args.mode, args.interface, args.seconds)
+    print(json.dumps(record["probe"], indent=2))
+    print(describe(record))
+    print(" ".join(vlc_options(record)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Deterministic VLC stand-in for benchmarks.
+
+Accepts the same command lines the app gives VLC (see stream_commands.py)
+and behaves like VLC would on the wire, minus decoding and display:
+
+  fake_vlc.py FILE :sout=#...dst=http{...dst=:PORT/}...   serve a live TS over HTTP
+  fake_vlc.py FILE :sout=#...dst=udp{dst=IP:PORT,...}...  push TS datagrams
+  fake_vlc.py FILE :sout=#...dst=rtp{dst=IP,port=PORT...} push RTP/TS datagrams
+  fake_vlc.py FILE :sout=#...access=livehttp{...}...      write HLS segments + playlist
+  fake_vlc.py -I dummy FILE --sout #std{...dst=-} ...     remux to stdout
+  fake_vlc.py URL                                          play (receive and discard)
+
+The FILE itself is ignored; output is a synthetic TS on PID 0x100 with a
+PCR every 40 ms. Each packet ends with a 32-bit packet counter so that
+receivers can measure loss exactly. A FILE of "-" reads the TS from stdin
+instead (playlist output VLC). Tuned through environment variables:
+FAKE_VLC_BITRATE (bit/s, default 8000000), FAKE_VLC_SEED, FAKE_VLC_MCAST_IF
+(local address for multicast, e.g. 127.0.0.1), FAKE_VLC_STARTUP_DELAY
+(seconds, to mimic VLC's own start-up), FAKE_VLC_DURATION (seconds of
+stream a remux writes before exiting, like the end of a file) and
+FAKE_VLC_LENGTH (the length "get_length" reports, default 0 like a live
+input). With --rc-host=127.0.0.1:PORT it answers the rc "stats", "get_time"
+(counted from :start-time) and "get_length" commands like VLC does.
+"""
+import os
+import random
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+
+from mpegts import PCR_HZ, TS_DATAGRAM_SIZE, TS_PACKET_SIZE, TS_PACKETS_PER_DATAGRAM, rtp_header
+from multicast_pool import join_group
+
+SYNTHETIC_PID = 0x100
+SYNTHETIC_PCR_INTERVAL = 0.04
+COUNTER = struct.Struct(">I")
+STATS = {"packets sent": 0, "bytes sent": 0}
+
+
+def synthetic_packets(bitrate, seed=0):
+    # Endless deterministic TS packets at the given bitrate (packet timing is
+    # implied by the PCRs; pacing is up to the caller)
+    rng = random.Random(seed)
+    filler = bytes(rng.getrandbits(8) for _ in range(TS_PACKET_SIZE))
+    packets_per_second = bitrate / 8 / TS_PACKET_SIZE
+    pcr_every = max(1, int(packets_per_second * SYNTHETIC_PCR_INTERVAL))
+    pid_hi, pid_lo = (SYNTHETIC_PID >> 8) & 0x1F, SYNTHETIC_PID & 0xFF
+    n = 0
+    while True:
+        cc = n & 0x0F
+        if n % pcr_every == 0:
+            pcr = int(n / packets_per_second * PCR_HZ)
+            base, ext = divmod(pcr, 300)
+            adaptation = bytes([7, 0x10, (base >> 25) & 0xFF, (base >> 17) & 0xFF, (base >> 9) & 0xFF,
+                                (base >> 1) & 0xFF, ((base & 1) << 7) | 0x7E | ((ext >> 8) & 1), ext & 0xFF])
+            head = bytes([0x47, pid_hi, pid_lo, 0x30 | cc]) + adaptation
+        else:
+            head = bytes([0x47, pid_hi, pid_lo, 0x10 | cc])
+        yield head + filler[len(head):TS_PACKET_SIZE - 4] + COUNTER.pack(n & 0xFFFFFFFF)
+        n += 1
+
+
+def synthetic_datagrams(bitrate, seed=0):
+    packets = synthetic_packets(bitrate, seed)
+    while True:
+        yield b"".join(next(packets) for _ in range(TS_PACKETS_PER_DATAGRAM))
+
+
+def stdin_datagrams():
+    # TS arriving on stdin, re-cut into datagrams; ends at EOF
+    source = sys.stdin.buffer
+    while True:
+        dg = source.read(TS_DATAGRAM_SIZE)
+        if len(dg) < TS_DATAGRAM_SIZE:
+            return
+        yield dg
+
+
+def write_synthetic_file(path, seconds, bitrate, seed=0):
+    # A real file for modes that read one (Direct HTTP, native sender)
+    count = int(seconds * bitrate / 8 / TS_DATAGRAM_SIZE)
+    datagrams = synthetic_datagrams(bitrate, seed)
+    with open(path, "wb") as f:
+        for _ in range(count):
+            f.write(next(datagrams))
+    return path
+
+
+def paced(datagrams, bitrate):
+    interval = TS_DATAGRAM_SIZE * 8 / bitrate
+    next_due = time.perf_counter()
+    for dg in datagrams:
+        delay = next_due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        STATS["packets sent"] += 1
+        STATS["bytes sent"] += len(dg)
+        yield dg
+        next_due += interval
+
+
+# ================= OUTPUTS =================
+def run_udp(source, dest, port, rtp, bitrate, seed):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    mcast_if = os.environ.get("FAKE_VLC_MCAST_IF")
+    if mcast_if:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(mcast_if))
+    seq, ssrc, start = 0, 0x5EED0000 | (seed & 0xFFFF), time.perf_counter()
+    for dg in paced(source, bitrate):
+        if rtp:
+            ts = int((time.perf_counter() - start) * 90_000)
+            dg = rtp_header(seq, ts, ssrc) + dg
+            seq += 1
+        sock.sendto(dg, (dest, port))
+
+
+def run_http(source, port, bitrate):
+    # Like VLC's http output: every viewer gets the live stream from "now"
+    clients = []
+    lock = threading.Lock()
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("", port))
+    server.listen(128)
+
+    def accept():
+        while True:
+            conn, _ = server.accept()
+            conn.settimeout(5.0)
+            try:
+                conn.recv(4096)
+                conn.sendall(b"HTTP/1.0 200 OK\r\nContent-Type: video/x-matroska\r\n\r\n")
+            except OSError:
+                conn.close()
+                continue
+            with lock:
+                clients.append(conn)
+
+    threading.Thread(target=accept, daemon=True).start()
+    for dg in paced(source, bitrate):
+        with lock:
+            current = list(clients)
+        for conn in current:
+            try:
+                conn.sendall(dg)
+            except OSError:
+                conn.close()
+                with lock:
+                    clients.remove(conn)
+
+
+def run_stdout(source, bitrate, duration=None):
+    # Remux mode: as fast as the reader takes it, like VLC writing to a pipe
+    out = sys.stdout.buffer
+    count = int(duration * bitrate / 8 / TS_DATAGRAM_SIZE) if duration else None
+    try:
+        for n, dg in enumerate(source):
+            if n == count:
+                break
+            out.write(dg)
+        out.flush()
+    except (BrokenPipeError, OSError):
+        pass
+
+
+def run_livehttp(source, index, segment_pattern, seglen, numsegs, bitrate):
+    # Like VLC's livehttp access: real-time segments plus a rolling playlist
+    # that only ever lists finished segments (rewritten via rename)
+    datagrams = paced(source, bitrate)
+    per_segment = max(1, int(seglen * bitrate / 8 / TS_DATAGRAM_SIZE))
+    width = segment_pattern.count("#")
+    listed = []
+    number = 1
+    ended = False
+    while not ended:
+        path = segment_pattern.replace("#" * width, str(number).zfill(width))
+        with open(path, "wb") as f:
+            for _ in range(per_segment):
+                dg = next(datagrams, None)
+                if dg is None:
+                    ended = True    # stdin input ran out: close the last segment
+                    break
+                f.write(dg)
+        listed.append(path)
+        if len(listed) > numsegs:
+            os.remove(listed.pop(0))
+        first = number - len(listed) + 1
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{seglen}",
+                 f"#EXT-X-MEDIA-SEQUENCE:{first}"]
+        for p in listed:
+            lines += [f"#EXTINF:{seglen:.3f},", os.path.basename(p)]
+        with open(index + ".tmp", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(index + ".tmp", index)
+        number += 1
+
+
+def serve_rc(host_port, bitrate, start_time=0.0):
+    # Just enough of VLC's rc interface for metrics.py and watchdog.py:
+    # "stats", in VLC's layout, and the playback position
+    host, _, port = host_port.rpartition(":")
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host or "127.0.0.1", int(port)))
+    server.listen(8)
+    started = time.monotonic()
+
+    def handle(conn):
+        with conn:
+            for line in conn.makefile("r"):
+                if line.strip() == "get_time":
+                    conn.sendall(f"{int(start_time + time.monotonic() - started)}\r\n".encode())
+                    continue
+                if line.strip() == "get_length":
+                    conn.sendall(f"{int(float(os.environ.get('FAKE_VLC_LENGTH', 0)))}\r\n".encode())
+                    continue
+                if line.strip() != "stats":
+                    continue
+                conn.sendall((
+                    "+----[ begin of statistical info ]\r\n"
+                    "+-[Incoming]\r\n"
+                    f"| input bytes read :   {STATS['bytes sent'] / 1024:8.0f} KiB\r\n"
+                    f"| input bitrate    :   {bitrate / 1000:8.0f} kb/s\r\n"
+                    "+-[Video Decoding]\r\n"
+                    "| frames lost      :          0\r\n"
+                    "+-[Streaming]\r\n"
+                    f"| packets sent     :   {STATS['packets sent']:8d}\r\n"
+                    f"| bytes sent       :   {STATS['bytes sent'] / 1024:8.0f} KiB\r\n"
+                    "+----[ end of statistical info ]\r\n").encode())
+
+    def accept():
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+
+
+def run_player(url):
+    # Client stand-in: open the URL and discard what arrives
+    scheme, _, rest = url.partition("://")
+    address, _, path = rest.lstrip("@").partition("/")
+    host, _, port = address.rpartition(":")
+    port = int(port)
+    if scheme == "http":
+        sock = socket.create_connection((host, port))
+        sock.sendall(f"GET /{path} HTTP/1.0\r\n\r\n".encode())
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        first = int(host.split(".")[0]) if host[:1].isdigit() else 0
+        if 224 <= first <= 239:
+            join_group(sock, host, port, os.environ.get("FAKE_VLC_MCAST_IF"))
+        else:
+            sock.bind(("", port))
+    while sock.recv(65536):
+        pass
+
+
+def main(argv):
+    bitrate = float(os.environ.get("FAKE_VLC_BITRATE", 8_000_000))
+    seed = int(os.environ.get("FAKE_VLC_SEED", 0))
+    time.sleep(float(os.environ.get("FAKE_VLC_STARTUP_DELAY", 0)))
+
+    sout = ""
+    for i, arg in enumerate(argv):
+        if arg.startswith(":sout="):
+            sout = arg[len(":sout="):]
+        elif arg == "--sout" and i + 1 < len(argv):
+            sout = argv[i + 1]
+
+    start_time = 0.0
+    for arg in argv:
+        if arg.startswith((":start-time=", "--start-time=")):
+            start_time = float(arg.split("=", 1)[1])
+    for arg in argv:
+        if arg.startswith("--rc-host="):
+            serve_rc(arg.split("=", 1)[1], bitrate, start_time)
+    source = stdin_datagrams() if "-" in argv else synthetic_datagrams(bitrate, seed)
+    if not sout:
+        urls = [a for a in argv if "://" in a and not a.startswith("vlc://")]
+        if urls:
+            run_player(urls[0])
+        return
+
+    if "access=livehttp" in sout:
+        options = dict(re.findall(r'(seglen|numsegs|index)="?([^",}]+)"?', sout))
+        segments = re.search(r'mux=ts[^,]*,dst="?([^"}]+)"?', sout).group(1)
+        run_livehttp(source, options["index"], segments, int(options.get("seglen", 10)),
+                     int(options.get("numsegs", 0)) or 1 << 30, bitrate)
+        return
+    if "access=file" in sout and "dst=-" in sout:
+        duration = os.environ.get("FAKE_VLC_DURATION")
+        run_stdout(source, bitrate, float(duration) if duration else None)
+        return
+    # Outputs may sit behind a transcode (":http{...}") or in a quoted duplicate branch (ladders)
+    match = re.search(r'(?:dst="?|:)http\{[^}]*dst=:(\d+)', sout)
+    if match:
+        run_http(source, int(match.group(1)), bitrate)    # every path gets the same stream
+        return
+    outputs = re.findall(r'(?:dst="?|:)(udp|rtp)\{dst=([\d.]+)(?::(\d+))?(?:,port=(\d+))?', sout)
+    for i, (kind, dest, port_a, port_b) in enumerate(outputs[1:], 1):
+        threading.Thread(target=run_udp, args=(synthetic_datagrams(bitrate, seed + i), dest, int(port_a or port_b),
+                                               kind == "rtp", bitrate, seed + i), daemon=True).start()
+    if outputs:
+        kind, dest, port_a, port_b = outputs[0]
+        run_udp(source, dest, int(port_a or port_b), kind == "rtp", bitrate, seed)
+        return
+    sys.exit(f"fake_vlc: unsupported sout chain {sout}")
+
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv[1:])
+    except KeyboardInterrupt:
+        pass
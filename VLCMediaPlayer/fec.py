@@ -0,0 +1,565 @@
+"""
+SMPTE 2022-1 style forward error correction for RTP/UDP streams.
+
+The sender puts every TS datagram into RTP (the sequence numbers are what
+recovery works on) and lays the packets out in an L x D matrix, row by
+row. Each finished row yields one row FEC packet (XOR of its L packets) on
+port+4; each finished matrix yields L column FEC packets (XOR of a
+column's D packets) on port+2, spread over the next matrix so they don't
+go out as a burst. Any single loss in a row or column can be rebuilt, and
+row and column recovery feed each other, so bursts up to L packets long
+are covered as well. The FEC header is the RFC 2733 one with SMPTE
+2022-1's extension (offset/NA describe the row or column).
+
+Parity is computed with NumPy over the whole row or matrix at once (one
+bitwise_xor.reduce over a preallocated D x L x payload array), so it keeps
+up with high-bitrate streams.
+
+The receiver joins all three ports, rebuilds what it can and hands the
+stream on in sequence order to the player on loopback. It only holds
+packets back while a gap is waiting for its FEC, so without loss it adds
+no delay.
+
+  python fec.py --loss 0.02 --matrix 10x10      # loopback loss-injection test
+"""
+import argparse
+import json
+import random
+import select
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from mpegts import RTP_CLOCK_HZ, RTP_HEADER_SIZE, RTP_PAYLOAD_MP2T, TS_DATAGRAM_SIZE, parse_rtp_header, rtp_header
+from multicast_pool import join_group
+
+# --- FEC CONFIGURATION ---
+FEC_MATRIX = (10, 10)                # (L columns, D rows); vlc_config.json "fec": "LxD"
+FEC_COLUMN_PORT_OFFSET = 2           # SMPTE 2022-1 ports: media, column FEC, row FEC
+FEC_ROW_PORT_OFFSET = 4
+FEC_PAYLOAD_TYPE = 96
+FEC_MAX_PAYLOAD = 1472 - RTP_HEADER_SIZE
+FEC_RECOVERY_TIMEOUT = 1.0           # a gap nothing rebuilt this long after the packets behind it is given up
+FEC_HISTORY = 1000                   # packets kept for XOR after they went to the player
+FEC_RESYNC = 3000                    # a sequence jump this big is a restarted sender, not loss
+FEC_RCVBUF = 4 * 1024 * 1024
+
+_FEC_HEADER = struct.Struct("!HHB3sIBBBB")
+_COLUMN, _ROW = 0, 1
+
+
+def parse_matrix(text):
+    # "10x10" -> (10, 10); ValueError outside what SMPTE 2022-1 allows
+    try:
+        columns, rows = (int(v) for v in str(text).lower().split("x"))
+    except ValueError:
+        raise ValueError(f"FEC matrix must look like 10x10, not {text!r}") from None
+    if not (4 <= columns <= 20 and 4 <= rows <= 20 and columns * rows <= 100):
+        raise ValueError("FEC matrix needs 4..20 columns and rows and at most 100 packets")
+    return columns, rows
+
+
+def fec_ports(port):
+    return port + FEC_COLUMN_PORT_OFFSET, port + FEC_ROW_PORT_OFFSET
+
+
+def _fec_header(sn_base, length, pt, ts, kind, offset, na):
+    # E bit set, mask 0, XOR (type 0), D bit says row/column
+    return _FEC_HEADER.pack(sn_base & 0xFFFF, length & 0xFFFF, 0x80 | (pt & 0x7F), b"\0\0\0", ts & 0xFFFFFFFF,
+                            kind << 6, offset, na, 0)
+
+
+def _pt_recovery(count):
+    # XOR of count media packets' payload type (always MP2T)
+    return RTP_PAYLOAD_MP2T if count % 2 else 0
+
+
+def _xor(payloads, lengths):
+    # payloads: (..., N, width) uint8; XOR along N, cut to the longest packet
+    return np.bitwise_xor.reduce(payloads, axis=-2)[..., :int(lengths.max())]
+
+
+# ================= SENDER =================
+class FecSender:
+    """RTP + row/column FEC to dest_ip:port (a multicast group or a host).
+
+    VLC (or the native sender) pushes plain TS datagrams to ingest_port on
+    loopback; send() is the same thing without the socket.
+    """
+
+    def __init__(self, dest_ip, port, matrix=FEC_MATRIX, ttl=1, interface=None):
+        self.dest_ip = dest_ip
+        self.port = int(port)
+        self.columns, self.rows = matrix
+        self.ttl = ttl
+        self.interface = interface
+        self.ingest_port = None
+        self.stats = {"datagrams": 0, "bytes": 0, "fec_packets": 0, "parity_seconds": 0.0}
+
+        self._matrix = np.zeros((self.rows, self.columns, FEC_MAX_PAYLOAD), np.uint8)
+        self._lengths = np.zeros((self.rows, self.columns), np.uint16)
+        self._timestamps = np.zeros((self.rows, self.columns), np.uint32)
+        self._index = 0                 # next cell in the matrix, row by row
+        self._base = 0                  # sequence number of the matrix's first packet
+        self._columns_due = []          # column FEC packets still to interleave
+        self._seq = random.randrange(1 << 16)
+        self._fec_seq = [random.randrange(1 << 16), random.randrange(1 << 16)]
+        self._ssrc = random.getrandbits(32)
+        self._ts0 = random.getrandbits(32)
+        self._t0 = time.monotonic()
+        self._column_dest, self._row_dest = [(dest_ip, p) for p in fec_ports(self.port)]
+        self._stop = threading.Event()
+        self._thread = None
+        self._sock = None
+        self._ingest = None
+
+    # ---------- lifecycle (session manager service) ----------
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, FEC_RCVBUF)
+        self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.ttl)
+        if self.interface:
+            self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+        self._ingest = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._ingest.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, FEC_RCVBUF)
+        self._ingest.bind(("127.0.0.1", 0))
+        self._ingest.settimeout(0.5)
+        self.ingest_port = self._ingest.getsockname()[1]
+        self._thread = threading.Thread(target=self._run, name=f"fec-send-{self.port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        for sock in (self._ingest, self._sock):
+            if sock:
+                sock.close()
+
+    def _run(self):
+        buf = bytearray(65536)
+        while not self._stop.is_set():
+            try:
+                n = self._ingest.recv_into(buf)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            self.send(memoryview(buf)[:n])
+
+    # ---------- packets ----------
+    def send(self, payload):
+        n = len(payload)
+        if not 0 < n <= FEC_MAX_PAYLOAD:
+            return
+        row, column = divmod(self._index, self.columns)
+        if self._index == 0:
+            self._base = self._seq
+        ts = (self._ts0 + int((time.monotonic() - self._t0) * RTP_CLOCK_HZ)) & 0xFFFFFFFF
+        self._matrix[row, column, :n] = np.frombuffer(payload, np.uint8)
+        self._matrix[row, column, n:] = 0
+        self._lengths[row, column] = n
+        self._timestamps[row, column] = ts
+        self._sock.sendto(rtp_header(self._seq, ts, self._ssrc) + payload, (self.dest_ip, self.port))
+        self._seq = (self._seq + 1) & 0xFFFF
+        self.stats["datagrams"] += 1
+        self.stats["bytes"] += n
+        self._index += 1
+
+        # One column packet from the previous matrix every D media packets
+        if self._columns_due and self._index % self.rows == 0:
+            self._send_fec(self._columns_due.pop(0), self._column_dest)
+        if column == self.columns - 1:
+            self._send_row(row)
+        if self._index == self.rows * self.columns:
+            for packet in self._columns_due:    # only if the ingest jumped; never hold them back
+                self._send_fec(packet, self._column_dest)
+            self._columns_due = self._column_packets()
+            self._index = 0
+
+    def _send_row(self, row):
+        started = time.perf_counter()
+        lengths = self._lengths[row]
+        parity = _xor(self._matrix[row], lengths)
+        header = _fec_header(self._base + row * self.columns, np.bitwise_xor.reduce(lengths),
+                             _pt_recovery(self.columns), np.bitwise_xor.reduce(self._timestamps[row]),
+                             _ROW, 1, self.columns)
+        self.stats["parity_seconds"] += time.perf_counter() - started
+        self._send_fec(header + parity.tobytes(), self._row_dest)
+
+    def _column_packets(self):
+        # All L columns of the finished matrix in one reduction
+        started = time.perf_counter()
+        parity = np.bitwise_xor.reduce(self._matrix, axis=0)
+        lengths = np.bitwise_xor.reduce(self._lengths, axis=0)
+        longest = self._lengths.max(axis=0)
+        timestamps = np.bitwise_xor.reduce(self._timestamps, axis=0)
+        packets = [_fec_header(self._base + c, lengths[c], _pt_recovery(self.rows), timestamps[c], _COLUMN,
+                               self.columns, self.rows)
+                   + parity[c, :int(longest[c])].tobytes() for c in range(self.columns)]
+        self.stats["parity_seconds"] += time.perf_counter() - started
+        return packets
+
+    def _send_fec(self, packet, dest):
+        kind = _ROW if dest is self._row_dest else _COLUMN
+        seq = self._fec_seq[kind]
+        self._fec_seq[kind] = (seq + 1) & 0xFFFF
+        self._sock.sendto(rtp_header(seq, 0, self._ssrc, FEC_PAYLOAD_TYPE) + packet, dest)
+        self.stats["fec_packets"] += 1
+
+
+# ================= RECEIVER =================
+class FecReceiver:
+    """Receives media + FEC for ip:port and plays it out to loopback.
+
+    Output goes to 127.0.0.1:output_port in sequence order: RTP as it came
+    in for RTP streams, bare TS datagrams for UDP ones (local_url() is what
+    the player opens).
+    """
+
+    def __init__(self, protocol, ip, port, interface=None, output_port=None,
+                 recovery_timeout=FEC_RECOVERY_TIMEOUT):
+        self.protocol = protocol
+        self.ip = ip
+        self.port = int(port)
+        self.interface = interface
+        self.output_port = output_port
+        self.recovery_timeout = recovery_timeout
+        self.stats = {"received": 0, "recovered": 0, "unrecovered": 0, "late": 0, "fec_packets": 0,
+                      "held_seconds": 0.0}
+        self.on_output = None           # called with (payload, recovered) for each packet played out; tests
+
+        self._packets = {}              # ext seq -> (payload, timestamp, payload type)
+        self._arrived = {}              # ext seq -> monotonic arrival, until played out
+        self._rebuilt = set()           # ext seqs recovered from FEC, until played out
+        self._fec = {}                  # (kind, ext sn base) -> (offset, na, length, pt, ts, payload)
+        self._next = None               # ext seq due at the player next
+        self._matrix_size = FEC_MATRIX[0] * FEC_MATRIX[1]     # learned from column FEC packets
+        self._stop = threading.Event()
+        self._thread = None
+        self._socks = []
+        self._out = None
+
+    def local_url(self):
+        return f"{self.protocol.lower()}://@127.0.0.1:{self.output_port}"
+
+    def start(self):
+        try:
+            for port in (self.port,) + fec_ports(self.port):
+                self._socks.append(self._open(port))
+        except OSError:
+            self.stop()
+            raise
+        self._out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if not self.output_port:
+            # A free UDP port for the player (it binds it after us)
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+                probe.bind(("127.0.0.1", 0))
+                self.output_port = probe.getsockname()[1]
+        self._thread = threading.Thread(target=self._run, name=f"fec-receive-{self.port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        for sock in self._socks + [self._out]:
+            if sock:
+                sock.close()
+        self._socks = []
+
+    def _open(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, FEC_RCVBUF)
+        try:
+            if socket.inet_aton(self.ip)[0] >> 4 == 0xE:     # 224.0.0.0/4
+                join_group(sock, self.ip, port, self.interface)
+            else:
+                sock.bind(("", port))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _run(self):
+        media, column, row = self._socks
+        kinds = {column: _COLUMN, row: _ROW}
+        while not self._stop.is_set():
+            try:
+                ready, _, _ = select.select(self._socks, [], [], 0.02)
+                for sock in ready:
+                    data = sock.recv(65536)
+                    if sock is media:
+                        self._on_media(data)
+                    else:
+                        self._on_fec(kinds[sock], data)
+            except (OSError, ValueError):
+                if self._stop.is_set():
+                    return
+                raise
+            self._play_out()
+
+    def _ext(self, seq):
+        # 16-bit RTP sequence -> ever-growing number, near the playout point
+        if self._next is None:
+            return seq
+        return self._next + ((seq - self._next + 0x8000) & 0xFFFF) - 0x8000
+
+    def _on_media(self, data):
+        header = parse_rtp_header(data)
+        if header is None:
+            return
+        seq, ts, _, start = header
+        ext = self._ext(seq)
+        if self._next is None or abs(ext - self._next) > FEC_RESYNC:
+            # First packet, or the sender restarted with new sequence numbers
+            self._packets.clear()
+            self._arrived.clear()
+            self._rebuilt.clear()
+            self._fec.clear()
+            self._next = ext = seq
+        if ext < self._next or ext in self._packets:
+            self.stats["late"] += 1
+            return
+        self._packets[ext] = (bytes(data[start:]), ts, data[1] & 0x7F)
+        self._arrived[ext] = time.monotonic()
+        self.stats["received"] += 1
+        if self._next not in self._packets:
+            self._recover()
+
+    def _on_fec(self, kind, data):
+        header = parse_rtp_header(data)
+        if header is None or self._next is None or len(data) < header[3] + _FEC_HEADER.size:
+            return
+        start = header[3]
+        sn_base, length, pt, _, ts, _, offset, na, _ = _FEC_HEADER.unpack_from(data, start)
+        if not offset or not na:
+            return
+        if kind == _COLUMN:
+            self._matrix_size = offset * na
+        self.stats["fec_packets"] += 1
+        self._fec[(kind, self._ext(sn_base))] = (offset, na, length, pt & 0x7F, ts,
+                                                 bytes(data[start + _FEC_HEADER.size:]))
+        self._recover()
+
+    def _recover(self):
+        # Any FEC group missing exactly one packet gives it back; repeat while
+        # that completes other groups (row <-> column)
+        progress = True
+        while progress:
+            progress = False
+            for key, (offset, na, length, pt, ts, parity) in list(self._fec.items()):
+                covered = range(key[1], key[1] + offset * na, offset)
+                missing = [s for s in covered if s not in self._packets]
+                if not missing or covered[-1] < self._next - FEC_HISTORY:
+                    del self._fec[key]
+                    continue
+                if len(missing) != 1 or missing[0] < self._next:
+                    continue
+                present = [self._packets[s] for s in covered if s in self._packets]
+                lengths = np.array([len(p[0]) for p in present] + [len(parity)], np.uint16)
+                payloads = np.zeros((len(present) + 1, int(lengths.max())), np.uint8)
+                for i, (payload, _, _) in enumerate(present):
+                    payloads[i, :len(payload)] = np.frombuffer(payload, np.uint8)
+                payloads[-1, :len(parity)] = np.frombuffer(parity, np.uint8)
+                size = length ^ int(np.bitwise_xor.reduce(lengths[:-1]))
+                if not 0 < size <= payloads.shape[1]:
+                    del self._fec[key]      # inconsistent with what we hold; don't guess
+                    continue
+                for _, p_ts, p_pt in present:
+                    ts ^= p_ts
+                    pt ^= p_pt
+                self._packets[missing[0]] = (_xor(payloads, lengths)[:size].tobytes(), ts, pt & 0x7F)
+                self._rebuilt.add(missing[0])
+                self.stats["recovered"] += 1
+                del self._fec[key]
+                progress = True
+
+    def _play_out(self):
+        now = time.monotonic()
+        while self._next is not None:
+            packet = self._packets.get(self._next)
+            if packet is None:
+                # Its column FEC comes at the latest one matrix after its own;
+                # once that many packets are past it (or the stream paused
+                # that long), nothing is coming to rebuild it
+                pending = [s for s in self._arrived if s > self._next]
+                if not pending:
+                    return
+                waited = now - self._arrived[min(pending)]
+                if len(pending) <= 2 * self._matrix_size + FEC_MATRIX[0] and waited < self.recovery_timeout:
+                    return
+                self.stats["unrecovered"] += 1          # give up on it; the player sees the loss
+                self._advance()
+                continue
+            payload, ts, pt = packet
+            arrived = self._arrived.pop(self._next, now)    # recovered packets: held from "now"
+            self.stats["held_seconds"] += now - arrived
+            data = payload if self.protocol == "UDP" else rtp_header(self._next & 0xFFFF, ts, 0, pt) + payload
+            try:
+                self._out.sendto(data, ("127.0.0.1", self.output_port))
+            except OSError:
+                pass
+            if self.on_output:
+                self.on_output(payload, self._next in self._rebuilt)
+            self._rebuilt.discard(self._next)
+            self._advance()
+
+    def _advance(self):
+        self._next += 1
+        self._packets.pop(self._next - FEC_HISTORY, None)
+
+
+# ================= LOOPBACK LOSS-INJECTION TEST =================
+class _LossyLink:
+    # Forwards media/column/row ports from in_port.. to out_port.., dropping
+    # packets at random (optionally in bursts)
+    def __init__(self, in_port, out_port, loss, burst=1, seed=0):
+        self.rng = random.Random(seed)
+        self.loss = loss
+        self.burst = burst
+        self.dropped = {0: 0, 1: 0, 2: 0}
+        self.forwarded = {0: 0, 1: 0, 2: 0}
+        self._drop_left = {0: 0, 1: 0, 2: 0}
+        self._socks = []
+        for i, port in enumerate((in_port,) + fec_ports(in_port)):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, FEC_RCVBUF)
+            sock.bind(("127.0.0.1", port))
+            self._socks.append(sock)
+        self._dests = [("127.0.0.1", p) for p in (out_port,) + fec_ports(out_port)]
+        self._out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+        for sock in self._socks + [self._out]:
+            sock.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            ready, _, _ = select.select(self._socks, [], [], 0.05)
+            for sock in ready:
+                i = self._socks.index(sock)
+                data = sock.recv(65536)
+                if not self._drop_left[i] and self.rng.random() < self.loss / self.burst:
+                    self._drop_left[i] = self.burst
+                if self._drop_left[i]:
+                    self._drop_left[i] -= 1
+                    self.dropped[i] += 1
+                    continue
+                self.forwarded[i] += 1
+                self._out.sendto(data, self._dests[i])
+
+
+def loss_test(loss=0.02, matrix=FEC_MATRIX, seconds=10.0, bitrate=20_000_000, burst=1, seed=0):
+    # Synthetic TS through sender -> lossy link -> receiver on loopback.
+    # -> dict: raw and residual loss, the delay the receiver added (all
+    # packets and recovered ones) and the parity cost per datagram
+    from fake_vlc import synthetic_datagrams
+
+    def free_base():
+        # Three free even ports in a row, for media/column/row
+        for _ in range(50):
+            base = random.randrange(20000, 60000, 2)
+            try:
+                socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(3)]
+                for sock, port in zip(socks, (base,) + fec_ports(base)):
+                    sock.bind(("127.0.0.1", port))
+                return base
+            except OSError:
+                continue
+            finally:
+                for sock in socks:
+                    sock.close()
+        raise OSError("no free port range for the test")
+
+    link_port, receive_port = free_base(), free_base()
+    sent_at = {}
+    delays, recovered_delays = [], []
+    seen = set()
+    receiver = FecReceiver("UDP", "127.0.0.1", receive_port)
+
+    def played(payload, rebuilt):
+        counter = int.from_bytes(payload[-4:], "big")     # fake_vlc's counter of the datagram's last packet
+        seen.add(counter)
+        delay = time.monotonic() - sent_at.get(counter, time.monotonic())
+        delays.append(delay)
+        if rebuilt:
+            recovered_delays.append(delay)
+
+    receiver.on_output = played
+    receiver.start()
+    link = _LossyLink(link_port, receive_port, loss, burst, seed).start()
+    sender = FecSender("127.0.0.1", link_port, matrix).start()
+    source = synthetic_datagrams(bitrate, seed)
+    interval = TS_DATAGRAM_SIZE * 8 / bitrate
+    count = int(seconds / interval)
+    next_due = time.perf_counter()
+    ingest = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for _ in range(count):
+            delay = next_due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_due += interval
+            datagram = next(source)
+            sent_at[int.from_bytes(datagram[-4:], "big")] = time.monotonic()
+            ingest.sendto(datagram, ("127.0.0.1", sender.ingest_port))
+        time.sleep(2 * FEC_RECOVERY_TIMEOUT)
+    finally:
+        ingest.close()
+        sender.stop()
+        link.stop()
+        receiver.stop()
+
+    # Packets never played out at the end of the run count as lost too
+    residual = count - len(seen)
+    delays.sort()
+    recovered_delays.sort()
+    return {
+        "matrix": f"{matrix[0]}x{matrix[1]}",
+        "bitrate_mbps": bitrate / 1e6,
+        "datagrams": count,
+        "raw_loss_percent": round(100 * link.dropped[0] / count, 3),
+        "fec_dropped": link.dropped[1] + link.dropped[2],
+        "recovered": receiver.stats["recovered"],
+        "residual_loss_percent": round(100 * residual / count, 4),
+        "overhead_percent": round(100 * sender.stats["fec_packets"] / max(1, sender.stats["datagrams"]), 1),
+        "added_delay_mean_ms": round(1000 * receiver.stats["held_seconds"] / max(1, len(delays)), 3),
+        "latency_p50_ms": round(1000 * delays[len(delays) // 2], 3) if delays else None,
+        "latency_p99_ms": round(1000 * delays[int(len(delays) * 0.99)], 3) if delays else None,
+        "latency_max_ms": round(1000 * delays[-1], 3) if delays else None,
+        "recovered_latency_p50_ms": (round(1000 * recovered_delays[len(recovered_delays) // 2], 3)
+                                     if recovered_delays else None),
+        "parity_us_per_datagram": round(1e6 * sender.stats["parity_seconds"] / max(1, sender.stats["datagrams"]), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Loopback loss-injection test of the FEC sender/receiver")
+    parser.add_argument("--loss", type=float, default=0.02, help="share of packets dropped (0.02 = 2%%)")
+    parser.add_argument("--burst", type=int, default=1, help="packets dropped per loss event")
+    parser.add_argument("--matrix", default="x".join(map(str, FEC_MATRIX)), help="LxD, e.g. 10x10")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--bitrate", type=float, default=20_000_000, help="bit/s")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    result = loss_test(args.loss, parse_matrix(args.matrix), args.seconds, args.bitrate, args.burst, args.seed)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Direct HTTP file server for VLC Stream Hub.
+
+Serves the selected media file as-is, without VLC in the path. Bodies go
+out with os.sendfile (kernel to socket, no user-space copy), single byte
+ranges are honoured so players can seek, HTTP/1.1 keep-alive is on, and
+the number of concurrent connections is capped.
+"""
+import email.utils
+import mimetypes
+import os
+import select
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- SERVER CONFIGURATION ---
+FILE_SERVER_MAX_CONNECTIONS = 256
+FILE_SERVER_IDLE_TIMEOUT = 30         # seconds a keep-alive connection may sit idle
+FILE_SERVER_CHUNK = 8 * 1024 * 1024   # max bytes per sendfile() call
+
+mimetypes.add_type("video/x-matroska", ".mkv")
+mimetypes.add_type("video/mp2t", ".ts")
+
+
+def parse_range(header, size):
+    # Returns (start, end) inclusive, None for "whole file", or raises
+    # ValueError for a range that can't be satisfied. Only single ranges are
+    # supported; anything else falls back to a full 200 response.
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    spec = header[len("bytes="):].strip()
+    first, sep, last = spec.partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            # suffix range: last N bytes
+            length = int(last)
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if first == "":
+        if length <= 0 or size == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class _FileRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = FILE_SERVER_IDLE_TIMEOUT
+    server_version = "VLCStreamHub"
+
+    def log_message(self, format, *args):
+        # The frozen app has no console (sys.stderr is None); stay quiet
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        path = self.server.file_path
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(404, "File not available")
+            return
+
+        with f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            try:
+                byte_range = parse_range(self.headers.get("Range"), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if byte_range:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                start, end = 0, size - 1
+                self.send_response(200)
+            length = end - start + 1 if size else 0
+
+            self.send_header("Content-Type", self.server.content_type)
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True))
+            self.end_headers()
+
+            if send_body and length:
+                try:
+                    _send_file(self.connection, f, start, length)
+                except (ConnectionError, TimeoutError):
+                    # The viewer went away (or stopped reading): nothing to report
+                    self.close_connection = True
+
+
+def _send_file(sock, f, offset, count):
+    # os.sendfile keeps the data in the kernel; Windows has no os.sendfile,
+    # where socket.sendfile falls back to a plain read/send loop.
+    if not hasattr(os, "sendfile"):
+        sock.sendfile(f, offset, count)
+        return
+    out_fd, in_fd = sock.fileno(), f.fileno()
+    while count > 0:
+        try:
+            sent = os.sendfile(out_fd, in_fd, offset, min(count, FILE_SERVER_CHUNK))
+        except BlockingIOError:
+            # Sockets with a timeout are non-blocking underneath: wait for room
+            if not select.select([], [out_fd], [], sock.gettimeout())[1]:
+                raise TimeoutError("client stopped reading")
+            continue
+        if sent == 0:
+            raise ConnectionError("client closed the connection")
+        offset += sent
+        count -= sent
+
+
+class CappedHTTPServer(ThreadingHTTPServer):
+    # Threaded HTTP server with a connection cap and start()/stop() for the
+    # session manager; subclasses pick the handler
+    daemon_threads = True
+    request_queue_size = 128
+    thread_name = "httpserver"
+
+    def __init__(self, port, handler, host="", max_connections=FILE_SERVER_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._thread = None
+        super().__init__((host, int(port)), handler)
+
+    def process_request(self, request, client_address):
+        # Over the cap: answer 503 straight away instead of queueing a thread
+        if not self._slots.acquire(blocking=False):
+            try:
+                request.sendall(b"HTTP/1.1 503 Service Unavailable\r\n"
+                                b"Retry-After: 5\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        super().process_request(request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    # ---------- lifecycle (session manager service) ----------
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name=f"{self.thread_name}-{self.port}",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread:
+            self.shutdown()
+            self._thread.join(timeout=5.0)
+        self.server_close()
+
+
+class DirectFileServer(CappedHTTPServer):
+    thread_name = "fileserver"
+
+    def __init__(self, file_path, port, host="", max_connections=FILE_SERVER_MAX_CONNECTIONS):
+        self.file_path = os.path.abspath(file_path)
+        self.content_type = mimetypes.guess_type(self.file_path)[0] or "application/octet-stream"
+        super().__init__(port, _FileRequestHandler, host, max_connections)
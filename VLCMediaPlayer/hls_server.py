@@ -0,0 +1,186 @@
+"""
+HLS segment server for VLC Stream Hub.
+
+VLC's livehttp output cuts the stream into fixed-length TS segments and
+keeps a rolling .m3u8 playlist in a scratch directory; this server hands
+them out over plain HTTP. Segments never change once listed, so they are
+served from an in-memory LRU with long-lived, immutable cache headers and
+ETags, and every viewer shares the same cached bytes. Only segments the
+playlist lists are read (VLC may still be writing the next one), and each
+server run names its segments with a fresh prefix, because numbering starts
+over on every start or restart and caches would otherwise hand out the
+previous run's segments. The playlist is re-read only when its mtime
+changes and is marked no-cache.
+"""
+import collections
+import email.utils
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler
+
+from file_server import FILE_SERVER_IDLE_TIMEOUT, FILE_SERVER_MAX_CONNECTIONS, CappedHTTPServer
+
+# --- HLS CONFIGURATION ---
+HLS_PLAYLIST = "stream.m3u8"
+HLS_SEGMENT_PATTERN = "stream-{run}-########.ts"    # VLC replaces the #s with the segment number
+HLS_SEGMENT_SECONDS = 2
+HLS_PLAYLIST_SEGMENTS = 6                       # segments listed in the rolling playlist
+HLS_CACHE_BYTES = 64 * 1024 * 1024              # LRU budget for hot segments
+HLS_SEGMENT_MAX_AGE = 3600                      # segments are immutable once listed
+
+_SEGMENT_NAME = re.compile(r"^stream-[0-9a-f]{8}-\d{8}\.ts$")
+
+
+class SegmentCache:
+    # Byte-bounded LRU of segment name -> (data, etag, mtime)
+    def __init__(self, max_bytes=HLS_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name, path, listed=True):
+        # listed: the playlist lists the segment, so it's complete; others
+        # are only served while cached -> item, or None
+        with self._lock:
+            item = self._items.get(name)
+            if item is not None:
+                self._items.move_to_end(name)
+                self.hits += 1
+                return item
+            self.misses += 1
+        if not listed:
+            return None
+        # Read outside the lock; two viewers racing on one miss just both read
+        with open(path, "rb") as f:
+            data = f.read()
+            stat = os.fstat(f.fileno())
+        item = (data, f'"{name}-{stat.st_mtime_ns:x}-{len(data)}"', stat.st_mtime)
+        with self._lock:
+            if name not in self._items:
+                self._items[name] = item
+                self.size += len(data)
+                while self.size > self.max_bytes and len(self._items) > 1:
+                    _, (old, _, _) = self._items.popitem(last=False)
+                    self.size -= len(old)
+        return item
+
+
+class _HlsRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = FILE_SERVER_IDLE_TIMEOUT
+    server_version = "VLCStreamHub"
+
+    def log_message(self, format, *args):
+        # The frozen app has no console (sys.stderr is None); stay quiet
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        name = self.path.split("?", 1)[0].lstrip("/")
+        if name == HLS_PLAYLIST:
+            item = self.server.playlist()
+            cache_control = "no-cache"
+            content_type = "application/vnd.apple.mpegurl"
+        elif _SEGMENT_NAME.match(name):
+            try:
+                item = self.server.cache.get(name, os.path.join(self.server.segment_dir, name),
+                                             name in self.server.listed_segments())
+            except OSError:
+                item = None
+            cache_control = f"public, max-age={HLS_SEGMENT_MAX_AGE}, immutable"
+            content_type = "video/mp2t"
+        else:
+            item = None
+        if item is None:
+            self.send_error(404, "Not found")
+            return
+
+        data, etag, mtime = item
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", cache_control)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", email.utils.formatdate(mtime, usegmt=True))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+
+class HlsServer(CappedHTTPServer):
+    thread_name = "hls"
+
+    def __init__(self, port, host="", segment_dir=None, cache_bytes=HLS_CACHE_BYTES,
+                 max_connections=FILE_SERVER_MAX_CONNECTIONS):
+        # segment_dir=None: a scratch directory that stop() removes again
+        self._own_dir = segment_dir is None
+        self.segment_dir = segment_dir or tempfile.mkdtemp(prefix="vlc-hls-")
+        # Segment numbers start over with every run: a run prefix keeps URLs unique
+        self.segment_pattern = HLS_SEGMENT_PATTERN.format(run=secrets.token_hex(4))
+        self.cache = SegmentCache(cache_bytes)
+        self._playlist = None           # (data, etag, mtime) of the last read
+        self._listed = frozenset()      # segment names in that playlist
+        self._playlist_mtime = None
+        self._playlist_lock = threading.Lock()
+        try:
+            super().__init__(port, _HlsRequestHandler, host, max_connections)
+        except OSError:
+            self._remove_dir()
+            raise
+
+    @property
+    def playlist_path(self):
+        return os.path.join(self.segment_dir, HLS_PLAYLIST)
+
+    def playlist(self):
+        # Re-read only when VLC rewrote it; everyone polls this file
+        try:
+            mtime = os.stat(self.playlist_path).st_mtime_ns
+        except OSError:
+            return None
+        with self._playlist_lock:
+            if mtime != self._playlist_mtime:
+                try:
+                    with open(self.playlist_path, "rb") as f:
+                        data = f.read()
+                except OSError:
+                    return None
+                self._playlist = (data, f'"pl-{mtime}"', mtime / 1e9)
+                self._playlist_mtime = mtime
+                lines = data.decode("utf-8", "replace").splitlines()
+                self._listed = frozenset(os.path.basename(line.strip()) for line in lines
+                                         if line.strip() and not line.startswith("#"))
+            return self._playlist
+
+    def listed_segments(self):
+        self.playlist()
+        with self._playlist_lock:
+            return self._listed
+
+    def stop(self):
+        super().stop()
+        self._remove_dir()
+
+    def _remove_dir(self):
+        if self._own_dir:
+            shutil.rmtree(self.segment_dir, ignore_errors=True)
+
@@ -0,0 +1,178 @@
+"""
+Multi-bitrate ladders for VLC Stream Hub.
+
+A ladder server (start_server(..., ladder=rungs)) runs one VLC whose
+duplicate{} hands the demuxed source to a chain per rendition: the source
+itself, copied, plus smaller H.264 rungs (sout_planner.plan_ladder). Each
+rendition has its own HTTP path, multicast group or UDP port and its own
+SAP announcement, tagged with its name and bitrate.
+
+Clients fold those announcements back into one entry per ladder
+(group_ladders) and pick_rendition() settles on the highest rendition the
+measured throughput carries without loss.
+
+VLC 3 has no raw-frame fan-out: every transcode branch opens its own
+decoder. measure() therefore runs the ladder with one rendition more at a
+time and samples VLC's CPU, so the cost of each extra rendition is measured
+on this box instead of trusted from the planner's estimate. Results land in
+ladder_cpu.json, which the app and the metrics endpoint report next to the
+estimate:
+
+  python ladder.py movie.mkv --rungs 720p,480p,360p --seconds 20
+"""
+import argparse
+import json
+import os
+import time
+
+from client_latency import probe_stream
+from sout_planner import DEFAULT_LADDER, LADDER_RUNGS, plan_ladder
+from stream_commands import build_ladder_sout, client_url, server_argv
+
+# --- LADDER CONFIGURATION ---
+LADDER_PROBE_SECONDS = 1.5           # per rendition tried while picking
+LADDER_MAX_LOSS = 0.002              # more loss than this: the link doesn't carry the rendition
+LADDER_HEADROOM = 0.8                # step down to renditions within this share of the throughput
+LADDER_MEASURE_SECONDS = 10.0        # CPU sampled this long per ladder size...
+LADDER_MEASURE_WARMUP = 3.0          # ...after VLC had this long to open decoders and encoders
+LADDER_MEASURE_INTERVAL = 0.5
+LADDER_MEASURE_PORT = 5300           # UDP ports on loopback used by measure()
+LADDER_CPU_FILE = "ladder_cpu.json"
+
+
+def group_ladders(streams):
+    # SAP directory entries -> the same list with each ladder folded into
+    # one entry: its top rendition's address, plus "renditions", highest first
+    ladders, grouped = {}, []
+    for stream in streams:
+        if not stream.get("rendition"):
+            grouped.append(stream)
+            continue
+        key = (stream["origin"], stream["name"], stream["protocol"])
+        if key not in ladders:
+            ladders[key] = dict(stream, renditions=[])
+            grouped.append(ladders[key])
+        ladders[key]["renditions"].append(stream)
+    for entry in ladders.values():
+        # The source rendition may not know its rate; it's always the top one
+        entry["renditions"].sort(key=lambda r: r["kbps"] or float("inf"), reverse=True)
+        top = entry["renditions"][0]
+        entry.update({k: top[k] for k in ("ip", "port", "path", "rendition", "kbps")})
+    return grouped
+
+
+def pick_rendition(protocol, renditions, interface="0.0.0.0", seconds=LADDER_PROBE_SECONDS):
+    # renditions: one ladder's, highest first -> (rendition, probe, throughput kb/s).
+    # The highest rendition that arrives without loss wins; a lossy one tells
+    # us the throughput, so the next try skips straight to what fits in it.
+    # Raises OSError if none of them could be received at all.
+    candidates = list(renditions)
+    fallback = None
+    while candidates:
+        rendition = candidates.pop(0)
+        url = client_url(protocol, rendition["ip"], rendition["port"], rendition["path"])
+        try:
+            probe = probe_stream(url, seconds, interface)
+        except (OSError, ValueError) as e:
+            print(f"Ladder: {rendition['rendition']} unreachable: {e}")  # For debugging
+            continue
+        if not probe["packets"]:
+            continue
+        throughput = probe["bitrate_mbps"] * 1000
+        print(f"Ladder: {rendition['rendition']} {throughput:.0f} kb/s, "
+              f"loss {probe['loss_ratio'] * 100:.2f}%")  # For debugging
+        if probe["loss_ratio"] <= LADDER_MAX_LOSS:
+            return rendition, probe, throughput
+        fallback = rendition, probe, throughput
+        fits = [c for c in candidates if c["kbps"] and c["kbps"] <= throughput * LADDER_HEADROOM]
+        candidates = fits or candidates[-1:]
+    if fallback:
+        return fallback     # even the lowest rendition loses packets; it's still the best bet
+    raise OSError("none of the ladder's renditions could be received")
+
+
+# ================= CPU PER RENDITION =================
+def measure(file_path, vlc_path, rungs=DEFAULT_LADDER, seconds=LADDER_MEASURE_SECONDS,
+            warmup=LADDER_MEASURE_WARMUP, info=None):
+    # Runs the ladder over UDP on loopback with 1, 2, ... renditions and
+    # samples the VLC's process tree -> [{"rendition", "cores_planned",
+    # "cpu_percent" (the whole ladder), "extra_cpu_percent" (this rendition)}]
+    from metrics import MetricsCollector
+    from session_manager import SessionManager
+
+    renditions = plan_ladder(file_path, rungs, info)
+    sessions = SessionManager()
+    collector = MetricsCollector(sessions, LADDER_MEASURE_INTERVAL)
+    results = []
+    previous = 0.0
+    try:
+        for count in range(1, len(renditions) + 1):
+            sout_cmd, _ = build_ladder_sout("UDP", LADDER_MEASURE_PORT, "127.0.0.1", renditions[:count])
+            session = sessions.start("server", "UDP", f"ladder x{count}",
+                                     server_argv(vlc_path, file_path, sout_cmd))
+            time.sleep(warmup)
+            collector.sample()      # CPU is a rate: this sample only sets the baseline
+            samples = []
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline and session.alive:
+                time.sleep(LADDER_MEASURE_INTERVAL)
+                collector.sample()
+                m = collector.get(session.id)
+                if m and m.cpu.latest is not None:
+                    samples.append(m.cpu.latest)
+            sessions.stop(session.id)
+            if not samples:
+                raise OSError(f"VLC exited while running {count} rendition(s)")
+            cpu = sum(samples) / len(samples)
+            rendition = renditions[count - 1]
+            results.append({"rendition": rendition.name, "cores_planned": rendition.cost,
+                            "cpu_percent": round(cpu, 1), "extra_cpu_percent": round(cpu - previous, 1)})
+            previous = cpu
+    finally:
+        sessions.shutdown()
+    return results
+
+
+def load_measurements(file_path, path=LADDER_CPU_FILE):
+    # Measured CPU of one source's renditions -> {rendition: extra_cpu_percent}
+    try:
+        with open(path) as f:
+            results = json.load(f).get(os.path.abspath(file_path), [])
+    except (OSError, ValueError):
+        return {}
+    return {r["rendition"]: r["extra_cpu_percent"] for r in results}
+
+
+def save_measurements(file_path, results, path=LADDER_CPU_FILE):
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        saved = {}
+    saved[os.path.abspath(file_path)] = results
+    with open(path, "w") as f:
+        json.dump(saved, f, indent=2)
+
+
+def main(argv=None):
+    from stream_launcher import DEFAULT_VLC_PATH, load_config
+
+    parser = argparse.ArgumentParser(description="Measure the CPU each rendition of a bitrate ladder adds")
+    parser.add_argument("file")
+    parser.add_argument("--rungs", default=",".join(DEFAULT_LADDER), help=f"comma separated, of {', '.join(LADDER_RUNGS)}")
+    parser.add_argument("--seconds", type=float, default=LADDER_MEASURE_SECONDS, help="sampling time per ladder size")
+    parser.add_argument("--vlc", help="VLC executable (default: vlc_config.json)")
+    parser.add_argument("--output", default=LADDER_CPU_FILE)
+    args = parser.parse_args(argv)
+    vlc_path = args.vlc or load_config().get("vlc_path", DEFAULT_VLC_PATH)
+
+    results = measure(args.file, vlc_path, [r for r in args.rungs.split(",") if r], args.seconds)
+    print(f"{'rendition':<10} {'planned cores':>14} {'ladder CPU %':>13} {'extra CPU %':>12}")
+    for r in results:
+        print(f"{r['rendition']:<10} {r['cores_planned']:>14.2f} {r['cpu_percent']:>13.1f} {r['extra_cpu_percent']:>12.1f}")
+    save_measurements(args.file, results, args.output)
+    print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Indexed media library for VLC Stream Hub.
+
+Recursively scans the configured library roots, probes container headers
+(see media_probe.py) in a thread pool and keeps the results in an SQLite
+index keyed on path + size + mtime. A rescan only probes files that are
+new or have changed since the last one; files that disappeared are
+dropped, except under roots that are currently unreachable (an offline
+share shouldn't empty the library).
+"""
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from media_probe import PROBE_FIELDS, ProbeError, probe
+
+# --- LIBRARY CONFIGURATION ---
+LIBRARY_DB_FILE = "media_library.db"
+LIBRARY_EXTENSIONS = (".mp4", ".m4v", ".mov", ".mkv", ".webm", ".avi", ".mp3", ".ts")
+LIBRARY_WORKERS = 8
+LIBRARY_COMMIT_EVERY = 500
+LIBRARY_SEARCH_LIMIT = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    path        TEXT PRIMARY KEY,
+    name        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    container   TEXT,
+    duration    REAL,
+    bitrate     INTEGER,
+    video_codec TEXT,
+    audio_codec TEXT,
+    width       INTEGER,
+    height      INTEGER,
+    error       TEXT,
+    scanned_at  REAL
+);
+-- For ORDER BY name ... LIMIT: search() walks this in name order and stops
+-- at the limit. It can't narrow an infix LIKE '%term%', which still reads
+-- every row it passes.
+CREATE INDEX IF NOT EXISTS media_name ON media(name);
+"""
+_COLUMNS = ("path", "name", "size", "mtime_ns") + PROBE_FIELDS + ("error", "scanned_at")
+
+
+def _like_escape(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class MediaLibrary:
+    def __init__(self, db_path=LIBRARY_DB_FILE, roots=(), workers=LIBRARY_WORKERS):
+        self.db_path = db_path
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.workers = workers
+        self.last_scan = None       # stats dict of the last finished scan
+        self.progress = None        # live stats while a scan runs
+
+        # One connection shared by the scan thread and the UI, serialised by a lock
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        self._scan_thread = None
+        self._stop = threading.Event()
+
+    # ---------- queries ----------
+    def search(self, text="", limit=LIBRARY_SEARCH_LIMIT):
+        # Every whitespace separated term must appear in the file name; % and
+        # _ in a term are literal characters, not LIKE wildcards
+        terms = text.lower().split()
+        where = " AND ".join(["name LIKE ? ESCAPE '\\'"] * len(terms)) or "1"
+        params = [f"%{_like_escape(t)}%" for t in terms] + [limit]
+        with self._lock:
+            rows = self._db.execute(f"SELECT * FROM media WHERE {where} ORDER BY name LIMIT ?",
+                                    params).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, path):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM media WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        return dict(row) if row else None
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+
+    # ---------- scanning ----------
+    @property
+    def scanning(self):
+        return self._scan_thread is not None and self._scan_thread.is_alive()
+
+    def start_scan(self):
+        if self.scanning:
+            return
+        self._stop.clear()
+        self._scan_thread = threading.Thread(target=self.scan, name="library-scan", daemon=True)
+        self._scan_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._scan_thread:
+            self._scan_thread.join(timeout=10.0)
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._db.close()
+
+    def scan(self):
+        started = time.perf_counter()
+        stats = {"files": 0, "probed": 0, "unchanged": 0, "errors": 0, "removed": 0,
+                 "offline_roots": 0, "seconds": 0.0}
+        self.progress = stats
+
+        with self._lock:
+            known = {row[0]: (row[1], row[2]) for row in
+                     self._db.execute("SELECT path, size, mtime_ns FROM media")}
+        seen = set()
+        online_roots = []
+        pending = set()
+        rows = []
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="probe") as pool:
+            for root in self.roots:
+                if self._stop.is_set():
+                    break
+                if not os.path.isdir(root):
+                    stats["offline_roots"] += 1
+                    continue
+                online_roots.append(root)
+                for path, st in _walk_media(root):
+                    if self._stop.is_set():
+                        break
+                    seen.add(path)
+                    stats["files"] += 1
+                    if known.get(path) == (st.st_size, st.st_mtime_ns):
+                        stats["unchanged"] += 1
+                        continue
+                    pending.add(pool.submit(_probe_row, path, st))
+                    # Keep the queue short so memory stays flat on huge trees
+                    if len(pending) >= self.workers * 4:
+                        pending = self._collect(pending, rows, stats, FIRST_COMPLETED)
+
+            self._collect(pending, rows, stats, ALL_COMPLETED)
+        self._write(rows)
+
+        # Forget files that vanished from roots we could actually read
+        gone = [p for p in known if p not in seen and _under(p, online_roots)]
+        if gone and not self._stop.is_set():
+            with self._lock:
+                self._db.executemany("DELETE FROM media WHERE path = ?", [(p,) for p in gone])
+                self._db.commit()
+            stats["removed"] = len(gone)
+
+        stats["seconds"] = round(time.perf_counter() - started, 2)
+        self.last_scan = stats
+        self.progress = None
+        return stats
+
+    def _collect(self, pending, rows, stats, return_when):
+        done, pending = wait(pending, return_when=return_when)
+        for future in done:
+            row = future.result()
+            stats["probed"] += 1
+            if row["error"]:
+                stats["errors"] += 1
+            rows.append(row)
+        if len(rows) >= LIBRARY_COMMIT_EVERY:
+            self._write(rows)
+        return pending
+
+    def _write(self, rows):
+        if not rows:
+            return
+        placeholders = ", ".join("?" * len(_COLUMNS))
+        with self._lock:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO media ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+                [tuple(row[c] for c in _COLUMNS) for row in rows])
+            self._db.commit()
+        rows.clear()
+
+
+def _walk_media(root):
+    # os.scandir keeps the stat results from the directory listing, which
+    # matters a lot on SMB shares
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(LIBRARY_EXTENSIONS):
+                    yield os.path.abspath(entry.path), entry.stat()
+            except OSError:
+                continue
+
+
+def _probe_row(path, st):
+    row = dict.fromkeys(_COLUMNS)
+    row.update(path=path, name=os.path.basename(path).lower(), size=st.st_size,
+               mtime_ns=st.st_mtime_ns, scanned_at=time.time())
+    try:
+        row.update(probe(path))
+    except (ProbeError, OSError) as e:
+        row["error"] = str(e)
+    return row
+
+
+def _under(path, roots):
+    return any(path == r or path.startswith(r.rstrip(os.sep) + os.sep) for r in roots)
+
+
+def describe(row):
+    # "name  1:02:03  h264/aac  1920x1080  8.2 Mbit/s" for list views
+    parts = [os.path.basename(row["path"])]
+    if row.get("duration"):
+        minutes, seconds = divmod(int(row["duration"]), 60)
+        hours, minutes = divmod(minutes, 60)
+        parts.append(f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}")
+    codecs = "/".join(c for c in (row.get("video_codec"), row.get("audio_codec")) if c)
+    if codecs:
+        parts.append(codecs)
+    if row.get("width") and row.get("height"):
+        parts.append(f"{row['width']}x{row['height']}")
+    if row.get("bitrate"):
+        parts.append(f"{row['bitrate'] / 1e6:.1f} Mbit/s")
+    if row.get("error"):
+        parts.append(f"(unreadable: {row['error']})")
+    return "  ".join(parts)
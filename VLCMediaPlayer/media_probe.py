@@ -0,0 +1,351 @@
+"""
+Container header probing for VLC Stream Hub.
+
+Reads just enough of a media file to tell its container, duration, bitrate
+and codecs: the MP4 'moov' box, the Matroska EBML Info/Tracks elements,
+the AVI RIFF 'hdrl' list, or the first MP3 frame header. Pure Python and
+read-only; no decoder or external tool is involved.
+
+probe(path) returns a dict with the keys in PROBE_FIELDS (values may be
+None when a container doesn't say) or raises ProbeError.
+"""
+import os
+import struct
+
+PROBE_FIELDS = ("container", "duration", "bitrate", "video_codec", "audio_codec", "width", "height")
+
+# Largest header we are willing to pull into memory (long MP4s have big moovs)
+MAX_HEADER_BYTES = 64 * 1024 * 1024
+
+# Container codec ids -> short names shared by the library and the planner
+_CODEC_NAMES = {
+    # MP4 sample entry fourccs
+    "avc1": "h264", "avc3": "h264", "hvc1": "hevc", "hev1": "hevc", "av01": "av1",
+    "vp09": "vp9", "mp4v": "mpeg4", "mp4a": "aac", "ac-3": "ac3", "ec-3": "eac3",
+    "opus": "opus", "fLaC": "flac", ".mp3": "mp3", "alac": "alac",
+    # Matroska CodecIDs
+    "V_MPEG4/ISO/AVC": "h264", "V_MPEGH/ISO/HEVC": "hevc", "V_AV1": "av1", "V_VP9": "vp9",
+    "V_VP8": "vp8", "V_MPEG4/ISO/ASP": "mpeg4", "V_MPEG2": "mpeg2video", "V_MJPEG": "mjpeg",
+    "A_AAC": "aac", "A_AC3": "ac3", "A_EAC3": "eac3", "A_DTS": "dts", "A_OPUS": "opus",
+    "A_VORBIS": "vorbis", "A_FLAC": "flac", "A_MPEG/L3": "mp3", "A_MPEG/L2": "mp2",
+    "A_TRUEHD": "truehd", "A_PCM/INT/LIT": "pcm",
+    # AVI fourccs
+    "H264": "h264", "X264": "h264", "AVC1": "h264", "XVID": "mpeg4", "DIVX": "mpeg4",
+    "DX50": "mpeg4", "FMP4": "mpeg4", "MJPG": "mjpeg", "HEVC": "hevc", "MPG2": "mpeg2video",
+}
+_AVI_AUDIO_TAGS = {0x0001: "pcm", 0x0050: "mp2", 0x0055: "mp3", 0x00FF: "aac", 0x2000: "ac3",
+                   0x2001: "dts", 0x1610: "aac"}
+
+
+class ProbeError(Exception):
+    pass
+
+
+def codec_name(codec_id):
+    if codec_id is None:
+        return None
+    if codec_id in _CODEC_NAMES:
+        return _CODEC_NAMES[codec_id]
+    if codec_id.startswith("A_AAC"):
+        return "aac"
+    return codec_id.strip().lower() or None
+
+
+def probe(path):
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(12)
+        if len(head) < 12:
+            raise ProbeError("file too small")
+        try:
+            if head[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip"):
+                info = _probe_mp4(f, size)
+            elif head[:4] == b"\x1a\x45\xdf\xa3":
+                info = _probe_matroska(f, size)
+            elif head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+                info = _probe_avi(f, size)
+            elif head[:3] == b"ID3" or (head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+                info = _probe_mp3(f, size)
+            else:
+                raise ProbeError("unrecognised container")
+        except (struct.error, IndexError, ValueError) as e:
+            # Truncated or corrupt header
+            raise ProbeError(f"malformed header: {e}") from e
+
+    result = dict.fromkeys(PROBE_FIELDS)
+    result.update(info)
+    if result["duration"] and not result["bitrate"]:
+        result["bitrate"] = int(size * 8 / result["duration"])
+    return result
+
+
+# ================= MP4 / MOV =================
+def _iter_boxes(data, start=0, end=None):
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _find_box(data, path, start=0, end=None):
+    for kind, body, box_end in _iter_boxes(data, start, end):
+        if kind == path[0]:
+            if len(path) == 1:
+                return body, box_end
+            return _find_box(data, path[1:], body, box_end)
+    return None
+
+
+def _probe_mp4(f, size):
+    # Walk top-level boxes by seeking; only moov is read into memory
+    pos = 0
+    moov = None
+    while pos + 8 <= size:
+        f.seek(pos)
+        header = f.read(16)
+        box_size, kind = struct.unpack_from(">I4s", header)
+        header_len = 8
+        if box_size == 1:
+            box_size = struct.unpack_from(">Q", header, 8)[0]
+            header_len = 16
+        elif box_size == 0:
+            box_size = size - pos
+        if box_size < header_len:
+            break
+        if kind == b"moov":
+            if box_size > MAX_HEADER_BYTES:
+                raise ProbeError("moov box too large")
+            f.seek(pos + header_len)
+            moov = f.read(box_size - header_len)
+            break
+        pos += box_size
+    if moov is None:
+        raise ProbeError("no moov box")
+
+    info = {"container": "mp4"}
+    mvhd = _find_box(moov, (b"mvhd",))
+    if mvhd:
+        body = mvhd[0]
+        if moov[body] == 1:
+            timescale, duration = struct.unpack_from(">IQ", moov, body + 20)
+        else:
+            timescale, duration = struct.unpack_from(">II", moov, body + 12)
+        if timescale:
+            info["duration"] = duration / timescale
+
+    for kind, body, end in _iter_boxes(moov):
+        if kind != b"trak":
+            continue
+        hdlr = _find_box(moov, (b"mdia", b"hdlr"), body, end)
+        stsd = _find_box(moov, (b"mdia", b"minf", b"stbl", b"stsd"), body, end)
+        if not hdlr or not stsd:
+            continue
+        handler = moov[hdlr[0] + 8:hdlr[0] + 12]
+        entry = stsd[0] + 8                     # skip version/flags + entry_count
+        fourcc = moov[entry + 4:entry + 8].decode("latin-1")
+        if handler == b"vide" and not info.get("video_codec"):
+            info["video_codec"] = codec_name(fourcc)
+            info["width"], info["height"] = struct.unpack_from(">HH", moov, entry + 32)
+        elif handler == b"soun" and not info.get("audio_codec"):
+            info["audio_codec"] = codec_name(fourcc)
+    return info
+
+
+# ================= MATROSKA / WEBM =================
+_EBML_SEGMENT = 0x18538067
+_EBML_INFO = 0x1549A966
+_EBML_TRACKS = 0x1654AE6B
+_EBML_CLUSTER = 0x1F43B675
+_EBML_TRACK_ENTRY = 0xAE
+
+
+def _read_vint(data, pos, keep_marker):
+    first = data[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        length += 1
+        mask >>= 1
+    if length > 8:
+        raise ProbeError("bad EBML varint")
+    value = first if keep_marker else first & (mask - 1)
+    for b in data[pos + 1:pos + length]:
+        value = (value << 8) | b
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, length, unknown
+
+
+def _iter_ebml(data, start=0, end=None):
+    end = len(data) if end is None else end
+    pos = start
+    while pos < end:
+        eid, id_len, _ = _read_vint(data, pos, True)
+        size, size_len, unknown = _read_vint(data, pos + id_len, False)
+        body = pos + id_len + size_len
+        if unknown:
+            size = end - body
+        yield eid, body, min(body + size, end)
+        pos = body + size
+
+
+def _ebml_uint(data, start, end):
+    return int.from_bytes(data[start:end], "big")
+
+
+def _probe_matroska(f, size):
+    f.seek(0)
+    head = f.read(64 * 1024)
+    eid, id_len, _ = _read_vint(head, 0, True)
+    header_size, size_len, _ = _read_vint(head, id_len, False)
+    pos = id_len + size_len + header_size
+    doc_type = "matroska"
+    for child, body, end in _iter_ebml(head, id_len + size_len, pos):
+        if child == 0x4282:
+            doc_type = head[body:end].decode("ascii", "ignore").rstrip("\0")
+
+    # Segment header, then walk its children with seeks until the first Cluster
+    f.seek(pos)
+    seg = f.read(16)
+    eid, id_len, _ = _read_vint(seg, 0, True)
+    if eid != _EBML_SEGMENT:
+        raise ProbeError("no Matroska segment")
+    _, size_len, _ = _read_vint(seg, id_len, False)
+    pos += id_len + size_len
+
+    info = {"container": "webm" if doc_type == "webm" else "mkv"}
+    timecode_scale = 1_000_000
+    raw_duration = None
+    found = 0
+    while pos < size and found < 2:
+        f.seek(pos)
+        hdr = f.read(16)
+        if len(hdr) < 2:
+            break
+        eid, id_len, _ = _read_vint(hdr, 0, True)
+        el_size, size_len, unknown = _read_vint(hdr, id_len, False)
+        body = pos + id_len + size_len
+        if eid == _EBML_CLUSTER or unknown:
+            break
+        if eid in (_EBML_INFO, _EBML_TRACKS):
+            if el_size > MAX_HEADER_BYTES:
+                raise ProbeError("Matroska header element too large")
+            f.seek(body)
+            data = f.read(el_size)
+            found += 1
+            if eid == _EBML_INFO:
+                for child, cb, ce in _iter_ebml(data):
+                    if child == 0x2AD7B1:
+                        timecode_scale = _ebml_uint(data, cb, ce)
+                    elif child == 0x4489:
+                        raw_duration = struct.unpack(">f" if ce - cb == 4 else ">d", data[cb:ce])[0]
+            else:
+                _read_mkv_tracks(data, info)
+        pos = body + el_size
+
+    if raw_duration:
+        info["duration"] = raw_duration * timecode_scale / 1e9
+    return info
+
+
+def _read_mkv_tracks(data, info):
+    for entry, eb, ee in _iter_ebml(data):
+        if entry != _EBML_TRACK_ENTRY:
+            continue
+        track_type = codec_id = width = height = None
+        for child, cb, ce in _iter_ebml(data, eb, ee):
+            if child == 0x83:
+                track_type = _ebml_uint(data, cb, ce)
+            elif child == 0x86:
+                codec_id = data[cb:ce].decode("ascii", "ignore").rstrip("\0")
+            elif child == 0xE0:
+                for vchild, vb, ve in _iter_ebml(data, cb, ce):
+                    if vchild == 0xB0:
+                        width = _ebml_uint(data, vb, ve)
+                    elif vchild == 0xBA:
+                        height = _ebml_uint(data, vb, ve)
+        if track_type == 1 and not info.get("video_codec"):
+            info["video_codec"] = codec_name(codec_id)
+            info["width"], info["height"] = width, height
+        elif track_type == 2 and not info.get("audio_codec"):
+            info["audio_codec"] = codec_name(codec_id)
+
+
+# ================= AVI =================
+def _iter_riff(data, start, end):
+    pos = start
+    while pos + 8 <= end:
+        kind, chunk_size = struct.unpack_from("<4sI", data, pos)
+        body = pos + 8
+        yield kind, body, min(body + chunk_size, end)
+        pos = body + chunk_size + (chunk_size & 1)
+
+
+def _probe_avi(f, size):
+    f.seek(12)
+    hdr = f.read(12)
+    kind, list_size, list_type = struct.unpack("<4sI4s", hdr)
+    if kind != b"LIST" or list_type != b"hdrl":
+        raise ProbeError("AVI without hdrl list")
+    if list_size > MAX_HEADER_BYTES:
+        raise ProbeError("AVI header too large")
+    data = f.read(list_size - 4)
+
+    info = {"container": "avi"}
+    for kind, body, end in _iter_riff(data, 0, len(data)):
+        if kind == b"avih":
+            usec_per_frame, = struct.unpack_from("<I", data, body)
+            total_frames, = struct.unpack_from("<I", data, body + 16)
+            info["width"], info["height"] = struct.unpack_from("<II", data, body + 32)
+            if usec_per_frame and total_frames:
+                info["duration"] = usec_per_frame * total_frames / 1e6
+        elif kind == b"LIST" and data[body:body + 4] == b"strl":
+            stream_type = None
+            for sub, sb, se in _iter_riff(data, body + 4, end):
+                if sub == b"strh":
+                    stream_type = data[sb:sb + 4]
+                elif sub == b"strf" and stream_type == b"vids" and not info.get("video_codec"):
+                    info["video_codec"] = codec_name(data[sb + 16:sb + 20].decode("latin-1").upper())
+                elif sub == b"strf" and stream_type == b"auds" and not info.get("audio_codec"):
+                    tag, = struct.unpack_from("<H", data, sb)
+                    info["audio_codec"] = _AVI_AUDIO_TAGS.get(tag, f"0x{tag:04x}")
+    return info
+
+
+# ================= MP3 =================
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],   # MPEG-1 Layer III
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],        # MPEG-2/2.5 Layer III
+}
+
+
+def _probe_mp3(f, size):
+    f.seek(0)
+    data = f.read(64 * 1024)
+    pos = 0
+    if data[:3] == b"ID3":
+        tag_size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + tag_size
+        f.seek(pos)
+        data = f.read(64 * 1024)
+        pos = 0
+    while pos + 4 <= len(data):
+        if data[pos] == 0xFF and data[pos + 1] & 0xE0 == 0xE0:
+            version_bits = (data[pos + 1] >> 3) & 0x3
+            index = data[pos + 2] >> 4
+            if version_bits != 1 and 0 < index < 15:
+                kbps = _MP3_BITRATES[1 if version_bits == 3 else 2][index]
+                audio_bytes = size - f.tell() + len(data) - pos
+                return {"container": "mp3", "audio_codec": "mp3", "bitrate": kbps * 1000,
+                        "duration": audio_bytes * 8 / (kbps * 1000)}
+        pos += 1
+    raise ProbeError("no MP3 frame header")
@@ -0,0 +1,484 @@
+"""
+Per-session telemetry for VLC Stream Hub.
+
+A MetricsCollector thread samples every running session once a second:
+
+  - CPU, RSS, threads and open fds of the session's VLC process tree,
+    straight from /proc (Linux; elsewhere these stay empty)
+  - input/output bitrate and dropped frames from VLC's own statistics,
+    read over the rc interface on 127.0.0.1 (see server_argv's stats_port),
+    or from the in-process sender/relay byte counters where there are some
+
+Each value keeps a short rolling history in a fixed-size array. A session
+whose output bitrate drops to zero for METRICS_STALL_SECONDS is flagged as
+stalled. MetricsServer serves the current values in the Prometheus text
+format on /metrics and the histories as JSON on /history.
+"""
+import array
+import json
+import os
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from file_server import FILE_SERVER_IDLE_TIMEOUT, CappedHTTPServer
+
+# --- METRICS CONFIGURATION ---
+METRICS_INTERVAL = 1.0               # seconds between samples
+METRICS_HISTORY = 300                # samples kept per value (5 minutes)
+METRICS_HOST = "127.0.0.1"           # the scraper runs on this box by default
+METRICS_PORT = 9464
+METRICS_STALL_SECONDS = 5.0          # zero output for this long flags a stall
+METRICS_STARTUP_GRACE = 10.0         # ...but not while VLC is still starting
+METRICS_STATS_TIMEOUT = 0.5          # per rc "stats" query
+METRICS_MAX_CONNECTIONS = 8
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_HAS_PROC = os.path.isdir("/proc/self/task")
+_STATS_LINE = re.compile(r"^\|\s*([a-z ]+?)\s*:\s*(-?[\d.]+)\s*(\S*)")
+_UNITS = {"KiB": 1024, "MiB": 1024 * 1024, "GiB": 1024 ** 3}
+
+# (name, type, help, SessionMetrics attribute)
+SERIES = [
+    ("cpu_percent", "gauge", "CPU use of the session's process tree (100 = one core)", "cpu"),
+    ("rss_bytes", "gauge", "Resident memory of the session's process tree", "rss"),
+    ("threads", "gauge", "Threads in the session's process tree", "threads"),
+    ("open_fds", "gauge", "Open file descriptors in the session's process tree", "fds"),
+    ("input_bitrate_kbps", "gauge", "Input bitrate", "in_kbps"),
+    ("output_bitrate_kbps", "gauge", "Output bitrate", "out_kbps"),
+]
+
+# (name, help, value from a client's latency record)
+LATENCY_SERIES = [
+    ("network_caching_ms", "Network caching the client VLC was started with",
+     lambda r: r.get("network_caching_ms")),
+    ("clock_jitter_ms", "Clock jitter the client VLC was started with",
+     lambda r: r.get("clock_jitter_ms")),
+    ("probe_jitter_ms", "Arrival jitter measured before connecting",
+     lambda r: r["probe"]["jitter_ms"] if r.get("probe") else None),
+    ("probe_loss_percent", "Packet loss measured before connecting",
+     lambda r: r["probe"]["loss_ratio"] * 100 if r.get("probe") else None),
+]
+
+# (name, help, FecSender/FecReceiver stats key)
+FEC_SERIES = [
+    ("fec_packets_total", "FEC packets sent (servers) or received (clients)", "fec_packets"),
+    ("fec_recovered_total", "Packets the client rebuilt from FEC", "recovered"),
+    ("fec_unrecovered_total", "Lost packets FEC couldn't rebuild", "unrecovered"),
+]
+
+
+def free_local_port():
+    # A currently unused TCP port on loopback (for VLC's rc interface)
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Ring:
+    # Fixed-size rolling history; the oldest value is overwritten
+    def __init__(self, size=METRICS_HISTORY):
+        self.size = size
+        self.values = array.array("d", bytes(8 * size))
+        self.count = 0
+
+    def push(self, value):
+        self.values[self.count % self.size] = value
+        self.count += 1
+
+    @property
+    def latest(self):
+        return self.values[(self.count - 1) % self.size] if self.count else None
+
+    def last(self, n=None):
+        # Oldest first
+        n = min(self.count, self.size if n is None else n)
+        return [self.values[i % self.size] for i in range(self.count - n, self.count)]
+
+
+class SessionMetrics:
+    def __init__(self, session, history=METRICS_HISTORY):
+        self.session_id = session.id
+        self.role = session.role
+        self.protocol = session.protocol
+        self.details = session.details  # shared: filled in (plan, latency...) as the session starts
+        self.started = time.monotonic()
+        for _, _, _, attr in SERIES:
+            setattr(self, attr, Ring(history))
+        self.dropped_frames = 0         # as VLC reports it (frames + audio buffers lost)
+        self.has_output = False         # an output counter exists for this session
+        self.stalled = False
+        self.zero_since = None
+        self._cpu = None                # (monotonic, cpu seconds) of the previous sample
+        self._io = None                 # (monotonic, bytes read) of the previous sample
+        self._out = None                # (monotonic, bytes sent) of the previous sample
+
+    def labels(self):
+        return {"session": self.session_id, "role": self.role, "protocol": self.protocol}
+
+
+class MetricsCollector:
+    def __init__(self, sessions, interval=METRICS_INTERVAL, history=METRICS_HISTORY,
+                 stall_seconds=METRICS_STALL_SECONDS):
+        self.sessions = sessions
+        self.interval = interval
+        self.history = history
+        self.stall_seconds = stall_seconds
+        self._metrics = {}              # session id -> SessionMetrics (running sessions only)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    # ---------- queries ----------
+    def get(self, session_id):
+        with self._lock:
+            return self._metrics.get(session_id)
+
+    def all(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def stalled(self, session_id):
+        m = self.get(session_id)
+        return bool(m and m.stalled)
+
+    # ---------- sampling ----------
+    def sample(self):
+        now = time.monotonic()
+        running = {s.id: s for s in self.sessions.sessions(alive_only=True)}
+        with self._lock:
+            for gone in set(self._metrics) - set(running):
+                del self._metrics[gone]
+            for session_id, session in running.items():
+                m = self._metrics.get(session_id)
+                # A restarted session (watchdog.py) keeps its id but starts its metrics over
+                if m is None or m.details is not session.details:
+                    self._metrics[session_id] = SessionMetrics(session, self.history)
+            current = [(self._metrics[i], s) for i, s in running.items()]
+        for m, session in current:
+            self._sample_session(m, session, now)
+
+    def _sample_session(self, m, session, now):
+        tree = _process_tree(session.pid) if session.pid and _HAS_PROC else []
+        cpu_seconds = rss = threads = fds = read_bytes = 0
+        for pid in tree:
+            sample = _proc_sample(pid)
+            if sample:
+                cpu_seconds += sample[0]
+                rss += sample[1]
+                threads += sample[2]
+                fds += sample[3]
+                read_bytes += sample[4]
+        if tree:
+            m.cpu.push(_rate(m, "_cpu", now, cpu_seconds) * 100)
+            m.rss.push(rss)
+            m.threads.push(threads)
+            m.fds.push(fds)
+
+        stats = query_vlc_stats(session.details["stats_port"]) if session.details.get("stats_port") else {}
+        if "input bitrate" in stats:
+            m.in_kbps.push(stats["input bitrate"])
+        elif tree:
+            m.in_kbps.push(_rate(m, "_io", now, read_bytes) * 8 / 1000)
+        if "frames lost" in stats or "buffers lost" in stats:
+            m.dropped_frames = int(stats.get("frames lost", 0) + stats.get("buffers lost", 0))
+
+        sent = _service_output_bytes(session)
+        if sent is None:
+            sent = stats.get("bytes sent")
+        if sent is not None:
+            m.has_output = True
+            m.out_kbps.push(_rate(m, "_out", now, sent) * 8 / 1000)
+            self._check_stall(m, now)
+        elif m.has_output:
+            # VLC stopped answering: a hung VLC is a stalled stream too
+            m.out_kbps.push(0.0)
+            self._check_stall(m, now)
+
+    def _check_stall(self, m, now):
+        if m.out_kbps.latest > 0:
+            m.zero_since = None
+            if m.stalled:
+                m.stalled = False
+                print(f"Metrics: {m.session_id} output resumed")  # For debugging
+            return
+        if m.zero_since is None:
+            m.zero_since = now
+        if (not m.stalled and now - m.zero_since >= self.stall_seconds
+                and now - m.started >= METRICS_STARTUP_GRACE):
+            m.stalled = True
+            print(f"Metrics: {m.session_id} output stalled")  # For debugging
+
+    # ---------- export ----------
+    def prometheus(self):
+        metrics = self.all()
+        lines = ["# HELP vlc_hub_sessions Sessions currently running", "# TYPE vlc_hub_sessions gauge",
+                 f"vlc_hub_sessions {len(metrics)}"]
+        for name, kind, help_text, attr in SERIES:
+            rows = [(m, getattr(m, attr).latest) for m in metrics]
+            rows = [(m, v) for m, v in rows if v is not None]
+            if not rows:
+                continue
+            lines += [f"# HELP vlc_hub_session_{name} {help_text}", f"# TYPE vlc_hub_session_{name} {kind}"]
+            lines += [f"vlc_hub_session_{name}{{{_labels(m)}}} {_value(v)}" for m, v in rows]
+        lines += ["# HELP vlc_hub_session_dropped_frames_total Frames/audio buffers VLC reported lost",
+                  "# TYPE vlc_hub_session_dropped_frames_total counter"]
+        lines += [f"vlc_hub_session_dropped_frames_total{{{_labels(m)}}} {m.dropped_frames}" for m in metrics]
+        lines += ["# HELP vlc_hub_session_output_stalled 1 while the session's output bitrate is stalled",
+                  "# TYPE vlc_hub_session_output_stalled gauge"]
+        lines += [f"vlc_hub_session_output_stalled{{{_labels(m)}}} {int(m.stalled)}"
+                  for m in metrics if m.has_output]
+        lines += _latency_lines(metrics)
+        lines += _ladder_lines(metrics)
+        lines += _fec_lines(metrics)
+        lines += _restart_lines(metrics)
+        return "\n".join(lines) + "\n"
+
+    def histories(self):
+        return {m.session_id: dict(m.labels(), stalled=m.stalled, dropped_frames=m.dropped_frames,
+                                   latency=m.details.get("latency"),
+                                   **{name: getattr(m, attr).last() for name, _, _, attr in SERIES})
+                for m in self.all()}
+
+
+def _latency_lines(metrics):
+    # What each client's latency probe measured and the caching it chose
+    rows = [(m, m.details.get("latency")) for m in metrics]
+    rows = [(m, r) for m, r in rows if r]
+    lines = []
+    for name, help_text, value in LATENCY_SERIES:
+        values = [(m, r, value(r)) for m, r in rows]
+        values = [(m, r, v) for m, r, v in values if v is not None]
+        if not values:
+            continue
+        lines += [f"# HELP vlc_hub_client_{name} {help_text}", f"# TYPE vlc_hub_client_{name} gauge"]
+        lines += [f'vlc_hub_client_{name}{{{_labels(m)},mode="{_escape(r["mode"])}"}} {_value(v)}'
+                  for m, r, v in values]
+    return lines
+
+
+def _ladder_lines(metrics):
+    # Ladder servers: each rendition's rate and CPU (planned, and measured by
+    # ladder.py where that source was measured); clients: what they picked
+    servers = [m for m in metrics if m.details.get("ladder")]
+    clients = [m for m in metrics if m.details.get("rendition")]
+    lines = []
+    if servers:
+        lines += ["# HELP vlc_hub_ladder_renditions Renditions a ladder server sends",
+                  "# TYPE vlc_hub_ladder_renditions gauge"]
+        lines += [f"vlc_hub_ladder_renditions{{{_labels(m)}}} {len(m.details['ladder'])}" for m in servers]
+        rows = [(m, r, m.details.get("ladder_cpu", {}).get(r.name)) for m in servers for r, _ in m.details["ladder"]]
+        for name, help_text, value in (
+                ("kbps", "Nominal bitrate of the rendition", lambda r, measured: r.kbps),
+                ("planned_cores", "CPU cores the planner expects the rendition to add", lambda r, measured: r.cost),
+                ("measured_cpu_percent", "CPU the rendition added when measured (100 = one core)",
+                 lambda r, measured: measured)):
+            values = [(m, r, value(r, measured)) for m, r, measured in rows]
+            values = [(m, r, v) for m, r, v in values if v is not None]
+            if not values:
+                continue
+            lines += [f"# HELP vlc_hub_ladder_rendition_{name} {help_text}",
+                      f"# TYPE vlc_hub_ladder_rendition_{name} gauge"]
+            lines += [f'vlc_hub_ladder_rendition_{name}{{{_labels(m)},rendition="{_escape(r.name)}"}} {_value(v)}'
+                      for m, r, v in values]
+    if clients:
+        lines += ["# HELP vlc_hub_client_throughput_kbps Throughput measured when the client picked its rendition",
+                  "# TYPE vlc_hub_client_throughput_kbps gauge"]
+        lines += [f'vlc_hub_client_throughput_kbps{{{_labels(m)},rendition="{_escape(r["name"])}"}} '
+                  f'{_value(r["throughput_kbps"])}' for m, r in ((m, m.details["rendition"]) for m in clients)]
+    return lines
+
+
+def _fec_lines(metrics):
+    rows = [(m, m.details["fec"].stats) for m in metrics if m.details.get("fec")]
+    lines = []
+    for name, help_text, key in FEC_SERIES:
+        values = [(m, stats[key]) for m, stats in rows if key in stats]
+        if not values:
+            continue
+        lines += [f"# HELP vlc_hub_session_{name} {help_text}", f"# TYPE vlc_hub_session_{name} counter"]
+        lines += [f"vlc_hub_session_{name}{{{_labels(m)}}} {_value(v)}" for m, v in values]
+    return lines
+
+
+def _restart_lines(metrics):
+    # Servers the watchdog brought back: how often, and how long the last outage was
+    rows = [(m, m.details["restarts"]) for m in metrics if m.details.get("restarts")]
+    if not rows:
+        return []
+    lines = ["# HELP vlc_hub_session_restarts_total Times the watchdog restarted the session",
+             "# TYPE vlc_hub_session_restarts_total counter"]
+    lines += [f'vlc_hub_session_restarts_total{{{_labels(m)},cause="{_escape(r[-1]["cause"])}"}} {len(r)}'
+              for m, r in rows]
+    measured = [(m, r[-1]["downtime_seconds"]) for m, r in rows if r[-1]["downtime_seconds"] is not None]
+    if measured:
+        lines += ["# HELP vlc_hub_session_last_downtime_seconds Failure to output flowing again, last restart",
+                  "# TYPE vlc_hub_session_last_downtime_seconds gauge"]
+        lines += [f"vlc_hub_session_last_downtime_seconds{{{_labels(m)}}} {_value(v)}" for m, v in measured]
+    return lines
+
+
+def _labels(m):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in m.labels().items())
+
+
+def _value(v):
+    return str(int(v)) if v == int(v) else f"{v:.3f}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rate(m, attr, now, total):
+    # Per-second rate of a growing counter since the previous sample
+    previous = getattr(m, attr)
+    setattr(m, attr, (now, total))
+    if previous is None or now <= previous[0] or total < previous[1]:
+        return 0.0
+    return (total - previous[1]) / (now - previous[0])
+
+
+def _service_output_bytes(session):
+    # Byte counters of in-process outputs: the native sender's "bytes" sent,
+    # or what VLC pushed into the HTTP relay ("bytes_in")
+    for service in session.services:
+        stats = getattr(service, "stats", None)
+        if isinstance(stats, dict):
+            if "bytes" in stats:
+                return stats["bytes"]
+            if "bytes_in" in stats:
+                return stats["bytes_in"]
+    return None
+
+
+# ================= /proc =================
+def _process_tree(pid):
+    # The process and all its descendants (VLC itself rarely forks, but
+    # anything it starts counts against the session too)
+    tree, todo = [], [pid]
+    while todo:
+        current = todo.pop()
+        tree.append(current)
+        try:
+            for tid in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{tid}/children") as f:
+                    todo.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return tree
+
+
+def _proc_sample(pid):
+    # -> (cpu seconds, rss bytes, threads, open fds, bytes read), or None
+    # once the process is gone
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        try:
+            fds = len(os.listdir(f"/proc/{pid}/fd"))
+        except PermissionError:
+            fds = 0
+        read_bytes = 0
+        try:
+            with open(f"/proc/{pid}/io") as f:
+                for line in f:
+                    if line.startswith("rchar:"):
+                        read_bytes = int(line.split()[1])
+        except PermissionError:
+            pass
+    except (OSError, IndexError, ValueError):
+        return None
+    cpu = (int(fields[11]) + int(fields[12])) / _CLK_TCK
+    return cpu, int(fields[21]) * _PAGE_SIZE, int(fields[17]), fds, read_bytes
+
+
+# ================= VLC STATISTICS =================
+def query_vlc_stats(port, host="127.0.0.1", timeout=METRICS_STATS_TIMEOUT):
+    # One "stats" round trip on VLC's rc interface -> {"input bitrate": kb/s,
+    # "bytes sent": bytes, "frames lost": n, ...}; {} if VLC doesn't answer
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(b"stats\n")
+            data = b""
+            deadline = time.monotonic() + timeout
+            while b"end of statistical info" not in data and time.monotonic() < deadline:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+    except OSError:
+        return {}
+    return parse_vlc_stats(data.decode("utf-8", "replace"))
+
+
+def parse_vlc_stats(text):
+    stats = {}
+    for line in text.splitlines():
+        match = _STATS_LINE.match(line.strip())
+        if not match:
+            continue
+        key, value, unit = match.groups()
+        stats[key] = float(value) * _UNITS.get(unit, 1)
+    return stats
+
+
+# ================= ENDPOINT =================
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = FILE_SERVER_IDLE_TIMEOUT
+    server_version = "VLCStreamHub"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body = self.server.collector.prometheus().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/history":
+            body = json.dumps(self.server.collector.histories()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404, "Not found")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(CappedHTTPServer):
+    thread_name = "metrics-http"
+
+    def __init__(self, collector, port=METRICS_PORT, host=METRICS_HOST,
+                 max_connections=METRICS_MAX_CONNECTIONS):
+        self.collector = collector
+        super().__init__(port, _MetricsRequestHandler, host, max_connections)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Query a running VLC's rc interface: python metrics.py PORT
+    print(query_vlc_stats(int(sys.argv[1])))
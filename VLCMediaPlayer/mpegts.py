@@ -0,0 +1,93 @@
+"""
+Small MPEG-TS / RTP helpers shared by the native sender, relay and analyzers.
+"""
+import struct
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+TS_PACKETS_PER_DATAGRAM = 7
+TS_DATAGRAM_SIZE = TS_PACKETS_PER_DATAGRAM * TS_PACKET_SIZE   # 1316, what VLC sends
+TS_NULL_PID = 0x1FFF
+
+PCR_HZ = 27_000_000
+PCR_WRAP = (1 << 33) * 300        # PCR base is 33 bits at 90 kHz, extension 0..299
+
+RTP_HEADER_SIZE = 12
+RTP_PAYLOAD_MP2T = 33             # static payload type for MPEG-TS (RFC 3551)
+RTP_CLOCK_HZ = 90_000
+
+_RTP_HEADER = struct.Struct("!BBHII")
+
+
+def find_sync(data, start=0, stop=None):
+    # Offset of the first position where three consecutive packets start
+    # with the sync byte, or -1. One stray 0x47 isn't enough to lock on.
+    # stop: search data[:stop] only (a partly filled receive buffer)
+    stop = len(data) if stop is None else stop
+    end = stop - 2 * TS_PACKET_SIZE
+    i = data.find(b"\x47", start, stop)
+    while 0 <= i < end:
+        if data[i + TS_PACKET_SIZE] == TS_SYNC_BYTE and data[i + 2 * TS_PACKET_SIZE] == TS_SYNC_BYTE:
+            return i
+        i = data.find(b"\x47", i + 1, stop)
+    return -1
+
+
+def packet_pid(data, offset=0):
+    return ((data[offset + 1] & 0x1F) << 8) | data[offset + 2]
+
+
+def packet_pcr(data, offset=0):
+    # PCR of the packet at offset in 27 MHz ticks, or None if it carries none
+    afc = (data[offset + 3] >> 4) & 0x3
+    if not afc & 0x2 or data[offset + 4] < 7 or not data[offset + 5] & 0x10:
+        return None
+    b = data[offset + 6:offset + 12]
+    base = (b[0] << 25) | (b[1] << 17) | (b[2] << 9) | (b[3] << 1) | (b[4] >> 7)
+    ext = ((b[4] & 0x01) << 8) | b[5]
+    return base * 300 + ext
+
+
+def mark_discontinuity(data, start=0):
+    # Sets the discontinuity_indicator on the first adaptation-field packet of
+    # each PID, in place (data: bytearray aligned on a packet at start), so
+    # demuxers expect the PCR and continuity counters to restart there.
+    # Returns how many PIDs were marked.
+    marked = set()
+    for off in range(start, len(data) - TS_PACKET_SIZE + 1, TS_PACKET_SIZE):
+        if data[off] != TS_SYNC_BYTE:
+            break
+        pid = packet_pid(data, off)
+        if pid in marked or pid == TS_NULL_PID:
+            continue
+        if data[off + 3] & 0x20 and data[off + 4] > 0:
+            data[off + 5] |= 0x80
+            marked.add(pid)
+    return len(marked)
+
+
+def pcr_delta(later, earlier):
+    # Difference in ticks, allowing for one wrap of the 33-bit counter
+    delta = later - earlier
+    if delta < -PCR_WRAP // 2:
+        delta += PCR_WRAP
+    return delta
+
+
+def rtp_header(seq, timestamp, ssrc, payload_type=RTP_PAYLOAD_MP2T, marker=False):
+    return _RTP_HEADER.pack(0x80, (0x80 if marker else 0) | payload_type,
+                            seq & 0xFFFF, timestamp & 0xFFFFFFFF, ssrc & 0xFFFFFFFF)
+
+
+def parse_rtp_header(data):
+    # (seq, timestamp, ssrc, payload_offset) or None if this isn't RTP v2
+    if len(data) < RTP_HEADER_SIZE or data[0] >> 6 != 2:
+        return None
+    first, _, seq, timestamp, ssrc = _RTP_HEADER.unpack_from(data)
+    offset = RTP_HEADER_SIZE + 4 * (first & 0x0F)
+    if first & 0x10:
+        # header extension: 16-bit profile, 16-bit length in words
+        if len(data) < offset + 4:
+            return None
+        offset += 4 + 4 * int.from_bytes(data[offset + 2:offset + 4], "big")
+    return seq, timestamp, ssrc, offset
@@ -0,0 +1,188 @@
+"""
+Multicast group allocation for VLC Stream Hub.
+
+Every RTP stream gets its own multicast group out of a configurable pool
+instead of all of them sharing one address, so a receiver that joins its
+channel's group only gets that channel (with IGMP snooping, the switch
+only forwards it there too). Before a group/port pair is handed out the
+pool listens on it for a moment: any traffic means someone else is
+already using it. Leases are session services, so stopping a stream
+returns its group to the pool.
+
+Groups come from one /24 by default: the 23 low bits of the address make
+up the Ethernet MAC, so two groups of the same /24 never share a MAC
+address and NICs filter them in hardware.
+
+  python multicast_pool.py [--count 4]    allocate a few pairs and print them
+"""
+import argparse
+import ipaddress
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+
+# --- MULTICAST POOL CONFIGURATION ---
+MULTICAST_POOL = "239.255.1.0/24"      # organisation-local scope; vlc_config.json key "multicast_pool"
+MULTICAST_PORTS = (5004, 5100)         # port range when the caller doesn't pick one (RTP uses even ports)
+MULTICAST_PROBE_SECONDS = 0.3          # listen this long for existing traffic before claiming a pair
+MULTICAST_MAX_PROBES = 8               # candidates probed before giving up
+IP_MULTICAST_ALL = getattr(socket, "IP_MULTICAST_ALL", 49)   # Linux only
+
+
+def join_group(sock, group, port, interface=None):
+    # Binds a UDP socket to port and joins group so that it receives that
+    # group only: bound to the group address (not possible on Windows) and,
+    # on Linux, with IP_MULTICAST_ALL off so groups other sockets joined on
+    # the same port don't leak in
+    if sys.platform.startswith("linux"):
+        sock.setsockopt(socket.IPPROTO_IP, IP_MULTICAST_ALL, 0)
+    sock.bind(("" if sys.platform == "win32" else group, port))
+    mreq = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(interface or "0.0.0.0"))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+
+
+def probe(group, port, interface=None, seconds=MULTICAST_PROBE_SECONDS):
+    # True if any datagram arrives for group:port within seconds
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        join_group(sock, group, port, interface)
+        sock.settimeout(seconds)
+        sock.recv(2048)
+        return True
+    except socket.timeout:
+        return False
+    finally:
+        sock.close()
+
+
+class MulticastLease:
+    # One allocated group/port pair; a session service, stop() releases it
+    def __init__(self, pool, group, port):
+        self.pool = pool
+        self.group = group
+        self.port = port
+
+    def stop(self):
+        self.pool.release(self)
+
+    def __repr__(self):
+        return f"MulticastLease({self.group}:{self.port})"
+
+
+class MulticastPool:
+    """Hands out multicast group/port pairs from a CIDR block.
+
+    allocate() skips the groups this pool has leased and the pairs in
+    in_use (e.g. streams heard over SAP), then probes random free
+    candidates until one is quiet. Thread-safe.
+    """
+
+    def __init__(self, cidr=MULTICAST_POOL, ports=MULTICAST_PORTS, probe_seconds=MULTICAST_PROBE_SECONDS):
+        network = ipaddress.ip_network(cidr, strict=False)
+        if not network.is_multicast:
+            raise ValueError(f"{cidr} is not a multicast range")
+        self.network = network
+        self.ports = ports
+        self.probe_seconds = probe_seconds
+        self._leases = {}           # group -> lease
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("multicast_pool", MULTICAST_POOL))
+
+    @property
+    def leases(self):
+        with self._lock:
+            return list(self._leases.values())
+
+    def allocate(self, port=None, interface=None, in_use=(), prefer=None):
+        # -> MulticastLease. port: the stream's port (None: pick one from the
+        # port range). prefer: a group to take again without probing it, e.g.
+        # a restarted stream's own (its receivers are still joined; a probe
+        # would only hear its last packets). Raises OSError when every
+        # candidate is taken.
+        busy = {(ip, int(p)) for ip, p in in_use}
+        busy_groups = {ip for ip, _ in busy}
+        port = int(port) if port else None
+        if prefer:
+            candidate_port = port or self._free_port(prefer, busy)
+            with self._lock:
+                if prefer not in self._leases and candidate_port is not None:
+                    lease = self._leases[prefer] = MulticastLease(self, prefer, candidate_port)
+                    print(f"Multicast: leased {prefer}:{candidate_port} again")  # For debugging
+                    return lease
+        first, count = self._hosts()
+        start = random.randrange(count)
+        probed = 0
+        for k in range(count):
+            group = str(self.network[first + (start + k) % count])
+            candidate_port = port or self._free_port(group, busy)
+            with self._lock:
+                if group in self._leases or group in busy_groups or candidate_port is None:
+                    continue
+                # Reserved while probing, so two launches can't pick the same group
+                lease = self._leases[group] = MulticastLease(self, group, candidate_port)
+            probed += 1
+            if not self._busy(group, candidate_port, interface):
+                print(f"Multicast: leased {group}:{candidate_port}")  # For debugging
+                return lease
+            print(f"Multicast: {group}:{candidate_port} already carries traffic, skipping")  # For debugging
+            self.release(lease)
+            if probed >= MULTICAST_MAX_PROBES:
+                break
+        raise OSError(f"No free multicast group in {self.network} (probed {probed})")
+
+    def release(self, lease):
+        with self._lock:
+            if self._leases.get(lease.group) is lease:
+                del self._leases[lease.group]
+
+    def _hosts(self):
+        # (first index, count) of the usable groups: every address of the
+        # block but its first and last (x.x.x.0 / .255 confuse some
+        # equipment), or the whole block if that's all there is
+        size = self.network.num_addresses
+        return (0, size) if size <= 2 else (1, size - 2)
+
+    def _free_port(self, group, busy):
+        first, last = self.ports
+        for port in range(first + first % 2, last + 1, 2):
+            if (group, port) not in busy:
+                return port
+        return None
+
+    def _busy(self, group, port, interface):
+        if self.probe_seconds <= 0:
+            return False
+        try:
+            return probe(group, port, interface, self.probe_seconds)
+        except OSError as e:
+            # Can't listen (no multicast route): nothing heard, don't block the stream on it
+            print(f"Multicast probe of {group}:{port} failed: {e}")  # For debugging
+            return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Allocate multicast group/port pairs")
+    parser.add_argument("--pool", default=MULTICAST_POOL)
+    parser.add_argument("--port", type=int, help="fixed port (default: from the port range)")
+    parser.add_argument("--count", type=int, default=4)
+    parser.add_argument("--interface", help="local address to probe on")
+    args = parser.parse_args(argv)
+    pool = MulticastPool(args.pool)
+    started = time.perf_counter()
+    for _ in range(args.count):
+        lease = pool.allocate(args.port, args.interface)
+        print(f"{lease.group}:{lease.port}")
+    print(f"{args.count} lease(s) in {time.perf_counter() - started:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Local IPv4 interface discovery for VLC Stream Hub.
+
+Lists the machine's IPv4 interfaces straight from the OS (no outbound
+"connect to 8.8.8.8" probe, so it works offline and doesn't depend on the
+default route), caches the list and only re-reads it when something
+changed. On Linux changes come from a netlink subscription; elsewhere the
+list is simply re-read every INTERFACE_REFRESH_SECONDS.
+"""
+import collections
+import ipaddress
+import socket
+import struct
+import sys
+import time
+
+# --- INTERFACE CONFIGURATION ---
+INTERFACE_REFRESH_SECONDS = 30.0     # re-list period where there is no change notification
+# Name prefixes of bridges/tunnels that are rarely the LAN the viewers are on
+VIRTUAL_PREFIXES = ("docker", "br-", "veth", "virbr", "vmnet", "vboxnet", "tun", "tap", "wg", "zt")
+
+# Linux ioctl / netlink constants
+SIOCGIFFLAGS = 0x8913
+IFF_UP = 0x1
+IFF_LOOPBACK = 0x8
+NETLINK_ROUTE = 0
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+Interface = collections.namedtuple("Interface", "name ip netmask up loopback")
+
+
+def list_interfaces():
+    # Every local IPv4 interface, loopback included
+    if sys.platform.startswith("linux"):
+        try:
+            return _list_linux()
+        except (ImportError, OSError):
+            pass
+    return _list_by_hostname()
+
+
+def _list_linux():
+    # One RTM_GETADDR dump lists every IPv4 address, secondary ones included
+    import fcntl
+
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE) as nl:
+        request = struct.pack("=BBBBI", socket.AF_INET, 0, 0, 0, 0)
+        nl.send(struct.pack("=IHHII", 16 + len(request), RTM_GETADDR, NLM_F_REQUEST | NLM_F_DUMP, 1, 0)
+                + request)
+        addresses = []
+        done = False
+        while not done:
+            data = nl.recv(65536)
+            offset = 0
+            while offset + 16 <= len(data):
+                length, msg_type = struct.unpack_from("=IH", data, offset)
+                if msg_type == NLMSG_DONE or length < 16:
+                    done = True
+                    break
+                if msg_type == NLMSG_ERROR:
+                    raise OSError("netlink address dump failed")
+                if msg_type == RTM_NEWADDR:
+                    addresses.append(_parse_ifaddr(data[offset + 16:offset + length]))
+                offset += (length + 3) & ~3
+
+    found = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for index, prefix, ip in addresses:
+            if ip is None:
+                continue
+            try:
+                name = socket.if_indextoname(index)
+                ifreq = struct.pack("256s", name.encode()[:15])
+                flags = struct.unpack_from("H", fcntl.ioctl(sock.fileno(), SIOCGIFFLAGS, ifreq), 16)[0]
+            except OSError:
+                continue
+            netmask = str(ipaddress.IPv4Network(f"0.0.0.0/{prefix}").netmask)
+            found.append(Interface(name, ip, netmask, bool(flags & IFF_UP), bool(flags & IFF_LOOPBACK)))
+    return found
+
+
+def _parse_ifaddr(payload):
+    # ifaddrmsg + rtattrs -> (interface index, prefix length, local address)
+    _, prefix, _, _, index = struct.unpack_from("=BBBBI", payload)
+    ip = None
+    offset = 8
+    while offset + 4 <= len(payload):
+        length, attr = struct.unpack_from("=HH", payload, offset)
+        if length < 4:
+            break
+        # IFA_LOCAL is the interface's own address; IFA_ADDRESS is the peer on
+        # point-to-point links, so it only counts when there is no IFA_LOCAL
+        if attr == IFA_LOCAL or (attr == IFA_ADDRESS and ip is None):
+            ip = socket.inet_ntoa(payload[offset + 4:offset + 8])
+        offset += (length + 3) & ~3
+    return index, prefix, ip
+
+
+def _list_by_hostname():
+    # Windows/macOS: the host name resolves locally to every configured IPv4
+    # address (names and masks aren't available this way)
+    found = [Interface("lo", "127.0.0.1", "255.0.0.0", True, True)]
+    try:
+        infos = socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET, socket.SOCK_DGRAM)
+    except OSError:
+        return found
+    for ip in dict.fromkeys(info[4][0] for info in infos):
+        if ip != "127.0.0.1":
+            found.append(Interface("", ip, None, True, ip.startswith("127.")))
+    return found
+
+
+def _score(iface):
+    # Higher is a better guess for "the LAN address viewers should use"
+    ip = ipaddress.IPv4Address(iface.ip)
+    if iface.loopback or ip.is_loopback:
+        return 0
+    score = 1
+    if iface.up:
+        score += 8
+    if not ip.is_link_local:
+        score += 4
+    if ip.is_private:
+        score += 2
+    if not iface.name.startswith(VIRTUAL_PREFIXES):
+        score += 1
+    return score
+
+
+def pick_default(interfaces, preferred=None):
+    # The user's saved choice if it's still there, else the best scored one
+    if preferred and any(i.ip == preferred for i in interfaces):
+        return preferred
+    ranked = sorted(interfaces, key=_score, reverse=True)
+    return ranked[0].ip if ranked and _score(ranked[0]) else "127.0.0.1"
+
+
+class InterfaceCache:
+    def __init__(self, refresh_seconds=INTERFACE_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._interfaces = list_interfaces()
+        self._listed_at = time.monotonic()
+        self._netlink = _open_netlink()
+
+    @property
+    def interfaces(self):
+        return list(self._interfaces)
+
+    def default_ip(self, preferred=None):
+        return pick_default(self._interfaces, preferred)
+
+    def poll(self):
+        """Non-blocking: re-list if the OS reported a change (or the refresh
+        period ran out where it can't). Returns True if the list changed."""
+        if self._netlink is not None:
+            if not _drain(self._netlink):
+                return False
+        elif time.monotonic() - self._listed_at < self.refresh_seconds:
+            return False
+        current = list_interfaces()
+        self._listed_at = time.monotonic()
+        if current == self._interfaces:
+            return False
+        self._interfaces = current
+        return True
+
+    def close(self):
+        if self._netlink is not None:
+            self._netlink.close()
+            self._netlink = None
+
+
+def _open_netlink():
+    # Linux only: a socket that becomes readable whenever links/addresses change
+    if not hasattr(socket, "AF_NETLINK"):
+        return None
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+        sock.setblocking(False)
+        return sock
+    except OSError:
+        return None
+
+
+def _drain(sock):
+    changed = False
+    while True:
+        try:
+            if not sock.recv(65536):
+                return changed
+            changed = True
+        except BlockingIOError:
+            return changed
+        except OSError:
+            return True
+
+
+if __name__ == "__main__":
+    cache = InterfaceCache()
+    for iface in cache.interfaces:
+        print(f"{iface.name or '?':12s} {iface.ip:15s} {iface.netmask or '':15s} "
+              f"{'up' if iface.up else 'down'}{' loopback' if iface.loopback else ''}")
+    print(f"default: {cache.default_ip()}")
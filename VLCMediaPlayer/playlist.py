@@ -0,0 +1,345 @@
+"""
+Gapless playlists for VLC Stream Hub.
+
+A PlaylistFeed strings several files into one continuous MPEG-TS stream,
+so a server keeps a single output (port, multicast group, relay or HLS
+playlist) while the items change underneath it. Each item is remuxed to TS
+by its own headless VLC; the next item's VLC is started (and its first
+packets are already waiting in its pipe) while the current one is still
+playing, so a switch is a pipe swap rather than a VLC start-up. Every switch
+is timed and kept in .transitions.
+
+The feed is read like a pipe: by the native TsSender directly, or copied
+into the stdin of the output VLC for the other modes.
+
+Run ``python playlist.py --check`` for a loopback switchover measurement.
+"""
+import argparse
+import collections
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from mpegts import TS_DATAGRAM_SIZE, find_sync, mark_discontinuity
+from stream_commands import remux_argv
+
+# --- PLAYLIST CONFIGURATION ---
+PLAYLIST_READ_SIZE = 64 * 1024
+PLAYLIST_MAX_TRANSITIONS = 1000      # switch records kept per feed
+PLAYLIST_PUMP_STOP_TIMEOUT = 1.0     # the output VLC may be blocking our write
+
+
+class _Item:
+    def __init__(self, index, path, stream, session=None):
+        self.index = index
+        self.path = path
+        self.stream = stream
+        self.session = session          # remux session, None for .ts files read directly
+        self.opened_at = time.monotonic()
+        self.ready_at = None            # first bytes available (pre-rolled)
+        self.bytes = 0
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+
+class _Standby(threading.Thread):
+    # Opens (probes, spawns, pre-rolls) the next item off the reader's thread
+    def __init__(self, feed, index):
+        super().__init__(name="playlist-standby", daemon=True)
+        self.feed = feed
+        self.index = index
+        self.item = None
+        self.start()
+
+    def run(self):
+        self.feed._open(self)
+
+
+class PlaylistFeed:
+    """The playlist's items as one TS byte stream; read() blocks like a pipe.
+
+    transcode_for(path) returns the transcode chain element each item's
+    remux needs ("" to copy), e.g. from the sout planner. With loop=True the
+    playlist starts over after the last item, otherwise read() returns b""
+    at the end. A session service: stop() ends the remux VLCs.
+    """
+
+    def __init__(self, sessions, items, vlc_path, transcode_for=None, loop=True):
+        if not items:
+            raise ValueError("Playlist is empty")
+        self.sessions = sessions
+        self.items = list(items)
+        self.vlc_path = vlc_path
+        self.transcode_for = transcode_for
+        self.loop = loop
+        self.transitions = collections.deque(maxlen=PLAYLIST_MAX_TRANSITIONS)
+        self._current = None
+        self._standby = _Standby(self, 0)
+        self._previous = None           # (name, ended_at) of the item that just ran out
+        self._failures = 0              # items in a row that produced nothing
+        self._closed = False
+        self._pump = None
+
+    @property
+    def current(self):
+        # (index, name) of the item playing now, or None
+        item = self._current
+        return (item.index, item.name) if item else None
+
+    # ---------- lifecycle (session manager service) ----------
+    def start(self, output=None):
+        # output: a writable pipe (the output VLC's stdin) to copy the feed
+        # into; without one the caller reads the feed itself
+        if output is not None:
+            self._pump = threading.Thread(target=self._run_pump, args=(output,), name="playlist-pump",
+                                          daemon=True)
+            self._pump.start()
+        return self
+
+    def stop(self):
+        self._closed = True
+        standby = self._standby
+        if standby is not None:
+            # Closing its remux also unblocks a pre-roll that is still waiting
+            self._close(standby.item)
+            standby.join(timeout=PLAYLIST_PUMP_STOP_TIMEOUT)
+            self._close(standby.item)
+        self._close(self._current)
+        if self._pump and self._pump is not threading.current_thread():
+            self._pump.join(timeout=PLAYLIST_PUMP_STOP_TIMEOUT)
+
+    def _run_pump(self, output):
+        try:
+            while not self._closed:
+                data = self.read(PLAYLIST_READ_SIZE)
+                if not data:
+                    break
+                output.write(data)
+        except (OSError, ValueError):
+            pass            # output VLC gone, or we were stopped
+        finally:
+            try:
+                output.close()      # end of a non-looping playlist: VLC sees EOF and exits
+            except OSError:
+                pass
+
+    # ---------- reading ----------
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = PLAYLIST_READ_SIZE
+        while not self._closed:
+            item = self._current or self._advance()
+            if item is None:
+                return b""
+            try:
+                data = item.stream.read1(size)
+            except (OSError, ValueError):
+                data = b""
+            if not data:
+                self._finish(item)
+                continue
+            if not item.bytes:
+                data = self._first_data(item, data)
+            item.bytes += len(data)
+            return data
+        return b""
+
+    def _advance(self):
+        # Take the warm standby and immediately start warming the one after it
+        while self._standby is not None and not self._closed:
+            standby = self._standby
+            standby.join()
+            self._standby = None
+            following = self._following(standby.index)
+            if following is not None:
+                self._standby = _Standby(self, following)
+            if standby.item is not None:
+                self._current = standby.item
+                return standby.item
+            self._failures += 1
+            if self._failures >= len(self.items):
+                print("Playlist: no item could be opened, stopping")  # For debugging
+                return None
+        return None
+
+    def _finish(self, item):
+        self._current = None
+        self._close(item)
+        if item.bytes:
+            self._failures = 0
+            self._previous = (item.name, time.monotonic())
+        else:
+            self._failures += 1
+            print(f"Playlist: skipped {item.name} (no output)")  # For debugging
+            if self._failures >= len(self.items):
+                self._standby_cancel()
+
+    def _standby_cancel(self):
+        standby, self._standby = self._standby, None
+        if standby is not None:
+            standby.join()
+            self._close(standby.item)
+
+    def _following(self, index):
+        if index + 1 < len(self.items):
+            return index + 1
+        return 0 if self.loop else None
+
+    def _first_data(self, item, data):
+        # Item boundary: flag the restart of PCR/continuity counters for the
+        # demuxers downstream and time how long the output went without data
+        now = time.monotonic()
+        if self._previous is None:
+            return data
+        data = bytearray(data)
+        pos = find_sync(data)
+        if pos >= 0:
+            mark_discontinuity(data, pos)
+        prev_name, ended_at = self._previous
+        self._previous = None
+        prerolled = item.ready_at is not None and item.ready_at <= ended_at
+        record = {
+            "at": time.time(),
+            "from": prev_name,
+            "to": item.name,
+            "index": item.index,
+            "stall_ms": round((now - ended_at) * 1000, 2),
+            "prerolled": prerolled,
+            "startup_ms": round(((item.ready_at or now) - item.opened_at) * 1000, 1),
+        }
+        self.transitions.append(record)
+        print(f"Playlist: {prev_name} -> {item.name} in {record['stall_ms']} ms "
+              f"({'pre-rolled' if prerolled else 'cold'}, remux ready after {record['startup_ms']} ms)")  # For debugging
+        return bytes(data)
+
+    # ---------- items ----------
+    def _open(self, standby):
+        # Standby thread. .ts files are read directly; anything else gets a
+        # headless VLC remux whose first output we wait for (pre-roll).
+        # standby.item stays None if the item can't be opened.
+        path = self.items[standby.index]
+        try:
+            if path.lower().endswith(".ts"):
+                item = _Item(standby.index, path, open(path, "rb"))
+            else:
+                transcode = self.transcode_for(path) if self.transcode_for else ""
+                argv = remux_argv(self.vlc_path, path, transcode)
+                print(f"Playlist Remux Command: {subprocess.list2cmdline(argv)}")  # For debugging
+                session = self.sessions.start("remux", "TS", path, argv, capture_stdout=True)
+                item = _Item(standby.index, path, session.process.stdout, session)
+            standby.item = item
+            if self._closed:
+                self._close(item)
+                return
+            item.stream.peek(1)
+            item.ready_at = time.monotonic()
+        except (OSError, ValueError) as e:
+            print(f"Playlist: can't open {path}: {e}")  # For debugging
+            standby.item = None
+
+    def _close(self, item):
+        if item is None:
+            return
+        if item.session is not None:
+            self.sessions.stop(item.session.id)
+            self.sessions.forget(item.session.id)
+        try:
+            item.stream.close()
+        except OSError:
+            pass
+
+
+# ================= LOOPBACK CHECK =================
+FAKE_VLC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_vlc.py")
+
+
+def _receive(sock, arrivals, stop):
+    # (arrival time, counter of the datagram's first packet) per datagram
+    while not stop.is_set():
+        try:
+            data = sock.recv(65536)
+        except socket.timeout:
+            continue
+        except OSError:
+            return
+        if len(data) >= TS_DATAGRAM_SIZE:
+            arrivals.append((time.perf_counter(), int.from_bytes(data[184:188], "big")))
+
+
+def _wire_gaps(arrivals):
+    # Gap on the wire at each item boundary (the fake remuxes restart their
+    # packet counter at 0), minus one nominal datagram interval
+    nominal = (arrivals[-1][0] - arrivals[0][0]) / (len(arrivals) - 1) if len(arrivals) > 1 else 0.0
+    return [round(max(0.0, (b[0] - a[0] - nominal) * 1000), 2)
+            for a, b in zip(arrivals, arrivals[1:]) if b[1] < a[1]], nominal
+
+
+def check(items=3, seconds=2.0, output="native", bitrate=8_000_000):
+    """Plays a playlist of fake VLC remuxes to a loopback UDP port and
+    reports the feed stall and the wire gap at every switch."""
+    from session_manager import SessionManager
+    from stream_commands import stdin_server_argv
+    from ts_sender import TsSender
+
+    os.environ["FAKE_VLC_DURATION"] = str(seconds)
+    os.environ["FAKE_VLC_BITRATE"] = str(bitrate)
+    vlc = [sys.executable, FAKE_VLC]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(0.2)
+    port = sock.getsockname()[1]
+    arrivals, stop = [], threading.Event()
+    receiver = threading.Thread(target=_receive, args=(sock, arrivals, stop), daemon=True)
+    receiver.start()
+
+    sessions = SessionManager()
+    feed = PlaylistFeed(sessions, [f"item{i}.mp4" for i in range(items)], vlc, loop=False)
+    if output == "native":
+        session = sessions.start("server", "UDP", f"127.0.0.1:{port}",
+                                 services=[TsSender(feed, "127.0.0.1", port).start(), feed])
+    else:
+        argv = stdin_server_argv(vlc, f"#duplicate{{dst=udp{{dst=127.0.0.1,port={port},mux=ts}}}}")
+        session = sessions.start("server", "UDP", f"127.0.0.1:{port}", argv, capture_stdin=True)
+        session.services.append(feed.start(session.process.stdin))
+
+    deadline = time.monotonic() + items * seconds * 2 + 10
+    while len(feed.transitions) < items - 1 and time.monotonic() < deadline:
+        time.sleep(0.1)
+    time.sleep(seconds / 2)
+    sessions.shutdown()
+    stop.set()
+    receiver.join()
+    sock.close()
+
+    gaps, nominal = _wire_gaps(arrivals)
+    print(f"{output}: {len(arrivals)} datagrams, nominal interval {nominal * 1000:.2f} ms")
+    for k, record in enumerate(feed.transitions):
+        wire = f"{gaps[k]} ms" if k < len(gaps) else "?"
+        print(f"  {record['from']} -> {record['to']}: feed stall {record['stall_ms']} ms, "
+              f"wire gap {wire}, {'pre-rolled' if record['prerolled'] else 'cold'}")
+    return list(feed.transitions), gaps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gapless playlist switchover check")
+    parser.add_argument("--check", action="store_true", help="loopback test with fake VLC remuxes")
+    parser.add_argument("--items", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=2.0, help="length of each fake item")
+    parser.add_argument("--output", choices=("native", "vlc", "both"), default="both",
+                        help="native sender, or an output VLC fed on stdin")
+    args = parser.parse_args(argv)
+    if not args.check:
+        parser.print_help()
+        return
+    for output in (("native", "vlc") if args.output == "both" else (args.output,)):
+        check(args.items, args.seconds, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+HTTP fan-out relay for VLC Stream Hub.
+
+VLC pushes one MPEG-TS feed over UDP to 127.0.0.1 and this relay re-serves
+it to any number of HTTP viewers. Incoming datagrams are packed into a
+fixed ring of slots inside one preallocated bytearray; every viewer is just
+a read cursor into that ring and is handed memoryview slices of it, so no
+data is copied per viewer. A viewer that falls a whole ring behind is
+skipped forward to the live edge, and one that stops reading is dropped.
+Since Python 3.12 the transport queues what it can't send at once as a view
+into the ring too, so a viewer with queued data is dropped before the
+writer comes round to that slot again.
+
+Run ``python relay.py --load-test`` for a loopback capacity check.
+"""
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+from mpegts import TS_DATAGRAM_SIZE, TS_PACKET_SIZE
+
+# --- RELAY CONFIGURATION ---
+RELAY_SLOT_SIZE = 64 * 1024           # bytes per ring slot
+RELAY_SLOTS = 256                     # 16 MiB ring with the default slot size
+RELAY_MAX_DATAGRAM = 8 * 1024         # VLC sends 7*188 = 1316 byte datagrams
+RELAY_FLUSH_SECONDS = 0.02            # publish a partial slot after this long
+RELAY_MAX_CLIENTS = 500
+RELAY_DRAIN_TIMEOUT = 5.0             # a viewer that can't take data this long is dropped
+RELAY_HEADER_TIMEOUT = 5.0
+RELAY_WRITE_HIGH_WATER = 4 * RELAY_SLOT_SIZE
+RELAY_LAP_MARGIN = 8                  # slots: drop a viewer with queued data this close to being lapped
+
+
+class RingBuffer:
+    # Slots are filled one at a time; a slot becomes readable when published.
+    # Sequence numbers grow forever, slot index is seq % slots. The slot being
+    # filled is never readable, so readers only ever see finished data.
+    def __init__(self, slots=RELAY_SLOTS, slot_size=RELAY_SLOT_SIZE):
+        self.slots = slots
+        self.slot_size = slot_size
+        self._buf = bytearray(slots * slot_size)
+        self._view = memoryview(self._buf)
+        self._lengths = [0] * slots
+        self.head = 0          # seq of the slot currently being filled
+        self.fill = 0          # bytes in the current slot
+
+    @property
+    def oldest(self):
+        return max(0, self.head - (self.slots - 1))
+
+    @property
+    def free(self):
+        return self.slot_size - self.fill
+
+    def append(self, data):
+        n = len(data)
+        start = (self.head % self.slots) * self.slot_size + self.fill
+        self._view[start:start + n] = data
+        self.fill += n
+
+    def publish(self):
+        if not self.fill:
+            return False
+        self._lengths[self.head % self.slots] = self.fill
+        self.head += 1
+        self.fill = 0
+        return True
+
+    def view(self, seq):
+        index = seq % self.slots
+        start = index * self.slot_size
+        return self._view[start:start + self._lengths[index]]
+
+
+class _IngestProtocol(asyncio.DatagramProtocol):
+    def __init__(self, relay):
+        self.relay = relay
+
+    def datagram_received(self, data, addr):
+        self.relay._ingest(data)
+
+
+class HttpRelay:
+    def __init__(self, listen_port, ingest_port=0, host="0.0.0.0",
+                 max_clients=RELAY_MAX_CLIENTS, slots=RELAY_SLOTS, slot_size=RELAY_SLOT_SIZE):
+        self.host = host
+        self.listen_port = int(listen_port)
+        self.ingest_port = int(ingest_port)
+        self.max_clients = max_clients
+        self.ring = RingBuffer(slots, slot_size)
+
+        self.stats = {"bytes_in": 0, "clients": 0, "served": 0, "rejected": 0,
+                      "dropped": 0, "skipped": 0}
+
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._error = None
+        self._stopping = None
+        self._new_data = None
+        self._flush_handle = None
+
+    # ---------- thread wrapper (used by the Tk app / session manager) ----------
+    def start(self, timeout=5.0):
+        self._thread = threading.Thread(target=self._run, name=f"relay-{self.listen_port}", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout)
+        if self._error:
+            raise self._error
+        return self
+
+    def stop(self):
+        if self._loop and self._stopping:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread:
+            self._thread.join(timeout=5.0)
+
+    def _run(self):
+        try:
+            asyncio.run(self.serve())
+        except Exception as exc:
+            self._error = exc
+            self._ready.set()
+
+    # ---------- asyncio side ----------
+    async def serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._new_data = asyncio.Event()
+
+        transport, _ = await self._loop.create_datagram_endpoint(
+            lambda: _IngestProtocol(self), local_addr=("127.0.0.1", self.ingest_port))
+        sock = transport.get_extra_info("socket")
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        except OSError:
+            pass
+        self.ingest_port = sock.getsockname()[1]
+
+        server = await asyncio.start_server(self._handle_client, self.host, self.listen_port,
+                                            reuse_address=True)
+        self.listen_port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+
+        try:
+            await self._stopping.wait()
+        finally:
+            transport.close()
+            server.close()
+            self._wake_clients()
+            await server.wait_closed()
+
+    def _ingest(self, data):
+        ring = self.ring
+        n = len(data)
+        if n > ring.slot_size:
+            data, n = data[:ring.slot_size], ring.slot_size
+        self.stats["bytes_in"] += n
+        if n > ring.free:
+            self._publish()
+        ring.append(data)
+        if ring.free < RELAY_MAX_DATAGRAM:
+            self._publish()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(RELAY_FLUSH_SECONDS, self._publish)
+
+    def _publish(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self.ring.publish():
+            self._wake_clients()
+
+    def _wake_clients(self):
+        # Swap in a fresh event so waiters only ever see one wake-up per slot batch
+        event, self._new_data = self._new_data, asyncio.Event()
+        event.set()
+
+    async def _handle_client(self, reader, writer):
+        try:
+            await asyncio.wait_for(_read_request_head(reader), RELAY_HEADER_TIMEOUT)
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ValueError):
+            # (readline() raises ValueError for a header line over the reader's limit)
+            writer.close()
+            return
+
+        if self.stats["clients"] >= self.max_clients:
+            self.stats["rejected"] += 1
+            writer.write(b"HTTP/1.0 503 Service Unavailable\r\nConnection: close\r\n\r\n")
+            writer.close()
+            return
+
+        writer.write(b"HTTP/1.0 200 OK\r\n"
+                     b"Content-Type: video/MP2T\r\n"
+                     b"Cache-Control: no-cache, no-store\r\n"
+                     b"Connection: close\r\n\r\n")
+        writer.transport.set_write_buffer_limits(high=RELAY_WRITE_HIGH_WATER)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.stats["clients"] += 1
+        self.stats["served"] += 1
+        ring = self.ring
+        transport = writer.transport
+        seq = ring.head            # join at the live edge
+        pinned = seq               # oldest slot the transport may still hold a view of
+        try:
+            while not self._stopping.is_set():
+                if not transport.get_write_buffer_size():
+                    pinned = seq   # everything written so far has gone out
+                elif self._lapping(pinned):
+                    raise asyncio.TimeoutError
+                if seq >= ring.head:
+                    await self._new_data.wait()
+                    continue
+                if seq < ring.oldest:
+                    # Lapped by the writer: jump to the live edge rather than
+                    # replaying stale data (TS resyncs on the next packet)
+                    self.stats["skipped"] += 1
+                    seq = pinned = ring.head - 1
+                # Whatever the socket doesn't take now stays queued as a view
+                # of the slot (3.12+; older versions copy it), not a copy
+                writer.write(ring.view(seq))
+                seq += 1
+                await self._drain(writer, pinned)
+        except asyncio.TimeoutError:
+            # Too slow: its queued views would be overwritten, or it took nothing for too long
+            self.stats["dropped"] += 1
+            transport.abort()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.stats["clients"] -= 1
+            writer.close()
+
+    def _lapping(self, pinned):
+        return pinned < self.ring.oldest + RELAY_LAP_MARGIN
+
+    async def _drain(self, writer, pinned):
+        # writer.drain() that gives up (asyncio.TimeoutError) after
+        # RELAY_DRAIN_TIMEOUT or once the writer is about to lap pinned; it
+        # wakes with every published slot to check
+        transport = writer.transport
+        if transport.get_write_buffer_size() <= transport.get_write_buffer_limits()[0]:
+            await writer.drain()    # under the low-water mark: never paused
+            return
+        drain = asyncio.ensure_future(writer.drain())
+        deadline = self._loop.time() + RELAY_DRAIN_TIMEOUT
+        try:
+            while not drain.done():
+                remaining = deadline - self._loop.time()
+                if self._stopping.is_set():
+                    return
+                if remaining <= 0 or self._lapping(pinned):
+                    raise asyncio.TimeoutError
+                wake = asyncio.ensure_future(self._new_data.wait())
+                await asyncio.wait((drain, wake), timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                wake.cancel()
+            drain.result()
+        finally:
+            drain.cancel()
+
+
+async def _read_request_head(reader):
+    # We serve the same live feed on any path; just consume the headers
+    while True:
+        line = await reader.readline()
+        if not line or line in (b"\r\n", b"\n"):
+            return
+
+
+# ================= LOOPBACK LOAD TEST =================
+def _feed(ingest_port, bitrate_mbps, stop_event, counters):
+    # Paced UDP producer standing in for VLC's TS output
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    payload = bytes([0x47]) + bytes(TS_PACKET_SIZE - 1)
+    datagram = payload * (TS_DATAGRAM_SIZE // TS_PACKET_SIZE)
+    interval = len(datagram) * 8 / (bitrate_mbps * 1e6)
+    next_send = time.perf_counter()
+    while not stop_event.is_set():
+        sock.sendto(datagram, ("127.0.0.1", ingest_port))
+        counters["sent"] += len(datagram)
+        next_send += interval
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    sock.close()
+
+
+async def _swarm(port, clients, duration):
+    totals = [0] * clients
+
+    async def one(i):
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            return
+        writer.write(b"GET / HTTP/1.0\r\n\r\n")
+        deadline = time.monotonic() + duration
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                chunk = await asyncio.wait_for(reader.read(256 * 1024), remaining)
+                if not chunk:
+                    break
+                totals[i] += len(chunk)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        writer.close()
+
+    await asyncio.gather(*(one(i) for i in range(clients)))
+    return totals
+
+
+def _swarm_process(port, clients, duration, conn):
+    conn.send(asyncio.run(_swarm(port, clients, duration)))
+    conn.close()
+
+
+def load_test(bitrate_mbps=8.0, steps=(10, 25, 50, 100, 200, 400), duration=5.0,
+              keep_up_ratio=0.95):
+    # Ramps the number of viewers and reports how many keep up with the feed.
+    # Viewers run in a child process so they don't share the relay's GIL.
+    import multiprocessing
+
+    relay = HttpRelay(0, host="127.0.0.1", max_clients=max(steps)).start()
+    stop_feed = threading.Event()
+    counters = {"sent": 0}
+    feeder = threading.Thread(target=_feed, args=(relay.ingest_port, bitrate_mbps, stop_feed, counters),
+                              daemon=True)
+    feeder.start()
+
+    results = []
+    try:
+        for clients in steps:
+            parent, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=_swarm_process,
+                                           args=(relay.listen_port, clients, duration, child))
+            dropped_before = relay.stats["dropped"]
+            skipped_before = relay.stats["skipped"]
+            proc.start()
+            totals = parent.recv()
+            proc.join()
+
+            expected = bitrate_mbps * 1e6 / 8 * duration
+            rates = [t * 8 / duration / 1e6 for t in totals]
+            kept_up = sum(1 for t in totals if t >= expected * keep_up_ratio)
+            result = {
+                "clients": clients,
+                "bitrate_mbps": bitrate_mbps,
+                "kept_up": kept_up,
+                "min_mbps": round(min(rates), 2) if rates else 0.0,
+                "avg_mbps": round(sum(rates) / len(rates), 2) if rates else 0.0,
+                "dropped": relay.stats["dropped"] - dropped_before,
+                "skipped": relay.stats["skipped"] - skipped_before,
+            }
+            results.append(result)
+            print(f"{clients:5d} clients  kept up {kept_up:5d}  "
+                  f"min {result['min_mbps']:7.2f} Mbit/s  avg {result['avg_mbps']:7.2f} Mbit/s  "
+                  f"dropped {result['dropped']}  skipped {result['skipped']}")
+            if kept_up < clients:
+                break
+    finally:
+        stop_feed.set()
+        feeder.join()
+        relay.stop()
+
+    held = max((r["clients"] for r in results if r["kept_up"] == r["clients"]), default=0)
+    print(f"Relay held {held} concurrent clients at {bitrate_mbps} Mbit/s")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VLC Stream Hub HTTP fan-out relay")
+    parser.add_argument("--port", type=int, default=8000, help="HTTP port viewers connect to")
+    parser.add_argument("--ingest-port", type=int, default=0, help="local UDP port VLC pushes TS to")
+    parser.add_argument("--load-test", action="store_true", help="run the loopback load test and exit")
+    parser.add_argument("--bitrate", type=float, default=8.0, help="load test feed bitrate in Mbit/s")
+    parser.add_argument("--steps", default="10,25,50,100,200,400", help="comma separated viewer counts")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per load test step")
+    args = parser.parse_args(argv)
+
+    if args.load_test:
+        load_test(args.bitrate, tuple(int(s) for s in args.steps.split(",")), args.duration)
+        return
+
+    relay = HttpRelay(args.port, args.ingest_port)
+    print(f"Relay: UDP ingest 127.0.0.1:{args.ingest_port or '(auto)'} -> http://0.0.0.0:{args.port}/")
+    try:
+        asyncio.run(relay.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
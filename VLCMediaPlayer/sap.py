@@ -0,0 +1,325 @@
+"""
+SAP/SDP stream announcements for VLC Stream Hub.
+
+Servers announce each running stream with SAP (RFC 2974) on the standard
+group 224.2.127.254:9875, carrying an SDP description (RFC 4566) of where
+to connect. Clients keep a bounded, TTL-expiring directory of what they
+hear, so a viewer picks a stream from a list instead of typing IP, protocol
+and port. Plain VLC SAP announcements (RTP/UDP) show up in the directory
+too. The renditions of a bitrate ladder are announced one by one and
+tagged with their name and bitrate, so clients can group them back up.
+"""
+import collections
+import random
+import socket
+import struct
+import threading
+import time
+import zlib
+
+from stream_commands import client_url
+
+# --- SAP CONFIGURATION ---
+SAP_GROUP = "224.2.127.254"
+SAP_PORT = 9875
+SAP_ANNOUNCE_INTERVAL = 5.0      # seconds between repeats of one announcement
+SAP_ENTRY_TTL = 30.0             # a stream not heard for this long is dropped
+SAP_MAX_ENTRIES = 256            # directory size cap; the stalest entry goes first
+SAP_MULTICAST_TTL = 1            # keep announcements on the local network
+SAP_TOOL = "VLC Stream Hub"
+SAP_PROTOCOL_ATTR = "x-vlc-stream-hub-protocol"
+SAP_RENDITION_ATTR = "x-vlc-stream-hub-rendition"   # "<name> <kb/s>" (kb/s 0: unknown)
+SAP_FEC_ATTR = "x-vlc-stream-hub-fec"                # "<L>x<D>": row/column FEC on port+2/port+4
+
+_SAP_V1 = 0x20
+_SAP_DELETE = 0x04
+_SAP_ENCRYPTED = 0x02
+_SAP_COMPRESSED = 0x01
+_SDP_MIME = b"application/sdp\0"
+
+
+# ================= SDP =================
+def build_sdp(name, protocol, ip, port, origin_ip, session_id, version=1, rendition=None, path="", fec=None):
+    # Standard lines for RTP/UDP so VLC can read them too; HTTP modes have no
+    # SDP transport, so the URL goes in a=control and our own attribute
+    # names the protocol exactly. rendition: (name, kb/s) of a ladder
+    # rendition, path its HTTP path. fec: (L, D) of the stream's FEC matrix.
+    multicast = _is_multicast(ip)
+    lines = [
+        "v=0",
+        f"o=- {session_id} {version} IN IP4 {origin_ip}",
+        f"s={name}",
+        f"i={protocol} stream from {origin_ip}",
+        f"c=IN IP4 {ip}/{SAP_MULTICAST_TTL}" if multicast else f"c=IN IP4 {ip}",
+        "t=0 0",
+        f"a=tool:{SAP_TOOL}",
+        "a=type:broadcast",
+        f"a={SAP_PROTOCOL_ATTR}:{protocol}",
+    ]
+    if rendition:
+        lines.append(f"a={SAP_RENDITION_ATTR}:{rendition[0]} {rendition[1] or 0}")
+    if fec:
+        lines.append(f"a={SAP_FEC_ATTR}:{fec[0]}x{fec[1]}")
+    if protocol == "RTP":
+        lines.append(f"m=video {port} RTP/AVP 33")
+    elif protocol == "UDP":
+        lines.append(f"m=video {port} udp mpeg")
+    else:
+        lines += [f"m=video {port} TCP mpeg", f"a=control:{client_url(protocol, ip, port, path)}"]
+    return "\r\n".join(lines) + "\r\n"
+
+
+def parse_sdp(text):
+    # -> {"name", "protocol", "ip", "port", "path", "origin", "session_id",
+    # "version", "rendition", "kbps", "fec"}; ValueError if it doesn't
+    # describe something we can connect to
+    info = {"name": "", "protocol": None, "ip": None, "port": None, "path": "", "origin": None,
+            "session_id": None, "version": None, "rendition": None, "kbps": None, "fec": None}
+    transport = None
+    for line in text.splitlines():
+        key, _, value = line.strip().partition("=")
+        if key == "o":
+            fields = value.split()
+            if len(fields) >= 6:
+                info["session_id"], info["version"], info["origin"] = fields[1], fields[2], fields[5]
+        elif key == "s":
+            info["name"] = value
+        elif key == "c" and info["ip"] is None:
+            fields = value.split()
+            if len(fields) >= 3:
+                info["ip"] = fields[2].split("/")[0]
+        elif key == "m" and info["port"] is None:
+            fields = value.split()
+            if len(fields) >= 3 and fields[1].split("/")[0].isdigit():
+                info["port"] = int(fields[1].split("/")[0])
+                transport = fields[2].upper()
+        elif key == "a" and value.startswith(SAP_PROTOCOL_ATTR + ":"):
+            info["protocol"] = value.split(":", 1)[1]
+        elif key == "a" and value.startswith(SAP_RENDITION_ATTR + ":"):
+            fields = value.split(":", 1)[1].split()
+            if len(fields) == 2 and fields[1].isdigit():
+                info["rendition"], info["kbps"] = fields[0], int(fields[1]) or None
+        elif key == "a" and value.startswith(SAP_FEC_ATTR + ":"):
+            info["fec"] = value.split(":", 1)[1].strip()
+        elif key == "a" and value.startswith("control:http"):
+            # "http://ip:port/path": only the path is new
+            info["path"] = value.split("/", 3)[3] if value.count("/") >= 3 else ""
+
+    if info["protocol"] is None:
+        if transport and transport.startswith("RTP/"):
+            info["protocol"] = "RTP"
+        elif transport == "UDP":
+            info["protocol"] = "UDP"
+    if not info["protocol"] or not info["ip"] or not info["port"]:
+        raise ValueError("SDP has no usable connection/media description")
+    if not info["name"] or info["name"] == "-":
+        info["name"] = f"{info['protocol']} {info['ip']}:{info['port']}"
+    return info
+
+
+# ================= SAP PACKETS =================
+def build_sap(sdp, origin_ip, msg_hash, delete=False):
+    header = struct.pack("!BBH4s", _SAP_V1 | (_SAP_DELETE if delete else 0), 0, msg_hash,
+                         socket.inet_aton(origin_ip))
+    return header + _SDP_MIME + sdp.encode("utf-8")
+
+
+def parse_sap(data):
+    # -> (deleted, origin_ip, msg_hash, sdp_text); ValueError for anything
+    # we can't or won't read (IPv6 origin, encrypted, malformed)
+    if len(data) < 8:
+        raise ValueError("short SAP packet")
+    flags, auth_len, msg_hash = struct.unpack_from("!BBH", data)
+    if flags >> 5 != 1:
+        raise ValueError("not SAP version 1")
+    if flags & 0x10:
+        raise ValueError("IPv6 origin not supported")
+    if flags & _SAP_ENCRYPTED:
+        raise ValueError("encrypted announcement")
+    origin = socket.inet_ntoa(data[4:8])
+    payload = data[8 + auth_len * 4:]
+    if flags & _SAP_COMPRESSED:
+        payload = zlib.decompress(payload)
+    # The payload type is optional; without it the payload is SDP ("v=0...")
+    if not payload.startswith(b"v=0"):
+        mime, sep, rest = payload.partition(b"\0")
+        if not sep or mime != _SDP_MIME[:-1]:
+            raise ValueError("payload is not SDP")
+        payload = rest
+    return bool(flags & _SAP_DELETE), origin, msg_hash, payload.decode("utf-8", "replace")
+
+
+def _is_multicast(ip):
+    try:
+        return 224 <= int(ip.split(".")[0]) <= 239
+    except ValueError:
+        return False
+
+
+def _multicast_socket(interface=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, SAP_MULTICAST_TTL)
+    if interface and not interface.startswith("127."):
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+    return sock
+
+
+# ================= ANNOUNCER (server side) =================
+class SapAnnouncer:
+    # One announcement per running stream; a session service, so stopping
+    # the session sends the SAP deletion as well
+    def __init__(self, name, protocol, ip, port, origin_ip, interval=SAP_ANNOUNCE_INTERVAL, rendition=None,
+                 path="", fec=None):
+        self.origin_ip = origin_ip
+        self.interval = interval
+        session_id = random.getrandbits(32)
+        self.sdp = build_sdp(name, protocol, ip, port, origin_ip, session_id, rendition=rendition, path=path,
+                             fec=fec)
+        self.msg_hash = random.getrandbits(16) or 1
+        self._stop = threading.Event()
+        self._thread = None
+        self._sock = None
+
+    def start(self):
+        self._sock = _multicast_socket(self.origin_ip)
+        self._thread = threading.Thread(target=self._run, name="sap-announce", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        if self._sock:
+            self._send(build_sap(self.sdp, self.origin_ip, self.msg_hash, delete=True))
+            self._sock.close()
+            self._sock = None
+
+    def _run(self):
+        packet = build_sap(self.sdp, self.origin_ip, self.msg_hash)
+        while not self._stop.is_set():
+            self._send(packet)
+            # Small jitter so many servers don't announce in lock-step
+            self._stop.wait(self.interval * random.uniform(0.9, 1.1))
+
+    def _send(self, packet):
+        try:
+            self._sock.sendto(packet, (SAP_GROUP, SAP_PORT))
+        except OSError:
+            pass            # no route/interface yet; the next repeat will try again
+
+
+# ================= DIRECTORY (client side) =================
+class SapDirectory:
+    """Streams heard on the SAP group, listed by name in streams().
+
+    The listener runs on its own thread; the cache is capped at max_entries
+    and entries expire ttl seconds after their last announcement.
+    """
+
+    def __init__(self, ttl=SAP_ENTRY_TTL, max_entries=SAP_MAX_ENTRIES, interface=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.interface = interface
+        self.version = 0            # bumped on every add/remove, for cheap UI polling
+        self._entries = collections.OrderedDict()   # (origin, hash) -> info, oldest first
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._sock = None
+
+    def start(self):
+        self._sock = self._open_socket()
+        self._thread = threading.Thread(target=self._run, name="sap-listen", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._sock:
+            self._sock.close()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+
+    def _open_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            # VLC's own SAP module may be listening on the same port
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(("", SAP_PORT))
+        local = self.interface if self.interface and not self.interface.startswith("127.") else "0.0.0.0"
+        mreq = struct.pack("4s4s", socket.inet_aton(SAP_GROUP), socket.inet_aton(local))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        sock.settimeout(1.0)
+        return sock
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                data, _ = self._sock.recvfrom(65536)
+            except socket.timeout:
+                self._expire()
+                continue
+            except OSError:
+                return          # socket closed by stop()
+            self.handle(data)
+
+    def handle(self, data):
+        try:
+            deleted, origin, msg_hash, sdp = parse_sap(data)
+            info = None if deleted else parse_sdp(sdp)
+        except (ValueError, zlib.error):
+            return
+        key = (origin, msg_hash)
+        with self._lock:
+            if deleted:
+                if self._entries.pop(key, None) is not None:
+                    self.version += 1
+                return
+            known = self._entries.pop(key, None)
+            info["origin"] = info["origin"] or origin
+            info["last_seen"] = time.monotonic()
+            self._entries[key] = info
+            if known is None or _differs(known, info):
+                self.version += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.version += 1
+        self._expire()
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            while self._entries:
+                key, info = next(iter(self._entries.items()))
+                if info["last_seen"] >= cutoff:
+                    break
+                del self._entries[key]
+                self.version += 1
+
+    def streams(self):
+        self._expire()
+        with self._lock:
+            items = [dict(info) for info in self._entries.values()]
+        return sorted(items, key=lambda s: (s["name"].lower(), s["ip"], s["port"], s["path"]))
+
+
+def _differs(old, new):
+    return any(old[k] != new[k] for k in ("name", "protocol", "ip", "port", "path", "rendition", "fec"))
+
+
+if __name__ == "__main__":
+    directory = SapDirectory().start()
+    print(f"Listening for SAP announcements on {SAP_GROUP}:{SAP_PORT} (Ctrl+C to quit)")
+    seen = -1
+    try:
+        while True:
+            if directory.version != seen:
+                seen = directory.version
+                for s in directory.streams():
+                    print(f"  {s['name']}: {s['protocol']} {s['ip']}:{s['port']} (from {s['origin']})")
+                print("--")
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        directory.stop()
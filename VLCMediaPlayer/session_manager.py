@@ -0,0 +1,285 @@
+"""
+Headless session manager for VLC Stream Hub.
+
+Tracks any number of concurrent server/client sessions by id. Each session
+owns (optionally) one VLC child process and any in-process services that
+back it. Nothing in here touches Tk, so the GUI, scripts and tests can all
+drive it the same way.
+"""
+import itertools
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+
+IS_WINDOWS = os.name == "nt"
+
+# How long a stopped process gets to exit before it is force-killed
+STOP_GRACE_SECONDS = 3.0
+
+# Session states
+STATE_RUNNING = "running"
+STATE_STOPPING = "stopping"
+STATE_STOPPED = "stopped"
+STATE_EXITED = "exited"
+
+
+class Session:
+    def __init__(self, session_id, role, protocol, target, argv=None):
+        self.id = session_id
+        self.role = role            # "server" or "client"
+        self.protocol = protocol
+        self.target = target        # human readable "ip:port" / URL
+        self.argv = list(argv) if argv else None
+        self.process = None
+        self.services = []          # in-process helpers with a .stop() method
+        self.details = {}           # free-form facts for the UI/logs (e.g. the sout plan)
+        self.state = STATE_RUNNING
+        self.started_at = time.time()
+        self.ended_at = None
+        self.exit_code = None
+        self._kill_deadline = None
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process else None
+
+    @property
+    def alive(self):
+        return self.state in (STATE_RUNNING, STATE_STOPPING)
+
+    def __repr__(self):
+        return f"<Session {self.id} {self.role}/{self.protocol} {self.target} {self.state} pid={self.pid}>"
+
+
+class SessionManager:
+    def __init__(self, on_exit=None):
+        # on_exit(session) is called from reap() for sessions whose process
+        # ended without stop() being asked for (crash, user closed VLC, ...)
+        self.on_exit = on_exit
+        self._sessions = {}
+        self._starting = set()      # ids reserved by a start() that is still spawning
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._launches = []         # launcher threads still running
+        self._done = queue.SimpleQueue()
+        self._closed = False
+
+    # ---------- lifecycle ----------
+    def start(self, role, protocol, target, argv=None, services=(), session_id=None,
+              capture_stdout=False, capture_stdin=False):
+        # capture_stdout: give the child a stdout pipe (session.process.stdout),
+        # for children that feed an in-process service such as the TS sender;
+        # capture_stdin: a stdin pipe, for children fed by one (playlists)
+        with self._lock:
+            if session_id is None:
+                session_id = f"{role}-{next(self._ids)}"
+            existing = self._sessions.get(session_id)
+            if session_id in self._starting or (existing and existing.alive):
+                raise ValueError(f"Session {session_id} is already running")
+            # Reserved until it's in the table, so a second start() of the same
+            # id (a watchdog restart racing the user's Start) can't slip in
+            self._starting.add(session_id)
+
+        session = Session(session_id, role, protocol, target, argv)
+        session.services.extend(services)
+        try:
+            if argv:
+                session.process = _spawn(argv, capture_stdout, capture_stdin)
+        except Exception:
+            _stop_services(session)
+            with self._lock:
+                self._starting.discard(session_id)
+            raise
+
+        with self._lock:
+            self._starting.discard(session_id)
+            self._sessions[session_id] = session
+        return session
+
+    def launch(self, build, on_done):
+        """Run build() on a launcher thread and report back through on_done.
+
+        build does the slow part of starting a session (binding servers,
+        spawning VLC) and returns the Session. on_done(session, error) is
+        not called from the launcher thread but from dispatch(), so it runs
+        on whichever thread polls that (the Tk thread in the app).
+        """
+        thread = threading.Thread(target=self._run_launch, args=(build, on_done),
+                                  name="session-launch", daemon=True)
+        with self._lock:
+            self._launches.append(thread)
+        thread.start()
+
+    def _run_launch(self, build, on_done):
+        try:
+            result, error = build(), None
+        except Exception as e:
+            result, error = None, e
+        if self._closed and isinstance(result, Session):
+            # The owner went away while we were starting: don't leak it
+            self.stop(result.id)
+        self._done.put((on_done, result, error))
+        with self._lock:
+            self._launches.remove(threading.current_thread())
+
+    @property
+    def launching(self):
+        with self._lock:
+            return bool(self._launches) or not self._done.empty()
+
+    def dispatch(self):
+        # Deliver finished launches to their callbacks, on the calling thread
+        while True:
+            try:
+                on_done, result, error = self._done.get_nowait()
+            except queue.Empty:
+                return
+            on_done(result, error)
+
+    def stop(self, session_id, grace=STOP_GRACE_SECONDS):
+        # grace: how long the process gets before it's killed (0: a hung
+        # process that won't exit by itself anyway)
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if not session or not session.alive:
+            return session
+
+        _stop_services(session)
+        if session.process and session.process.poll() is None:
+            _terminate_tree(session.process)
+            session.state = STATE_STOPPING
+            session._kill_deadline = time.monotonic() + grace
+        else:
+            self._finish(session, STATE_STOPPED)
+        return session
+
+    def stop_all(self, role=None):
+        for session in self.sessions(role):
+            self.stop(session.id)
+
+    def shutdown(self, timeout=STOP_GRACE_SECONDS):
+        # Blocking variant for app exit / scripts: stop everything and wait.
+        # Launches still in flight stop their own session once they finish.
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            launches = list(self._launches)
+        for thread in launches:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        self.stop_all()
+        while any(s.state == STATE_STOPPING for s in self.sessions()) and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for session in self.sessions():
+            if session.state == STATE_STOPPING:
+                _kill_tree(session.process)
+        self.reap()
+
+    # ---------- polling ----------
+    def reap(self):
+        """Non-blocking: collect exited children, escalate overdue stops.
+
+        Returns the sessions that ended on their own since the last call.
+        Meant to be called periodically (e.g. from Tk's after()).
+        """
+        crashed = []
+        now = time.monotonic()
+        for session in self.sessions():
+            proc = session.process
+            if not proc or not session.alive:
+                continue
+            code = proc.poll()
+            if code is None:
+                if session.state == STATE_STOPPING and now >= session._kill_deadline:
+                    _kill_tree(proc)
+                continue
+
+            session.exit_code = code
+            if session.state == STATE_STOPPING:
+                _kill_tree(proc)    # children that outlived their leader
+                self._finish(session, STATE_STOPPED)
+            else:
+                _stop_services(session)
+                self._finish(session, STATE_EXITED)
+                crashed.append(session)
+
+        if self.on_exit:
+            for session in crashed:
+                self.on_exit(session)
+        return crashed
+
+    # ---------- queries ----------
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def sessions(self, role=None, alive_only=False):
+        with self._lock:
+            items = list(self._sessions.values())
+        if role:
+            items = [s for s in items if s.role == role]
+        if alive_only:
+            items = [s for s in items if s.alive]
+        return items
+
+    def forget(self, session_id):
+        # Drop a finished session from the table
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session and not session.alive:
+                del self._sessions[session_id]
+
+    def _finish(self, session, state):
+        session.state = state
+        session.ended_at = time.time()
+        session._kill_deadline = None
+
+
+# ================= PROCESS HELPERS =================
+def _spawn(argv, capture_stdout=False, capture_stdin=False):
+    # No shell: argv goes straight to CreateProcess/exec, and the child gets
+    # its own process group so we can signal its whole tree later.
+    stdout = subprocess.PIPE if capture_stdout else None
+    stdin = subprocess.PIPE if capture_stdin else None
+    if IS_WINDOWS:
+        return subprocess.Popen(argv, stdin=stdin, stdout=stdout, creationflags=subprocess.CREATE_NEW_PROCESS_GROUP)
+    return subprocess.Popen(argv, stdin=stdin, stdout=stdout, start_new_session=True)
+
+
+def _terminate_tree(proc):
+    try:
+        if IS_WINDOWS:
+            # /T takes the child tree with it, /PID limits it to our process
+            subprocess.call(["taskkill", "/PID", str(proc.pid), "/T"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(proc.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+def _kill_tree(proc):
+    # On POSIX the whole process group goes, even once the leader has exited:
+    # VLC's own children can outlive it
+    if proc is None or (IS_WINDOWS and proc.poll() is not None):
+        return      # taskkill /T needs the live leader to find the tree
+    try:
+        if IS_WINDOWS:
+            subprocess.call(["taskkill", "/PID", str(proc.pid), "/T", "/F"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+def _stop_services(session):
+    services, session.services = session.services, []
+    for service in services:
+        try:
+            service.stop()
+        except Exception:
+            pass
@@ -0,0 +1,222 @@
+"""
+Codec-aware sout planning for VLC Stream Hub.
+
+Probes the source (media_probe.py) and picks the cheapest VLC chain that
+the output mux and the viewers' client profile can both take:
+
+  remux       streams copied untouched, no transcode module at all
+  audio       audio re-encoded to AAC, video copied
+  video       video re-encoded to H.264, audio copied
+  full        both re-encoded (last resort)
+
+Each plan carries a rough CPU cost in cores so operators can see how many
+channels a box can carry. plan_ladder() plans a multi-bitrate ladder: the
+source rendition plus smaller H.264 rungs, all fed from one VLC input.
+Files that can't be probed keep the old "#transcode{scodec=none}" chain,
+which is what every stream used before.
+"""
+from media_probe import ProbeError, probe
+from stream_commands import LEGACY_TRANSCODE
+
+# --- PLANNER CONFIGURATION ---
+# What each output mux can carry (VLC 3 muxers)
+MUX_VIDEO = {
+    "ts": {"h264", "hevc", "mpeg2video", "mpeg4", "mpeg1video", "vc1"},
+    "mkv": {"h264", "hevc", "mpeg2video", "mpeg4", "vp8", "vp9", "av1", "mjpeg", "theora", "vc1"},
+}
+MUX_AUDIO = {
+    "ts": {"aac", "mp3", "mp2", "ac3", "eac3", "dts", "opus"},
+    "mkv": {"aac", "mp3", "mp2", "ac3", "eac3", "dts", "opus", "vorbis", "flac", "pcm", "alac", "truehd"},
+}
+PROTOCOL_MUX = {"HTTP": "mkv", "HTTP Relay": "ts", "HLS": "ts", "RTP": "ts", "UDP": "ts", "native": "ts"}
+
+# What the viewers can decode. None means "anything the mux carries".
+CLIENT_PROFILES = {
+    "VLC desktop": {"video": None, "audio": None, "max_height": None},
+    "TV / browser": {"video": {"h264"}, "audio": {"aac", "mp3", "ac3"}, "max_height": 1080},
+    "Mobile": {"video": {"h264"}, "audio": {"aac"}, "max_height": 720},
+}
+DEFAULT_PROFILE = "VLC desktop"
+
+# Encoder settings for when something has to be re-encoded
+TRANSCODE_AUDIO = "acodec=mp4a,ab=160,channels=2,samplerate=48000"
+TRANSCODE_VIDEO_PRESET = "venc=x264{preset=veryfast,tune=zerolatency}"
+VIDEO_BITRATE_KBPS = {2160: 16000, 1440: 9000, 1080: 6000, 720: 3000, 480: 1500}
+
+# Ballpark per-stream CPU cost in cores of a ~3 GHz x86 CPU (x264 veryfast).
+# Encode/decode scale with pixels relative to 1080p30.
+COST_REMUX = 0.02
+COST_AUDIO_TRANSCODE = 0.05
+COST_H264_ENCODE_1080P = 1.5
+COST_DECODE_1080P = {"h264": 0.15, "hevc": 0.3, "vp9": 0.3, "av1": 0.5, "mpeg2video": 0.08, "mpeg4": 0.08}
+COST_DECODE_DEFAULT = 0.2
+PIXELS_1080P = 1920 * 1080
+
+# Multi-bitrate ladder rungs below the source: name -> (height, video kb/s)
+LADDER_RUNGS = {"1080p": (1080, 6000), "720p": (720, 3000), "480p": (480, 1200), "360p": (360, 700)}
+DEFAULT_LADDER = ("720p", "480p")
+LADDER_AUDIO = "acodec=mp4a,ab=128,channels=2,samplerate=48000"
+LADDER_AUDIO_KBPS = 128
+
+
+class SoutPlan:
+    def __init__(self, kind, transcode, cost, reasons, info=None):
+        self.kind = kind                # "remux", "audio", "video", "full" or "legacy"
+        self.transcode = transcode      # "transcode{...}" chain element, or "" for pure remux
+        self.cost = cost                # estimated CPU cores
+        self.reasons = reasons          # why anything gets re-encoded
+        self.info = info                # probe result, if any
+
+    def describe(self):
+        text = f"{self.kind} (~{self.cost:.2f} cores)"
+        if self.reasons:
+            text += ": " + "; ".join(self.reasons)
+        return text
+
+    def __repr__(self):
+        return f"<SoutPlan {self.describe()} {self.transcode or '(no transcode)'}>"
+
+
+class Rendition:
+    # One output of a ladder: its own chain element, bitrate and cost
+    def __init__(self, name, transcode, cost, kbps=None, height=None):
+        self.name = name                # "source" or a LADDER_RUNGS name; also its HTTP path
+        self.transcode = transcode      # chain element in front of this rendition's output
+        self.cost = cost                # estimated CPU cores this rendition adds
+        self.kbps = kbps                # nominal total bitrate (None: unknown source rate)
+        self.height = height
+
+    def describe(self):
+        rate = f"{self.kbps} kb/s" if self.kbps else "source rate"
+        return f"{self.name} ({rate}, ~{self.cost:.2f} cores)"
+
+    def __repr__(self):
+        return f"<Rendition {self.describe()} {self.transcode or '(no transcode)'}>"
+
+
+def legacy_plan(reason="source not probed"):
+    return SoutPlan("legacy", LEGACY_TRANSCODE, COST_REMUX, [reason])
+
+
+def plan_sout(file_path, protocol, profile=DEFAULT_PROFILE, info=None):
+    # info: an existing probe result (e.g. from the media library) saves a probe
+    if info is None or info.get("error"):
+        try:
+            info = probe(file_path)
+        except (ProbeError, OSError) as e:
+            return legacy_plan(f"probe failed: {e}")
+    return plan_for(info, protocol, profile)
+
+
+def plan_for(info, protocol, profile=DEFAULT_PROFILE):
+    mux = PROTOCOL_MUX.get(protocol, "ts")
+    wanted = CLIENT_PROFILES.get(profile, CLIENT_PROFILES[DEFAULT_PROFILE])
+    video, audio = info.get("video_codec"), info.get("audio_codec")
+    if not video and not audio:
+        return legacy_plan("no codec information")
+
+    reasons = []
+    height = info.get("height") or 0
+    max_height = wanted["max_height"]
+    video_ok = True
+    if video:
+        if video not in MUX_VIDEO[mux]:
+            reasons.append(f"{video} video can't go in {mux.upper()}")
+            video_ok = False
+        elif wanted["video"] is not None and video not in wanted["video"]:
+            reasons.append(f"{profile} clients can't decode {video}")
+            video_ok = False
+        elif max_height and height > max_height:
+            reasons.append(f"{height}p is above the {profile} limit of {max_height}p")
+            video_ok = False
+    audio_ok = True
+    if audio:
+        if audio not in MUX_AUDIO[mux]:
+            reasons.append(f"{audio} audio can't go in {mux.upper()}")
+            audio_ok = False
+        elif wanted["audio"] is not None and audio not in wanted["audio"]:
+            reasons.append(f"{profile} clients can't decode {audio}")
+            audio_ok = False
+
+    parts = []
+    cost = COST_REMUX
+    if not video_ok:
+        out_height = min(height or 1080, max_height or height or 1080)
+        parts += ["vcodec=h264", TRANSCODE_VIDEO_PRESET, f"vb={_video_kbps(out_height, info)}"]
+        if height > out_height:
+            parts.append(f"height={out_height}")
+        cost += _video_cost(video, height, out_height, info)
+    if not audio_ok:
+        parts.append(TRANSCODE_AUDIO)
+        cost += COST_AUDIO_TRANSCODE
+
+    if video_ok and audio_ok:
+        kind = "remux"
+    elif video_ok:
+        kind = "audio"
+    elif audio_ok:
+        kind = "video"
+    else:
+        kind = "full"
+    transcode = f"transcode{{{','.join(parts + ['scodec=none'])}}}" if parts else ""
+    return SoutPlan(kind, transcode, round(cost, 2), reasons, info)
+
+
+def plan_ladder(file_path, rungs=DEFAULT_LADDER, info=None):
+    # -> [Rendition], highest first. The source rendition is planned like a
+    # TS stream for the desktop profile (usually a plain copy); every rung
+    # below the source's height is an H.264 + AAC re-encode. Rungs at or
+    # above the source's height would only waste bits and are left out.
+    unknown = [r for r in rungs if r not in LADDER_RUNGS]
+    if unknown:
+        raise ValueError(f"Unknown ladder rung(s): {', '.join(unknown)}")
+    if info is None or info.get("error"):
+        try:
+            info = probe(file_path)
+        except (ProbeError, OSError) as e:
+            print(f"Ladder: probe failed ({e}), assuming a 1080p source")  # For debugging
+            info = {}
+    source = plan_for(info, "RTP") if info else legacy_plan()
+    bitrate = info.get("bitrate")
+    renditions = [Rendition("source", source.transcode, source.cost,
+                            int(bitrate / 1000) if bitrate else None, info.get("height"))]
+    in_height = info.get("height") or 1080
+    for name in sorted(set(rungs), key=lambda r: -LADDER_RUNGS[r][0]):
+        height, kbps = LADDER_RUNGS[name]
+        if height >= in_height:
+            continue
+        if bitrate:
+            kbps = min(kbps, max(300, int(bitrate / 1000 * (height / in_height) ** 2)))
+        transcode = (f"transcode{{vcodec=h264,{TRANSCODE_VIDEO_PRESET},vb={kbps},height={height},"
+                     f"{LADDER_AUDIO},scodec=none}}")
+        # Each transcode branch runs its own decoder in VLC 3, so decode counts per rung
+        cost = _video_cost(info.get("video_codec"), in_height, height, info) + COST_AUDIO_TRANSCODE
+        renditions.append(Rendition(name, transcode, round(cost, 2), kbps + LADDER_AUDIO_KBPS, height))
+    return renditions
+
+
+def _video_kbps(out_height, info):
+    # Table rate for the output height, but never more than the source had
+    target = next((rate for h, rate in sorted(VIDEO_BITRATE_KBPS.items()) if out_height <= h), 16000)
+    if info.get("bitrate"):
+        target = min(target, max(500, int(info["bitrate"] / 1000)))
+    return target
+
+
+def _video_cost(codec, in_height, out_height, info):
+    width = info.get("width") or in_height * 16 // 9 or 1920
+    in_pixels = width * (in_height or 1080)
+    out_pixels = in_pixels * (out_height / in_height) ** 2 if in_height else in_pixels
+    decode = COST_DECODE_1080P.get(codec, COST_DECODE_DEFAULT) * in_pixels / PIXELS_1080P
+    encode = COST_H264_ENCODE_1080P * out_pixels / PIXELS_1080P
+    return decode + encode
+
+
+if __name__ == "__main__":
+    import sys
+
+    for path in sys.argv[1:]:
+        for proto in ("HTTP", "RTP"):
+            for name in CLIENT_PROFILES:
+                print(f"{path} [{proto}, {name}]: {plan_sout(path, proto, name)!r}")
+        print(f"{path} [ladder]: {plan_ladder(path, tuple(LADDER_RUNGS))!r}")
@@ -0,0 +1,505 @@
+"""
+Receiver-side stream health analyzer for VLC Stream Hub.
+
+Joins the same udp://@ip:port, rtp://@ip:port or http://ip:port/ URL a
+client would open and reports, once per interval: TS bitrate, sync and
+continuity-counter errors, PCR interval and arrival jitter, RTP sequence
+gaps and RFC 3550 inter-arrival jitter.
+
+Datagrams are received straight into one contiguous buffer (RTP headers
+are scattered into a side array with recvmsg_into), so a whole batch of TS
+packets is a single NumPy (N, 188) view and every check runs as an array
+operation over the batch rather than a Python loop per packet.
+
+For multicast the analyzer can sit beside a running client (the socket is
+opened with SO_REUSEADDR). A unicast UDP/RTP port can only be read by one
+socket at a time, so there it replaces the client.
+"""
+import argparse
+import ipaddress
+import json
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from mpegts import (PCR_HZ, PCR_WRAP, RTP_CLOCK_HZ, RTP_HEADER_SIZE, TS_NULL_PID, TS_PACKET_SIZE,
+                    TS_SYNC_BYTE, find_sync, parse_rtp_header)
+from multicast_pool import join_group
+
+# --- ANALYZER CONFIGURATION ---
+ANALYZER_BATCH_DATAGRAMS = 512          # max datagrams per vectorised batch
+ANALYZER_MAX_DATAGRAM = 2048
+ANALYZER_RCVBUF = 8 * 1024 * 1024
+ANALYZER_REPORT_SECONDS = 1.0
+ANALYZER_PCR_INTERVAL_LIMIT = 0.04      # TR 101 290: PCRs at least every 40 ms
+ANALYZER_HTTP_HEADER_MAX = 64 * 1024
+ANALYZER_SYNC_SEARCH_BYTES = 1024 * 1024    # no TS sync in this much: not an MPEG-TS stream
+
+
+def parse_stream_url(url):
+    # -> (scheme, host, port, path) for udp://@ip:port, rtp://@ip:port, http://ip:port/...
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in ("udp", "rtp", "http"):
+        raise ValueError(f"Unsupported stream URL: {url}")
+    host = (parts.hostname or "").lstrip("@")
+    if not parts.port:
+        raise ValueError(f"Stream URL needs a port: {url}")
+    if parts.path.endswith(".m3u8"):
+        raise ValueError("HLS playlists can't be analysed; analyse the server's TS feed instead")
+    return scheme, host, parts.port, parts.path or "/"
+
+
+class TsBatchStats:
+    # Continuity, sync and PCR checks over (N, 188) packet batches. The last
+    # CC of every PID survives batch boundaries in an array indexed by PID;
+    # PCR samples are kept per report interval.
+    def __init__(self):
+        self.last_cc = np.full(8192, -1, dtype=np.int16)
+        self.pcr_pid = None
+        self.reset_interval()
+        self.totals = {"packets": 0, "sync_errors": 0, "cc_errors": 0, "tei_errors": 0}
+
+    def reset_interval(self):
+        self.packets = 0
+        self.sync_errors = 0
+        self.cc_errors = 0
+        self.tei_errors = 0
+        self.cc_error_pids = set()
+        self.pcr_times = []
+        self.pcr_values = []
+
+    def feed(self, packets, arrival):
+        # packets: uint8 (N, 188) view; arrival: float64 (N,) receive times
+        n = len(packets)
+        if not n:
+            return
+        self.packets += n
+
+        sync_ok = packets[:, 0] == 0x47
+        bad_sync = n - int(np.count_nonzero(sync_ok))
+        if bad_sync:
+            self.sync_errors += bad_sync
+            packets = packets[sync_ok]
+            arrival = arrival[sync_ok]
+
+        b1 = packets[:, 1]
+        b3 = packets[:, 3]
+        self.tei_errors += int(np.count_nonzero(b1 & 0x80))
+        pid = ((b1 & 0x1F).astype(np.int16) << 8) | packets[:, 2]
+        cc = (b3 & 0x0F).astype(np.int16)
+        afc = b3 >> 4 & 0x3
+        af_len = packets[:, 4]
+        has_af = (afc & 0x2).astype(bool) & (af_len > 0)
+        af_flags = np.where(has_af, packets[:, 5], 0)
+        discontinuity = (af_flags & 0x80).astype(bool)
+
+        self._check_cc(pid, cc, (afc & 0x1).astype(bool) & (pid != TS_NULL_PID), discontinuity)
+        self._collect_pcr(packets, pid, has_af & (af_len >= 7) & (af_flags & 0x10).astype(bool), arrival)
+
+    def _check_cc(self, pid, cc, has_payload, discontinuity):
+        # CC must advance by one per payload packet on each PID; one repeat
+        # (duplicate packet) is allowed. Sort by PID (stable, keeps arrival
+        # order) so each PID's run is contiguous, then compare neighbours.
+        pid, cc, discontinuity = pid[has_payload], cc[has_payload], discontinuity[has_payload]
+        if not len(pid):
+            return
+        order = np.argsort(pid, kind="stable")
+        pid, cc, discontinuity = pid[order], cc[order], discontinuity[order]
+
+        first = np.empty(len(pid), dtype=bool)
+        first[0] = True
+        first[1:] = pid[1:] != pid[:-1]
+        prev = np.empty_like(cc)
+        prev[1:] = cc[:-1]
+        prev[first] = self.last_cc[pid[first]]
+
+        errors = (prev >= 0) & (cc != ((prev + 1) & 0x0F)) & (cc != prev) & ~discontinuity
+        count = int(np.count_nonzero(errors))
+        if count:
+            self.cc_errors += count
+            self.cc_error_pids.update(np.unique(pid[errors]).tolist())
+
+        last = np.empty(len(pid), dtype=bool)
+        last[-1] = True
+        last[:-1] = first[1:]
+        self.last_cc[pid[last]] = cc[last]
+
+    def _collect_pcr(self, packets, pid, has_pcr, arrival):
+        if not has_pcr.any():
+            return
+        if self.pcr_pid is None:
+            self.pcr_pid = int(pid[has_pcr][0])
+        mask = has_pcr & (pid == self.pcr_pid)
+        b = packets[mask, 6:12].astype(np.int64)
+        base = (b[:, 0] << 25) | (b[:, 1] << 17) | (b[:, 2] << 9) | (b[:, 3] << 1) | (b[:, 4] >> 7)
+        pcr = base * 300 + (((b[:, 4] & 0x01) << 8) | b[:, 5])
+        self.pcr_times.append(arrival[mask])
+        self.pcr_values.append(pcr)
+
+    def pcr_report(self):
+        # PCR interval and arrival jitter: how far arrival times stray from
+        # the PCR timeline once clock offset and drift (a linear fit) are
+        # taken out.
+        if not self.pcr_values:
+            return {"pcr_pid": self.pcr_pid, "pcr_jitter_ms": None, "pcr_interval_max_ms": None}
+        times = np.concatenate(self.pcr_times)
+        pcr = np.concatenate(self.pcr_values)
+        if len(pcr) < 3:
+            return {"pcr_pid": self.pcr_pid, "pcr_jitter_ms": None, "pcr_interval_max_ms": None}
+        steps = np.diff(pcr)
+        steps[steps < -PCR_WRAP // 2] += PCR_WRAP
+        stream_t = np.concatenate(([0.0], np.cumsum(steps) / PCR_HZ))
+        # Discontinuities (jumps > 1 s either way) would swamp the fit; skip them
+        sane = np.abs(steps) < PCR_HZ
+        if not sane.all():
+            return {"pcr_pid": self.pcr_pid, "pcr_jitter_ms": None,
+                    "pcr_interval_max_ms": None, "pcr_discontinuities": int(np.count_nonzero(~sane))}
+        wall_t = times - times[0]
+        deviation = wall_t - stream_t
+        slope, offset = np.polyfit(stream_t, deviation, 1)
+        residual = deviation - (slope * stream_t + offset)
+        interval_max = float(steps.max()) / PCR_HZ
+        return {
+            "pcr_pid": self.pcr_pid,
+            "pcr_jitter_ms": round(float(np.ptp(residual)) * 1000, 3),
+            "pcr_interval_max_ms": round(interval_max * 1000, 2),
+            "pcr_interval_errors": int(np.count_nonzero(steps > ANALYZER_PCR_INTERVAL_LIMIT * PCR_HZ)),
+        }
+
+    def close_interval(self):
+        for key in ("packets", "sync_errors", "cc_errors", "tei_errors"):
+            self.totals[key] += getattr(self, key)
+        report = {
+            "packets": self.packets,
+            "sync_errors": self.sync_errors,
+            "cc_errors": self.cc_errors,
+            "cc_error_pids": sorted(self.cc_error_pids),
+            "tei_errors": self.tei_errors,
+        }
+        report.update(self.pcr_report())
+        self.reset_interval()
+        return report
+
+
+class RtpBatchStats:
+    # Sequence gaps and RFC 3550 inter-arrival jitter from (N, 12) header arrays
+    def __init__(self):
+        self.last_seq = None
+        self.last_transit = None
+        self.jitter = 0.0           # in RTP clock units
+        self.ssrc = None
+        self.reset_interval()
+        self.totals = {"received": 0, "lost": 0, "reordered": 0}
+
+    def reset_interval(self):
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+
+    def feed(self, headers, arrival):
+        n = len(headers)
+        if not n:
+            return
+        self.received += n
+        self.ssrc = int.from_bytes(headers[-1, 8:12].tobytes(), "big")
+        seq = (headers[:, 2].astype(np.int32) << 8) | headers[:, 3]
+        ts = ((headers[:, 4].astype(np.int64) << 24) | (headers[:, 5].astype(np.int64) << 16)
+              | (headers[:, 6].astype(np.int64) << 8) | headers[:, 7])
+
+        prev = np.empty_like(seq)
+        prev[1:] = seq[:-1]
+        prev[0] = seq[0] - 1 if self.last_seq is None else self.last_seq
+        step = (seq - prev) & 0xFFFF
+        forward = (step > 0) & (step < 0x8000)
+        self.lost += int((step[forward] - 1).sum())
+        self.reordered += int(np.count_nonzero(~forward))
+        self.last_seq = int(seq[-1])
+
+        # Transit time in RTP units; D between consecutive packets, then the
+        # J += (|D| - J) / 16 filter. The filter is sequential, but it's one
+        # float op per datagram on an already-computed array.
+        transit = arrival * RTP_CLOCK_HZ - ts
+        if self.last_transit is not None:
+            transit = np.concatenate(([self.last_transit], transit))
+        d = np.abs(np.diff(transit))
+        jitter = self.jitter
+        for value in d.tolist():
+            jitter += (value - jitter) / 16.0
+        self.jitter = jitter
+        self.last_transit = float(transit[-1])
+
+    def close_interval(self):
+        for key in ("received", "lost", "reordered"):
+            self.totals[key] += getattr(self, key)
+        report = {
+            "rtp_received": self.received,
+            "rtp_lost": self.lost,
+            "rtp_reordered": self.reordered,
+            "rtp_jitter_ms": round(self.jitter / RTP_CLOCK_HZ * 1000, 3),
+            "rtp_ssrc": self.ssrc,
+        }
+        self.reset_interval()
+        return report
+
+
+class StreamAnalyzer:
+    def __init__(self, url, interval=ANALYZER_REPORT_SECONDS, on_report=None, interface="0.0.0.0"):
+        self.url = url
+        self.scheme, self.host, self.port, self.path = parse_stream_url(url)
+        self.interval = interval
+        self.on_report = on_report      # called from the analyzer thread
+        self.interface = interface
+        self.last_report = None
+        self.reports = 0
+
+        self.ts = TsBatchStats()
+        self.rtp = RtpBatchStats() if self.scheme == "rtp" else None
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._sock = None
+        self._bytes = 0
+        self._interval_start = None
+
+    # ---------- lifecycle (session manager service) ----------
+    def start(self):
+        self._sock = self._open()
+        self._thread = threading.Thread(target=self._serve, name=f"analyzer-{self.port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+
+    def _serve(self):
+        # As a service the failure goes to the status label instead of a traceback
+        try:
+            self.run()
+        except (OSError, ValueError) as e:
+            print(f"Analyzer: {e}")  # For debugging
+            self.last_report = {"url": self.url, "time": time.time(), "error": str(e)}
+
+    def run(self, duration=None):
+        # Raises ValueError if an http:// stream turns out not to be MPEG-TS
+        if self._sock is None:
+            self._sock = self._open()
+        deadline = time.monotonic() + duration if duration else None
+        self._interval_start = time.perf_counter()
+        try:
+            if self.scheme == "http":
+                self._run_tcp(deadline)
+            else:
+                self._run_udp(deadline)
+        finally:
+            self._sock.close()
+
+    def _open(self):
+        if self.scheme == "http":
+            sock = socket.create_connection((self.host, self.port), timeout=5.0)
+            host = self.host if self.port == 80 else f"{self.host}:{self.port}"
+            sock.sendall(f"GET {self.path} HTTP/1.0\r\nHost: {host}\r\n\r\n".encode())
+            sock.settimeout(0.25)
+            return sock
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, ANALYZER_RCVBUF)
+        if _is_multicast(self.host):
+            # Only this stream's group, not every group joined on the port
+            join_group(sock, self.host, self.port, self.interface)
+        else:
+            sock.bind((self.host or "", self.port))
+        sock.settimeout(0.25)
+        return sock
+
+    # ---------- receive loops ----------
+    def _run_udp(self, deadline):
+        sock = self._sock
+        rtp = self.rtp is not None
+        payload = bytearray(ANALYZER_BATCH_DATAGRAMS * ANALYZER_MAX_DATAGRAM)
+        payload_view = memoryview(payload)
+        headers = np.zeros((ANALYZER_BATCH_DATAGRAMS, RTP_HEADER_SIZE), dtype=np.uint8)
+        header_views = [memoryview(row) for row in headers] if rtp else None
+        counts = np.zeros(ANALYZER_BATCH_DATAGRAMS, dtype=np.int64)
+        times = np.zeros(ANALYZER_BATCH_DATAGRAMS, dtype=np.float64)
+
+        while not self._stop.is_set() and (deadline is None or time.monotonic() < deadline):
+            # Block for the first datagram, then drain whatever is queued
+            n = 0
+            offset = 0
+            sock.settimeout(0.25)
+            try:
+                while n < ANALYZER_BATCH_DATAGRAMS:
+                    room = payload_view[offset:offset + ANALYZER_MAX_DATAGRAM]
+                    if rtp:
+                        nbytes = sock.recvmsg_into([header_views[n], room])[0] - RTP_HEADER_SIZE
+                        if nbytes > 0 and headers[n, 0] & 0xDF != 0x80:
+                            nbytes = _strip_rtp_extras(header_views[n], room, nbytes)
+                    else:
+                        nbytes = sock.recv_into(room)
+                    times[n] = time.perf_counter()
+                    whole = max(0, nbytes) // TS_PACKET_SIZE
+                    if whole:
+                        counts[n] = whole
+                        offset += whole * TS_PACKET_SIZE
+                        n += 1
+                    self._bytes += max(0, nbytes)
+                    if n == 1:
+                        sock.setblocking(False)
+            except (BlockingIOError, socket.timeout):
+                pass
+
+            if n:
+                packets = np.frombuffer(payload, dtype=np.uint8, count=offset).reshape(-1, TS_PACKET_SIZE)
+                self.ts.feed(packets, np.repeat(times[:n], counts[:n]))
+                if rtp:
+                    self.rtp.feed(headers[:n], times[:n])
+                del packets
+            self._maybe_report()
+
+    def _run_tcp(self, deadline):
+        # The buffer only ever holds the unread tail: the response header while
+        # it comes in, under three packets while hunting for sync and under one
+        # once synced, so there is always room to receive into
+        sock = self._sock
+        buf = bytearray(4 * 1024 * 1024)
+        view = memoryview(buf)
+        fill = 0
+        synced = False
+        header_done = False
+        searched = 0            # bytes dropped while looking for sync
+        while not self._stop.is_set() and (deadline is None or time.monotonic() < deadline):
+            try:
+                nbytes = sock.recv_into(view[fill:])
+            except socket.timeout:
+                self._maybe_report()
+                continue
+            if not nbytes:
+                break
+            now = time.perf_counter()
+            self._bytes += nbytes
+            fill += nbytes
+            start = 0
+            if not header_done:
+                end = buf.find(b"\r\n\r\n", 0, fill)
+                if end < 0:
+                    if fill >= ANALYZER_HTTP_HEADER_MAX:
+                        raise ValueError(f"{self.url} sent no HTTP response header")
+                    continue
+                header_done = True
+                start = end + 4
+            if synced and buf[start] != TS_SYNC_BYTE:
+                self.ts.sync_errors += 1
+                synced = False
+            if not synced:
+                pos = find_sync(buf, start, fill)
+                if pos < 0:
+                    # Keep only the bytes that could still start a sync run
+                    keep = max(start, fill - 2 * TS_PACKET_SIZE)
+                    searched += keep - start
+                    if searched > ANALYZER_SYNC_SEARCH_BYTES:
+                        raise ValueError(f"{self.url} is not an MPEG-TS stream (no sync in {searched} bytes)")
+                    view[:fill - keep] = view[keep:fill]
+                    fill -= keep
+                    self._maybe_report()
+                    continue
+                start = pos
+                synced = True
+                searched = 0
+
+            whole = (fill - start) // TS_PACKET_SIZE
+            if whole:
+                packets = np.frombuffer(buf, dtype=np.uint8, count=whole * TS_PACKET_SIZE,
+                                        offset=start).reshape(-1, TS_PACKET_SIZE)
+                self.ts.feed(packets, np.full(whole, now))
+                del packets
+            used = start + whole * TS_PACKET_SIZE
+            view[:fill - used] = view[used:fill]
+            fill -= used
+            self._maybe_report()
+
+    def _maybe_report(self):
+        now = time.perf_counter()
+        elapsed = now - self._interval_start
+        if elapsed < self.interval:
+            return
+        report = {"url": self.url, "time": time.time(), "interval_s": round(elapsed, 3),
+                  "bitrate_mbps": round(self._bytes * 8 / elapsed / 1e6, 3)}
+        report.update(self.ts.close_interval())
+        if self.rtp:
+            report.update(self.rtp.close_interval())
+        self._bytes = 0
+        self._interval_start = now
+        self.last_report = report
+        self.reports += 1
+        if self.on_report:
+            self.on_report(report)
+
+
+def _strip_rtp_extras(header, payload, nbytes):
+    # The datagram's RTP header didn't fit the fixed 12 bytes scattered into
+    # header: move the TS past the CSRCs and header extension down to the
+    # start of payload -> its length (0 to drop a datagram that isn't RTP v2)
+    parsed = parse_rtp_header(bytes(header) + bytes(payload[:nbytes]))
+    extra = parsed[3] - RTP_HEADER_SIZE if parsed else nbytes
+    if extra >= nbytes:
+        return 0
+    payload[:nbytes - extra] = payload[extra:nbytes]
+    return nbytes - extra
+
+
+def _is_multicast(host):
+    try:
+        return ipaddress.ip_address(host).is_multicast
+    except ValueError:
+        return False
+
+
+def summarize(report):
+    # One line for the status label
+    if not report:
+        return "Waiting for data..."
+    if "error" in report:
+        return report["error"]
+    parts = [f"{report['bitrate_mbps']:.2f} Mbit/s", f"CC err {report['cc_errors']}"]
+    if report.get("pcr_jitter_ms") is not None:
+        parts.append(f"PCR jitter {report['pcr_jitter_ms']:.1f} ms")
+    if "rtp_lost" in report:
+        parts.append(f"RTP lost {report['rtp_lost']}")
+        parts.append(f"jitter {report['rtp_jitter_ms']:.1f} ms")
+    return " | ".join(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MPEG-TS stream health analyzer")
+    parser.add_argument("url", help="udp://@ip:port, rtp://@ip:port or http://ip:port/")
+    parser.add_argument("--interval", type=float, default=ANALYZER_REPORT_SECONDS)
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--interface", default="0.0.0.0", help="local address to join multicast on")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per report")
+    args = parser.parse_args(argv)
+
+    def show(report):
+        print(json.dumps(report) if args.json else summarize(report))
+        sys.stdout.flush()
+
+    analyzer = StreamAnalyzer(args.url, args.interval, on_report=show, interface=args.interface)
+    try:
+        analyzer.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    except ValueError as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
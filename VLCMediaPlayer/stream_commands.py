@@ -0,0 +1,151 @@
+"""
+VLC command lines and client URLs for every streaming mode.
+
+Kept free of any GUI code so the desktop app, the benchmark harness and
+scripts build exactly the same commands.
+"""
+import os
+
+# Fallback multicast address for RTP (the app leases per-stream groups from multicast_pool)
+MULTICAST_IP = "239.255.1.1"
+
+SERVER_PROTOCOLS = ["HTTP", "HTTP Relay", "Direct HTTP", "HLS", "RTP", "UDP"]
+CLIENT_PROTOCOLS = SERVER_PROTOCOLS
+# Modes a multi-bitrate ladder can go out on (one VLC output per rendition)
+LADDER_PROTOCOLS = ("HTTP", "RTP", "UDP")
+
+
+# Chain element every stream used before the sout planner existed
+LEGACY_TRANSCODE = "transcode{scodec=none}"
+
+
+def build_server_sout(protocol, port, local_ip, multicast_ip=MULTICAST_IP, ingest_port=None,
+                      transcode=LEGACY_TRANSCODE, hls_dir=None, hls_pattern=None):
+    # -> (sout_cmd, stream_target). sout_cmd is None for modes that don't run
+    # VLC (Direct HTTP). HTTP Relay needs the relay's UDP ingest port, HLS
+    # the segment server's directory and segment name pattern; RTP/UDP with an ingest port go through
+    # the FEC sender. transcode is the planner's chain element; "" sends
+    # the streams as-is.
+    if protocol == "Direct HTTP":
+        return None, f"{local_ip}:{port}"
+    if protocol == "HTTP":
+        # HTTP uses standard IP or 0.0.0.0 (default) to serve the stream
+        output, target = f"dst=http{{mux=mkv,dst=:{port}/}}", f"{local_ip}:{port}"
+    elif protocol == "HTTP Relay":
+        # VLC pushes one TS feed to a local relay which fans it out to the viewers
+        output, target = f"dst=udp{{dst=127.0.0.1:{ingest_port},mux=ts}}", f"{local_ip}:{port}"
+    elif protocol == "HLS":
+        # VLC cuts key-frame aligned TS segments and a rolling playlist into
+        # hls_dir; the in-process segment server hands them out. (Imported
+        # here: http.server is too slow a load for every CLI start.)
+        from hls_server import HLS_PLAYLIST, HLS_PLAYLIST_SEGMENTS, HLS_SEGMENT_SECONDS
+        index = _sout_path(os.path.join(hls_dir, HLS_PLAYLIST))
+        segments = _sout_path(os.path.join(hls_dir, hls_pattern))
+        output = (f'dst=std{{access=livehttp{{seglen={HLS_SEGMENT_SECONDS},delsegs=true,'
+                  f'numsegs={HLS_PLAYLIST_SEGMENTS},index="{index}",index-url={hls_pattern}}},'
+                  f'mux=ts{{use-key-frames}},dst="{segments}"}}')
+        target = f"{local_ip}:{port}"
+    elif protocol in ("RTP", "UDP") and ingest_port:
+        # The FEC sender wraps VLC's TS in RTP and adds the parity streams
+        ip = multicast_ip if protocol == "RTP" else local_ip
+        output, target = f"dst=udp{{dst=127.0.0.1:{ingest_port},mux=ts}}", f"{ip}:{port}"
+    elif protocol == "RTP":
+        # RTP streams sent to the Multicast IP (239.255.1.1)
+        output, target = f"dst=rtp{{dst={multicast_ip},port={port},mux=ts}}", f"{multicast_ip}:{port}"
+    elif protocol == "UDP":
+        # UDP streams sent to the Local Unicast IP
+        output, target = f"dst=udp{{dst={local_ip},port={port},mux=ts}}", f"{local_ip}:{port}"
+    else:
+        raise ValueError(f"Unknown protocol selected: {protocol}")
+    return _chain(transcode, f"duplicate{{{output},dst=display}}"), target
+
+
+def build_ladder_sout(protocol, port, local_ip, renditions, groups=None):
+    # -> (sout_cmd, [(ip, port, path)] per rendition). One VLC input fans out
+    # through duplicate{} into a chain per rendition: HTTP renditions share
+    # the port on their own path, RTP ones go to one multicast group each
+    # (groups, same order as renditions), UDP ones to consecutive even ports.
+    # Every rendition is TS so players can switch between them.
+    if protocol not in LADDER_PROTOCOLS:
+        raise ValueError(f"A bitrate ladder goes out over {', '.join(LADDER_PROTOCOLS)}, not {protocol}")
+    branches, targets = [], []
+    for i, rendition in enumerate(renditions):
+        if protocol == "HTTP":
+            output, target = f"http{{mux=ts,dst=:{port}/{rendition.name}}}", (local_ip, port, rendition.name)
+        elif protocol == "RTP":
+            output, target = f"rtp{{dst={groups[i]},port={port},mux=ts}}", (groups[i], port, "")
+        else:
+            output, target = f"udp{{dst={local_ip},port={port + 2 * i},mux=ts}}", (local_ip, port + 2 * i, "")
+        chain = f"{rendition.transcode}:{output}" if rendition.transcode else output
+        branches.append(f'dst="{chain}"')
+        targets.append(target)
+    return f"#duplicate{{{','.join(branches)},dst=display}}", targets
+
+
+def _sout_path(path):
+    # Quoted sout values treat backslashes as escapes; Windows takes "/" too
+    return path.replace("\\", "/")
+
+
+def _chain(transcode, output):
+    return f"#{transcode}:{output}" if transcode else f"#{output}"
+
+
+def _vlc(vlc_path):
+    # vlc_path may also be a ready-made command prefix (e.g. a stand-in script)
+    return [vlc_path] if isinstance(vlc_path, str) else list(vlc_path)
+
+
+def server_argv(vlc_path, file_path, sout_cmd, stats_port=None, start_time=None):
+    # Subtitles are never streamed (the legacy chain dropped them with scodec=none).
+    # stats_port: open VLC's rc interface on loopback so metrics.py can read
+    # its input/output statistics. start_time: seconds into the file to
+    # start at (a restarted stream resuming where it was).
+    return (_vlc(vlc_path) + _stats_options(stats_port)
+            + [file_path, f":sout={sout_cmd}", ":no-sout-all", ":no-sout-spu", ":sout-keep"]
+            + _start_options(":", start_time))
+
+
+def stdin_server_argv(vlc_path, sout_cmd, stats_port=None):
+    # Output VLC reading one continuous TS from stdin (gapless playlists)
+    return server_argv(vlc_path, "-", sout_cmd, stats_port) + [":demux=ts"]
+
+
+def _start_options(prefix, start_time):
+    return [f"{prefix}start-time={start_time:.1f}"] if start_time else []
+
+
+def _stats_options(stats_port):
+    if not stats_port:
+        return []
+    options = ["--extraintf=rc", f"--rc-host=127.0.0.1:{stats_port}"]
+    if os.name == "nt":
+        options.append("--rc-quiet")    # no extra console window on Windows
+    return options
+
+
+def remux_argv(vlc_path, source_file, transcode="", start_time=None):
+    # Headless VLC writing the source as plain TS to stdout (feeds the native sender)
+    return (_vlc(vlc_path) + ["-I", "dummy", "--no-repeat", "--no-loop", "--no-sout-spu"]
+            + _start_options("--", start_time)
+            + [source_file, "--sout", _chain(transcode, "std{access=file,mux=ts,dst=-}"), "vlc://quit"])
+
+
+def client_url(protocol, ip, port, path=""):
+    # path: an HTTP ladder rendition's path on the server
+    if protocol in ("HTTP", "HTTP Relay", "Direct HTTP"):
+        # Direct HTTP serves the file on every path, so the root URL works too
+        return f"http://{ip}:{port}/{path}"
+    if protocol == "HLS":
+        from hls_server import HLS_PLAYLIST
+        return f"http://{ip}:{port}/{HLS_PLAYLIST}"
+    if protocol in ("RTP", "UDP"):
+        # RTP/UDP requires the listener format: protocol://@IP:Port
+        return f"{protocol.lower()}://@{ip}:{port}"
+    raise ValueError(f"Invalid protocol selected: {protocol}")
+
+
+def client_argv(vlc_path, url, options=(), rc_port=None):
+    # options: input options for the stream, e.g. ":network-caching=300".
+    # rc_port: VLC's rc interface on loopback, to drive the player (timeshift)
+    return _vlc(vlc_path) + _stats_options(rc_port) + [url] + list(options)
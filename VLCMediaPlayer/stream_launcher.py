@@ -0,0 +1,378 @@
+"""
+Session start-up shared by the desktop app and the streamctl CLI.
+
+Everything between "a file, protocol and port were picked" and a running
+Session: the in-process servers, the sout plan, VLC / the native sender /
+a playlist feed, and the SAP announcement. No GUI toolkit is imported
+here, so headless scripts start fast; modules only some modes need are
+imported when that mode starts.
+"""
+import json
+import os
+import subprocess
+
+from client_latency import DEFAULT_LATENCY_MODE, describe, log_connection, tune_connection, vlc_options
+from stream_commands import (LADDER_PROTOCOLS, MULTICAST_IP, build_ladder_sout, build_server_sout, client_argv,
+                             client_url, remux_argv, server_argv, stdin_server_argv)
+from sout_planner import DEFAULT_PROFILE, plan_ladder, plan_sout
+
+# --- CONFIGURATION ---
+VLC_PATH_CONFIG_FILE = "vlc_config.json"
+DEFAULT_VLC_PATH = r"C:\Program Files\VideoLAN\VLC\vlc.exe"
+
+
+def load_config():
+    if os.path.exists(VLC_PATH_CONFIG_FILE):
+        try:
+            with open(VLC_PATH_CONFIG_FILE, 'r') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+    return {}
+
+
+def start_server(sessions, files, protocol, port, local_ip, vlc_path, native=False,
+                 profile=DEFAULT_PROFILE, info=None, announce=True, pool=None, in_use=(), ladder=None, fec=None,
+                 start_time=None, session_id=None, groups=None, bind_host=""):
+    # files: one path, or several for a gapless looping playlist. info: the
+    # media library's probe row for a single file (saves a probe). pool: a
+    # MulticastPool that gives an RTP stream its own group (in_use: (ip, port)
+    # pairs known to be taken, e.g. from SAP); without one RTP goes to
+    # MULTICAST_IP. ladder: rung names (sout_planner.LADDER_RUNGS) to serve
+    # next to the source as a multi-bitrate ladder. fec: (L, D) matrix to
+    # protect an RTP/UDP stream with row/column FEC. start_time, session_id,
+    # groups: restart_server()'s resume point, id and multicast groups.
+    # bind_host: address the in-process servers listen on ("": all; the
+    # benchmark keeps them on loopback). Slow (binds ports, probes groups, spawns VLC): the app calls it from a
+    # launcher thread.
+    files = [os.path.normpath(f) for f in files]
+    port = int(port)    # the app passes the entry's text
+    if len(files) > 1 and protocol == "Direct HTTP":
+        raise ValueError("Direct HTTP serves a single file")
+    if fec and (protocol not in ("RTP", "UDP") or ladder):
+        raise ValueError("FEC protects a single RTP or UDP stream")
+    if ladder:
+        if len(files) > 1 or native:
+            raise ValueError("A bitrate ladder needs a single file streamed by VLC")
+        session = _start_ladder(sessions, files[0], protocol, port, local_ip, vlc_path, ladder, info, announce,
+                                pool, in_use, start_time, session_id, groups)
+    elif protocol != "RTP" or pool is None:
+        session = _start_server(sessions, files, protocol, port, local_ip, vlc_path, native, profile, info,
+                                announce, MULTICAST_IP, fec, start_time, session_id, bind_host)
+    else:
+        lease = pool.allocate(port, local_ip, in_use, groups[0] if groups else None)
+        try:
+            session = _start_server(sessions, files, protocol, port, local_ip, vlc_path, native, profile, info,
+                                    announce, lease.group, fec, start_time, session_id, bind_host)
+        except Exception:
+            lease.stop()
+            raise
+        session.services.append(lease)     # released when the session stops
+    # What restart_server() needs to bring the stream back after a crash
+    session.details["launch"] = {"files": files, "protocol": protocol, "port": port, "local_ip": local_ip,
+                                 "vlc_path": vlc_path, "native": native, "profile": profile,
+                                 "announce": announce, "pool": pool, "ladder": ladder, "fec": fec,
+                                 "bind_host": bind_host}
+    session.details["start_time"] = start_time or 0.0
+    return session
+
+
+def restart_server(sessions, session, seconds=None, item=None):
+    # Starts a failed server session again under its id, on its port and
+    # multicast groups: seconds into the file, or a playlist from its item
+    # number item. The session must have ended (watchdog.py stops it first).
+    launch = dict(session.details["launch"])
+    files = launch.pop("files")
+    if item:
+        files = files[item:] + files[:item]    # loops anyway: same order, current item first
+    groups = None
+    if launch["protocol"] == "RTP":
+        targets = [target for _, target in session.details.get("ladder", ())]
+        groups = [ip for ip, _, _ in targets] or [session.target.rsplit(":", 1)[0]]
+    plan = session.details.get("plan")
+    return start_server(sessions, files, info=plan.info if plan else None, start_time=seconds,
+                        session_id=session.id, groups=groups, **launch)
+
+
+def _start_server(sessions, files, protocol, port, local_ip, vlc_path, native, profile, info, announce,
+                  multicast_ip, fec=None, start_time=None, session_id=None, bind_host=""):
+    file_path = files[0]
+    playlist = files if len(files) > 1 else None
+
+    # --- In-process servers (Direct HTTP has no VLC at all, HTTP Relay fans out VLC's feed,
+    # the FEC sender protects it) ---
+    services = []
+    ingest_port = None
+    hls_dir = hls_pattern = None
+    if protocol == "Direct HTTP":
+        from file_server import DirectFileServer
+        services.append(DirectFileServer(file_path, port, bind_host).start())
+    elif protocol == "HTTP Relay":
+        from relay import HttpRelay
+        relay = HttpRelay(port, host=bind_host or "0.0.0.0").start()
+        services.append(relay)
+        ingest_port = relay.ingest_port
+    elif protocol == "HLS":
+        # VLC writes segments into the server's scratch dir; viewers share cached segments
+        from hls_server import HlsServer
+        hls = HlsServer(port, bind_host).start()
+        services.append(hls)
+        hls_dir, hls_pattern = hls.segment_dir, hls.segment_pattern
+    elif fec:
+        # VLC or the native sender feed it plain TS on loopback; it sends RTP + parity
+        from fec import FecSender
+        rtp = protocol == "RTP"
+        sender = FecSender(multicast_ip if rtp else local_ip, port, fec, interface=local_ip if rtp else None).start()
+        services.append(sender)
+        ingest_port = sender.ingest_port
+
+    if playlist:
+        sout_cmd, stream_target = build_server_sout(protocol, port, local_ip, multicast_ip, ingest_port, "", hls_dir,
+                                                    hls_pattern)
+        session = _start_playlist(sessions, vlc_path, protocol, stream_target, playlist, port, local_ip,
+                                  native, sout_cmd, services, profile, ingest_port, session_id)
+        if fec:
+            session.details["fec"] = services[0]
+        return _announce(session, f"Playlist ({len(playlist)} files)", local_ip) if announce else session
+
+    # --- Server Mode VLC Output (sout) Configuration ---
+    # The planner picks remux / audio / video / full transcode from the source's codecs
+    plan = None
+    if protocol != "Direct HTTP" and not (native and file_path.lower().endswith(".ts")):
+        plan = plan_sout(file_path, "native" if native else protocol, profile, info)
+        print(f"Sout Plan: {plan.describe()}")
+    transcode = plan.transcode if plan else ""
+    sout_cmd, stream_target = build_server_sout(protocol, port, local_ip, multicast_ip, ingest_port, transcode, hls_dir,
+                                                hls_pattern)
+
+    if native:
+        session = _start_native_sender(sessions, vlc_path, protocol, stream_target, file_path, port, local_ip,
+                                       transcode, services, ingest_port, start_time, session_id)
+    else:
+        stats_port = None
+        if sout_cmd:
+            from metrics import free_local_port
+            stats_port = free_local_port()
+            argv = server_argv(vlc_path, file_path, sout_cmd, stats_port, start_time)
+            print(f"Server Command: {subprocess.list2cmdline(argv)}") # For debugging
+        else:
+            argv = None
+        session = sessions.start("server", protocol, stream_target, argv, services, session_id)
+        session.details["stats_port"] = stats_port
+    session.details["plan"] = plan
+    if fec:
+        session.details["fec"] = services[0]
+    return _announce(session, file_path, local_ip) if announce else session
+
+
+def _start_ladder(sessions, file_path, protocol, port, local_ip, vlc_path, rungs, info, announce, pool, in_use,
+                  start_time=None, session_id=None, groups=None):
+    # One VLC reads and demuxes the source once; duplicate{} feeds every
+    # rendition's chain. RTP renditions each lease a multicast group (groups:
+    # the ones to take again, in rendition order).
+    from ladder import load_measurements
+    from metrics import free_local_port
+
+    if protocol not in LADDER_PROTOCOLS:
+        raise ValueError(f"A bitrate ladder goes out over {', '.join(LADDER_PROTOCOLS)}, not {protocol}")
+    renditions = plan_ladder(file_path, rungs, info)
+    print("Ladder Plan: " + ", ".join(r.describe() for r in renditions))  # For debugging
+    leases = []
+    prefer = list(groups or ())
+    try:
+        groups = None
+        if protocol == "RTP":
+            if pool is None:
+                from multicast_pool import MulticastPool
+                pool = MulticastPool()
+            leases = [pool.allocate(port, local_ip, in_use, prefer[i] if i < len(prefer) else None)
+                      for i in range(len(renditions))]
+            groups = [lease.group for lease in leases]
+        sout_cmd, targets = build_ladder_sout(protocol, port, local_ip, renditions, groups)
+        stats_port = free_local_port()
+        argv = server_argv(vlc_path, file_path, sout_cmd, stats_port, start_time)
+        print(f"Server Command: {subprocess.list2cmdline(argv)}") # For debugging
+        session = sessions.start("server", protocol, f"{targets[0][0]}:{targets[0][1]}", argv,
+                                 session_id=session_id)
+    except Exception:
+        for lease in leases:
+            lease.stop()
+        raise
+    session.services.extend(leases)     # released when the session stops
+    session.details["stats_port"] = stats_port
+    session.details["ladder"] = list(zip(renditions, targets))
+    session.details["ladder_cpu"] = load_measurements(file_path)
+    if announce:
+        for rendition, (ip, rendition_port, path) in session.details["ladder"]:
+            _announce(session, file_path, local_ip, (ip, rendition_port), (rendition.name, rendition.kbps), path)
+    return session
+
+
+def start_client(sessions, protocol, ip, port, vlc_path, latency=DEFAULT_LATENCY_MODE, timeshift_minutes=None,
+                 path="", probe=None, fec=False):
+    # latency: a client_latency mode. Tuned modes probe the stream first
+    # (a couple of seconds) and size VLC's caching from what they measure.
+    # timeshift_minutes: receive the stream into a timeshift ring and play it
+    # from there, so the viewer can pause, rewind and save the last minutes.
+    # path: a ladder rendition's HTTP path; probe: a fresh probe of the stream.
+    # fec: receive an RTP/UDP stream's FEC too and repair it before VLC (or
+    # the probe and the timeshift ring) see it.
+    url = client_url(protocol, ip, port, path)
+    services = []
+    receiver = timeshift = None
+    try:
+        if fec:
+            from fec import FecReceiver
+            if protocol not in ("RTP", "UDP"):
+                raise ValueError(f"FEC protects RTP and UDP streams, not {protocol}")
+            receiver = FecReceiver(protocol, ip, port).start()
+            services.append(receiver)
+            url = receiver.local_url()
+            probe = None        # measure the repaired stream the player will get
+        record = tune_connection(protocol, url, latency, probe=probe)
+        print(f"Client Latency: {describe(record)}")  # For debugging
+        options = vlc_options(record)
+        play_url = url
+        rc_port = None
+        if timeshift_minutes:
+            from metrics import free_local_port
+            from timeshift import TIMESHIFT_PROTOCOLS, Timeshift, timeshift_supported
+            if not timeshift_supported(protocol, path):
+                raise ValueError(f"Timeshift needs a live {'/'.join(TIMESHIFT_PROTOCOLS)} stream or a ladder "
+                                 f"rendition, not {protocol}")
+            timeshift = Timeshift(url, timeshift_minutes).start()
+            services.append(timeshift)
+            play_url = timeshift.local_url()
+            rc_port = free_local_port()
+    except Exception:
+        for service in services:
+            service.stop()
+        raise
+    argv = client_argv(vlc_path, play_url, options, rc_port)
+    print(f"Client Command: {subprocess.list2cmdline(argv)}") # For debugging
+    session = sessions.start("client", protocol, f"{ip}:{port}", argv, services)
+    record["session"] = session.id
+    session.details["latency"] = record
+    session.details["stats_port"] = rc_port
+    session.details["play_options"] = options
+    if receiver:
+        session.details["fec"] = receiver
+    if timeshift:
+        session.details["timeshift"] = timeshift
+    log_connection(record)
+    return session
+
+
+def start_ladder_client(sessions, protocol, renditions, vlc_path, latency=DEFAULT_LATENCY_MODE,
+                        timeshift_minutes=None, fec=False):
+    # renditions: one ladder's SAP entries, highest first (ladder.group_ladders).
+    # The rendition is picked from measured throughput; its probe then sizes the caching.
+    # Ladders are sent without FEC, so a client asking for it is refused.
+    if fec:
+        raise ValueError("bitrate ladders are sent without forward error correction")
+    from ladder import pick_rendition
+
+    rendition, probe, throughput = pick_rendition(protocol, renditions)
+    print(f"Ladder: playing {rendition['rendition']} (measured {throughput:.0f} kb/s)")  # For debugging
+    session = start_client(sessions, protocol, rendition["ip"], rendition["port"], vlc_path, latency,
+                           timeshift_minutes, rendition["path"], probe)
+    session.details["rendition"] = {"name": rendition["rendition"], "kbps": rendition["kbps"],
+                                    "throughput_kbps": round(throughput)}
+    return session
+
+
+def seek_client(session, back):
+    # Reopens a timeshift client's player back seconds behind live (0: live)
+    from timeshift import vlc_rc
+
+    timeshift = session.details["timeshift"]
+    mrl = " ".join([timeshift.local_url(back)] + session.details["play_options"])
+    return vlc_rc(session.details["stats_port"], f"add {mrl}")
+
+
+def _native_dest(protocol, stream_target, port, local_ip, fec_port=None):
+    # -> (dest_ip, port, rtp, interface) for a native sender; with FEC it
+    # feeds the FEC sender's loopback ingest instead
+    if fec_port:
+        return "127.0.0.1", fec_port, False, None
+    rtp = protocol == "RTP"
+    return stream_target.rsplit(":", 1)[0], port, rtp, local_ip if rtp else None
+
+
+def _start_native_sender(sessions, vlc_path, protocol, stream_target, file_path, port, local_ip, transcode="",
+                         services=(), fec_port=None, start_time=None, session_id=None):
+    # .ts files are sent straight from disk; anything else is remuxed to TS
+    # by a headless VLC and piped into the sender. Multicast leaves through
+    # the chosen local interface.
+    from ts_sender import TsSender
+
+    dest_ip, port, rtp, interface = _native_dest(protocol, stream_target, port, local_ip, fec_port)
+    if file_path.lower().endswith(".ts"):
+        sender = TsSender(file_path, dest_ip, port, rtp=rtp, interface=interface).start()
+        return sessions.start("server", protocol, stream_target, services=[sender] + list(services),
+                              session_id=session_id)
+
+    argv = remux_argv(vlc_path, file_path, transcode, start_time)
+    print(f"Remux Command: {subprocess.list2cmdline(argv)}") # For debugging
+    session = sessions.start("server", protocol, stream_target, argv, services, session_id, capture_stdout=True)
+    try:
+        session.services.append(TsSender(session.process.stdout, dest_ip, port, rtp=rtp,
+                                         interface=interface).start())
+    except OSError:
+        sessions.stop(session.id)
+        raise
+    return session
+
+
+def _start_playlist(sessions, vlc_path, protocol, stream_target, files, port, local_ip, native, sout_cmd,
+                    services, profile, fec_port=None, session_id=None):
+    # Every item is remuxed to TS (planned per item, the next one pre-spawned
+    # while the current one plays) into one feed: the native sender reads it,
+    # or the output VLC gets it on stdin, so the port/multicast group never
+    # changes between items.
+    from metrics import free_local_port
+    from playlist import PlaylistFeed
+    from ts_sender import TsSender
+
+    def transcode_for(path):
+        plan = plan_sout(path, "native", profile)
+        print(f"Sout Plan ({os.path.basename(path)}): {plan.describe()}")
+        return plan.transcode
+
+    feed = PlaylistFeed(sessions, files, vlc_path, transcode_for, loop=True)
+    try:
+        if native:
+            dest_ip, dest_port, rtp, interface = _native_dest(protocol, stream_target, port, local_ip, fec_port)
+            sender = TsSender(feed, dest_ip, dest_port, rtp=rtp, interface=interface).start()
+            session = sessions.start("server", protocol, stream_target, services=[sender, feed] + services,
+                                     session_id=session_id)
+        else:
+            stats_port = free_local_port()
+            argv = stdin_server_argv(vlc_path, sout_cmd, stats_port)
+            print(f"Server Command: {subprocess.list2cmdline(argv)}") # For debugging
+            session = sessions.start("server", protocol, stream_target, argv, services, session_id,
+                                     capture_stdin=True)
+            session.details["stats_port"] = stats_port
+            session.services.append(feed.start(session.process.stdin))
+    except Exception:
+        feed.stop()     # its standby remux is already running
+        raise
+    session.details["playlist"] = feed
+    return session
+
+
+def _announce(session, file_path, local_ip, target=None, rendition=None, path=""):
+    # SAP announcement of the running stream; it's a session service, so
+    # stopping the stream also withdraws it. Ladders announce each rendition
+    # (target, rendition: (name, kb/s), path) on its own.
+    from sap import SapAnnouncer
+
+    ip, port = target or session.target.rsplit(":", 1)
+    name = os.path.basename(file_path)
+    fec = session.details.get("fec")
+    try:
+        session.services.append(SapAnnouncer(name, session.protocol, ip, int(port), local_ip, rendition=rendition,
+                                             path=path, fec=(fec.columns, fec.rows) if fec else None).start())
+    except OSError as e:
+        print(f"SAP announcement disabled: {e}")
+    return session
@@ -0,0 +1,269 @@
+"""
+Headless command line for VLC Stream Hub.
+
+Starts server and client sessions from scripts without loading any GUI
+toolkit; the session runs until Ctrl+C, SIGTERM or `streamctl stop`:
+
+  python -m streamctl serve movie.mkv --protocol HTTP --port 8000
+  python -m streamctl serve a.mp4 b.mp4 --protocol RTP --native --pidfile /run/hub.pid
+  python -m streamctl serve movie.mkv --protocol RTP --ladder 720p,480p
+  python -m streamctl serve movie.mkv --protocol UDP --fec 10x10
+  python -m streamctl play --protocol RTP --ip 239.255.1.17 --port 5004 --latency "Low latency"
+  python -m streamctl play --protocol UDP --ip 192.168.1.20 --port 1234 --timeshift 10
+  python -m streamctl play --protocol HTTP --ip 192.168.1.20 --port 8000 --path 480p
+  python -m streamctl play --protocol UDP --ip 192.168.1.20 --port 1234 --fec
+  python -m streamctl stop /run/hub.pid
+  python -m streamctl import-check      # fails if start-up got slower or pulled in a GUI
+                                        # (streamctl.spec runs it: a regression fails the build)
+
+The VLC path comes from vlc_config.json like in the app, or --vlc. A
+server whose VLC crashes or stops sending is restarted near where it was
+(watchdog.py) unless --no-restart is given.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+from client_latency import DEFAULT_LATENCY_MODE, LATENCY_MODES
+from session_manager import SessionManager
+from stream_commands import CLIENT_PROTOCOLS, MULTICAST_IP, SERVER_PROTOCOLS
+from stream_launcher import DEFAULT_VLC_PATH, load_config, start_client, start_server
+from sout_planner import CLIENT_PROFILES, DEFAULT_PROFILE, LADDER_RUNGS
+
+# --- CLI CONFIGURATION ---
+CLI_POLL_SECONDS = 0.5               # how often the foreground loop reaps VLC
+IMPORT_BUDGET_MS = 100               # total import time of this module, ~50 ms today
+GUI_MODULES = ("customtkinter", "tkinter", "_tkinter", "PIL", "numpy")
+
+
+def _vlc_path(args):
+    return args.vlc or load_config().get("vlc_path", DEFAULT_VLC_PATH)
+
+
+def _local_ip(args):
+    if args.ip:
+        return args.ip
+    from net_interfaces import InterfaceCache
+
+    cache = InterfaceCache()
+    try:
+        return cache.default_ip(load_config().get("interface_ip"))
+    finally:
+        cache.close()
+
+
+def _run_until_stopped(sessions, session, pidfile=None, watchdog=None):
+    # Foreground loop: ends when the session's VLC exits (and the watchdog,
+    # if any, isn't restarting it) or we're told to stop
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    if pidfile:
+        with open(pidfile, "w") as f:
+            f.write(str(os.getpid()))
+    code = 0
+    try:
+        while not stop.wait(CLI_POLL_SECONDS):
+            ended = [s for s in sessions.reap() if s.id == session.id]
+            if ended and not (watchdog and watchdog.restarting(session.id)):
+                print(f"{session.role} session ended (exit code {ended[0].exit_code})")
+                code = 1 if ended[0].exit_code else 0
+                break
+    finally:
+        if watchdog:
+            watchdog.stop()
+            watchdog.collector.stop()
+        sessions.shutdown()
+        if pidfile:
+            try:
+                os.remove(pidfile)
+            except OSError:
+                pass
+    return code
+
+
+def cmd_serve(args):
+    if args.native and args.protocol not in ("RTP", "UDP"):
+        sys.exit("--native only applies to RTP and UDP")
+    ladder = [r for r in args.ladder.split(",") if r] if args.ladder else None
+    if ladder and any(r not in LADDER_RUNGS for r in ladder):
+        sys.exit(f"--ladder takes rungs from {', '.join(LADDER_RUNGS)}")
+    fec = None
+    if args.fec:
+        # NumPy is only needed for FEC, so it's imported on demand
+        try:
+            from fec import parse_matrix
+            fec = parse_matrix(args.fec)
+        except ImportError:
+            sys.exit("--fec needs NumPy (pip install numpy)")
+        except ValueError as e:
+            sys.exit(f"--fec: {e}")
+    for path in args.files:
+        if not os.path.exists(path):
+            sys.exit(f"File not found: {path}")
+    vlc_path = _vlc_path(args)
+    if args.protocol != "Direct HTTP" and not os.path.exists(vlc_path):
+        sys.exit(f"VLC not found at {vlc_path} (set vlc_path in vlc_config.json or pass --vlc)")
+
+    pool = None
+    if args.protocol == "RTP":
+        # Each RTP stream gets a group of its own; other hub instances are found by the probe
+        from multicast_pool import MulticastPool
+        try:
+            pool = MulticastPool(args.pool) if args.pool else MulticastPool.from_config(load_config())
+        except ValueError as e:
+            sys.exit(f"Bad multicast pool: {e}")
+
+    sessions = SessionManager()
+    try:
+        session = start_server(sessions, args.files, args.protocol, args.port, _local_ip(args), vlc_path,
+                               args.native, args.profile, announce=not args.no_announce, pool=pool, ladder=ladder,
+                               fec=fec)
+    except (OSError, ValueError) as e:
+        sessions.shutdown()
+        sys.exit(f"Could not start the {args.protocol} server on port {args.port}: {e}")
+    print(f"Streaming via {args.protocol} to {session.target} (session {session.id}, Ctrl+C to stop)")
+    if "fec" in session.details:
+        from fec import fec_ports
+        sender = session.details["fec"]
+        print("  FEC {}x{}: columns on port {}, rows on port {}".format(sender.columns, sender.rows, *fec_ports(args.port)))
+    for rendition, (ip, port, path) in session.details.get("ladder", ()):
+        print(f"  {rendition.describe()}: {ip}:{port}/{path}")
+    watchdog = None
+    if not args.no_restart:
+        # Restarts it, near where it was, if VLC crashes or stops sending
+        from metrics import MetricsCollector
+        from watchdog import Watchdog
+        watchdog = Watchdog(sessions, MetricsCollector(sessions).start()).start()
+        sessions.on_exit = watchdog.on_exit
+        watchdog.watch(session)
+    return _run_until_stopped(sessions, session, args.pidfile, watchdog)
+
+
+def cmd_play(args):
+    vlc_path = _vlc_path(args)
+    sessions = SessionManager()
+    try:
+        session = start_client(sessions, args.protocol, args.ip, args.port, vlc_path, args.latency, args.timeshift,
+                               args.path, fec=args.fec)
+    except ImportError:
+        sessions.shutdown()
+        sys.exit("--fec needs NumPy (pip install numpy)")
+    except (OSError, ValueError) as e:
+        sessions.shutdown()
+        sys.exit(f"Could not start VLC: {e}")
+    print(f"Playing {session.target} (session {session.id}, Ctrl+C to stop)")
+    if "timeshift" in session.details:
+        port = session.details["timeshift"].port
+        print(f"Timeshift: curl -X POST 'http://127.0.0.1:{port}/save?seconds=300' saves the last 5 minutes")
+    return _run_until_stopped(sessions, session, args.pidfile)
+
+
+def cmd_stop(args):
+    try:
+        with open(args.pidfile) as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError) as e:
+        sys.exit(f"No running session recorded in {args.pidfile}: {e}")
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError as e:
+        sys.exit(f"Could not stop process {pid}: {e}")
+    print(f"Stopping process {pid}")
+    return 0
+
+
+def import_check():
+    # Imports this module in a fresh interpreter with -X importtime:
+    # -> (total milliseconds, GUI modules that got imported).
+    # Raises RuntimeError if the import fails outright.
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import streamctl"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    total_us = 0
+    gui = []
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        fields = line.split("|")
+        if not line.startswith("import time:") or len(fields) != 3 or not fields[0].split()[-1].isdigit():
+            continue
+        total_us += int(fields[0].split()[-1])
+        name = fields[2].strip()
+        if name.split(".")[0] in GUI_MODULES:
+            gui.append(name)
+    return total_us / 1000, gui
+
+
+def cmd_import_check(args):
+    try:
+        total_ms, gui = import_check()
+    except RuntimeError as e:
+        print(f"FAIL: import streamctl: {e}")
+        return 1
+    print(f"import streamctl: {total_ms:.1f} ms (budget {args.budget_ms} ms)")
+    failed = False
+    if gui:
+        print(f"FAIL: GUI modules imported: {', '.join(sorted(set(gui)))}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("FAIL: over the import-time budget")
+        failed = True
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="streamctl", description="VLC Stream Hub without the GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="stream a file (several files: a looping playlist)")
+    serve.add_argument("files", nargs="+")
+    serve.add_argument("--protocol", choices=SERVER_PROTOCOLS, default="HTTP")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--ip", help="local IPv4 address to announce/send from (default: best guess)")
+    serve.add_argument("--native", action="store_true", help="paced native sender for RTP/UDP")
+    serve.add_argument("--profile", choices=list(CLIENT_PROFILES), default=DEFAULT_PROFILE)
+    serve.add_argument("--no-announce", action="store_true", help="don't announce the stream over SAP")
+    serve.add_argument("--ladder", metavar="RUNGS",
+                       help=f"also send these renditions from the same VLC, comma separated ({', '.join(LADDER_RUNGS)})")
+    serve.add_argument("--fec", nargs="?", const="10x10", metavar="LxD",
+                       help="send SMPTE 2022-1 row/column FEC with an RTP/UDP stream (default matrix: 10x10)")
+    serve.add_argument("--no-restart", action="store_true",
+                       help="end when VLC crashes or stalls instead of restarting it where it was")
+    serve.add_argument("--pool", help="multicast range RTP groups are allocated from (default: vlc_config.json)")
+    serve.add_argument("--vlc", help="VLC executable (default: vlc_config.json)")
+    serve.add_argument("--pidfile", help="write our pid here, for `streamctl stop`")
+    serve.set_defaults(func=cmd_serve)
+
+    play = commands.add_parser("play", help="open a stream in VLC")
+    play.add_argument("--protocol", choices=CLIENT_PROTOCOLS, default="HTTP")
+    play.add_argument("--ip", default=MULTICAST_IP, help="server address, or the RTP stream's group")
+    play.add_argument("--port", type=int, default=8000)
+    play.add_argument("--path", default="", help="HTTP path, e.g. a ladder rendition's name")
+    play.add_argument("--latency", choices=list(LATENCY_MODES), default=DEFAULT_LATENCY_MODE,
+                      help="probe the stream and size VLC's caching to it, or keep VLC's defaults")
+    play.add_argument("--timeshift", type=float, metavar="MINUTES",
+                      help="play through a ring buffer of this many minutes (pause, rewind, save)")
+    play.add_argument("--fec", action="store_true", help="repair an RTP/UDP stream from the FEC the server sends")
+    play.add_argument("--vlc", help="VLC executable (default: vlc_config.json)")
+    play.add_argument("--pidfile", help="write our pid here, for `streamctl stop`")
+    play.set_defaults(func=cmd_play)
+
+    stop = commands.add_parser("stop", help="stop a session started with --pidfile")
+    stop.add_argument("pidfile")
+    stop.set_defaults(func=cmd_stop)
+
+    check = commands.add_parser("import-check", help="fail if start-up imports regress")
+    check.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    check.set_defaults(func=cmd_import_check)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+# -*- mode: python ; coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+
+# The headless build is the start-up gate: it stops here if importing
+# streamctl got slower than its budget or pulled in a GUI toolkit
+if subprocess.run([sys.executable, os.path.join(SPECPATH, 'streamctl.py'), 'import-check']).returncode:
+    raise SystemExit('streamctl import-check failed, not building streamctl')
+
+
+a = Analysis(
+    ['streamctl.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    # Headless: no GUI toolkit at all (NumPy stays: `play` probes the stream with the analyzer)
+    excludes=['customtkinter', 'tkinter', '_tkinter', 'PIL', 'media_library', 'unittest', 'doctest', 'pydoc', 'pdb', 'lib2to3', 'tkinter.test', 'setuptools',
+              'pip', 'distutils', 'matplotlib', 'scipy', 'pandas', 'IPython'],
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    a.binaries,
+    a.datas,
+    [],
+    name='streamctl',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=True,
+    upx_exclude=[],
+    runtime_tmpdir=None,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
@@ -1,16 +1,31 @@
 import customtkinter as ctk
-import socket
-import subprocess
 import os
-from tkinter import filedialog, messagebox
+import tkinter as tk
+from tkinter import messagebox
 import json
-from PIL import Image
+
+from session_manager import SessionManager
+from net_interfaces import InterfaceCache
+from sap import SapDirectory
+from ts_sender import TsSender
+from stream_commands import CLIENT_PROTOCOLS, LADDER_PROTOCOLS, SERVER_PROTOCOLS, client_url
+from stream_launcher import (DEFAULT_VLC_PATH, VLC_PATH_CONFIG_FILE, load_config, seek_client, start_client,
+                             start_ladder_client, start_server)
+from sout_planner import CLIENT_PROFILES, DEFAULT_LADDER, DEFAULT_PROFILE, LADDER_RUNGS
+from ladder import group_ladders
+from metrics import METRICS_HOST, METRICS_PORT, MetricsCollector, MetricsServer
+from multicast_pool import MULTICAST_POOL, MulticastPool
+from client_latency import DEFAULT_LATENCY_MODE, LATENCY_MODES
+from timeshift import TIMESHIFT_MINUTES, TIMESHIFT_PROTOCOLS, timeshift_supported
+from watchdog import Watchdog
 
 # --- CONFIGURATION ---
-VLC_PATH_CONFIG_FILE = "vlc_config.json"
-DEFAULT_VLC_PATH = r"C:\Program Files\VideoLAN\VLC\vlc.exe"
-# Standard Multicast Address for RTP
-MULTICAST_IP = "239.255.1.1" 
+# How often the UI checks on its child VLC processes
+SESSION_POLL_MS = 500
+# How often it checks for finished background launches while one is pending
+LAUNCH_POLL_MS = 50
+DISCOVERY_EMPTY_TEXT = "🔎 Listening for streams on the network..."
+TIMESHIFT_REWIND_SECONDS = 30
 
 class LANStreamerApp(ctk.CTk):
     def __init__(self):
@@ -43,15 +58,38 @@ class LANStreamerApp(ctk.CTk):
         }
         
         self.title("VLC Stream Hub - Compact")
-        self.geometry("600x620") 
-        self.minsize(580, 620) 
+        self.geometry("600x710") 
+        self.minsize(580, 710) 
         self.configure(fg_color=self.custom_colors["bg_main"])
         
-        # NOTE: Using a single self.process variable as per the user's latest code. 
-        # This will need to be managed carefully in stop_vlc/on_close.
-        self.process = None 
+        # All VLC children live in the session manager; the UI just remembers
+        # which session each tab is currently showing.
+        self.sessions = SessionManager()
+        self.server_session_id = None
+        self.client_session_id = None
+        self._launch_poll_scheduled = False
         
         self.vlc_path = self._load_vlc_path()
+        # Interfaces are listed once from the OS and re-read only on change
+        self.interfaces = InterfaceCache()
+        self.preferred_ip = self._load_config().get("interface_ip")
+        # Streams announced on the LAN (SAP), listed in the client tab
+        self.sap_directory = None
+        self.discovered_streams = []
+        self.selected_ladder = None     # the picked discovered stream, if it's a bitrate ladder
+        self._directory_version = -1
+        self.library = None
+        self.library_window = None
+        # Per-session telemetry, scraped from a local Prometheus-style endpoint
+        self.metrics = MetricsCollector(self.sessions).start()
+        self.metrics_server = self._start_metrics_server()
+        self._server_stalled = False
+        # Restarts server sessions whose VLC crashes or stops sending, near where they were
+        self.watchdog = Watchdog(self.sessions, self.metrics).start()
+        self.sessions.on_exit = self.watchdog.on_exit
+        self._server_watch_state = None
+        # RTP streams each get their own multicast group from this pool
+        self.multicast_pool = self._load_multicast_pool()
         
         # Configure grid weights to ensure the tabview expands and pushes the footer down
         self.grid_rowconfigure(1, weight=1)
@@ -107,35 +145,86 @@ class LANStreamerApp(ctk.CTk):
         )
         self.status_label.pack(side="left")
         
+        self._start_directory()
         self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after(SESSION_POLL_MS, self._poll_sessions)
+
+    def _start_metrics_server(self):
+        config = self._load_config()
+        host = config.get("metrics_host", METRICS_HOST)
+        port = config.get("metrics_port", METRICS_PORT)
+        try:
+            server = MetricsServer(self.metrics, port, host).start()
+        except OSError as e:
+            print(f"Metrics endpoint disabled: {e}")  # For debugging
+            return None
+        print(f"Metrics: http://{host}:{port}/metrics")  # For debugging
+        return server
+
+    def _load_multicast_pool(self):
+        try:
+            return MulticastPool.from_config(self._load_config())
+        except ValueError as e:
+            print(f"Bad multicast_pool in {VLC_PATH_CONFIG_FILE}, using {MULTICAST_POOL}: {e}")  # For debugging
+            return MulticastPool()
 
     def _on_tab_change(self):
         pass
 
+    def _load_config(self):
+        return load_config()
+
+    def _save_config(self, config):
+        with open(VLC_PATH_CONFIG_FILE, 'w') as f:
+            json.dump(config, f, indent=2)
+
     def _load_vlc_path(self):
-        if os.path.exists(VLC_PATH_CONFIG_FILE):
-            try:
-                with open(VLC_PATH_CONFIG_FILE, 'r') as f:
-                    config = json.load(f)
-                    return config.get("vlc_path", DEFAULT_VLC_PATH)
-            except json.JSONDecodeError:
-                return DEFAULT_VLC_PATH
-        return DEFAULT_VLC_PATH
+        return self._load_config().get("vlc_path", DEFAULT_VLC_PATH)
 
     def _save_vlc_path(self, path):
         # NOTE: This function is now unused in the UI but remains functional
-        with open(VLC_PATH_CONFIG_FILE, 'w') as f:
-            json.dump({"vlc_path": path}, f)
+        config = self._load_config()
+        config["vlc_path"] = path
+        self._save_config(config)
             
     def get_local_ip(self):
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-            return ip
-        except Exception:
-            return "127.0.0.1"
+        # From the cached interface list; the user's pick wins while it exists
+        return self.interfaces.default_ip(self.preferred_ip)
+
+    def _choose_profile(self, profile):
+        config = self._load_config()
+        config["client_profile"] = profile
+        self._save_config(config)
+
+    def _ladder_rungs(self):
+        # vlc_config.json "ladder": rung names, e.g. ["1080p", "720p", "480p"]
+        rungs = self._load_config().get("ladder", list(DEFAULT_LADDER))
+        return [r for r in rungs if r in LADDER_RUNGS] or list(DEFAULT_LADDER)
+
+    def _choose_latency(self, mode):
+        config = self._load_config()
+        config["client_latency"] = mode
+        self._save_config(config)
+
+    def _interface_choices(self):
+        # "🌐 192.168.1.20 (eth0)" entries for the IP picker, loopback last
+        ifaces = sorted(self.interfaces.interfaces, key=lambda i: i.loopback)
+        return [f"🌐 {i.ip} ({i.name})" if i.name else f"🌐 {i.ip}" for i in ifaces]
+
+    def _choose_interface(self, choice):
+        self.preferred_ip = choice.split()[1]
+        self.local_ip = self.preferred_ip
+        config = self._load_config()
+        config["interface_ip"] = self.preferred_ip
+        self._save_config(config)
+        self._start_directory()
+
+    def _refresh_interfaces(self):
+        # Called when the OS reports an address change
+        self.local_ip = self.get_local_ip()
+        choices = self._interface_choices()
+        self.menu_server_ip.configure(values=choices)
+        self.menu_server_ip.set(next((c for c in choices if c.split()[1] == self.local_ip), f"🌐 {self.local_ip}"))
 
     # ================= SERVER UI & LOGIC =================
     def setup_server_ui(self):
@@ -159,15 +248,22 @@ class LANStreamerApp(ctk.CTk):
                                         corner_radius=12)
         ip_display_frame.grid(row=1, column=0, columnspan=2, pady=(0, 10))
 
+        # Multi-homed hosts get to pick the NIC the stream is announced on
         self.local_ip = self.get_local_ip()
-        self.lbl_server_ip = ctk.CTkLabel(ip_display_frame, 
-            text=f"🌐 {self.local_ip}", 
+        self.menu_server_ip = ctk.CTkOptionMenu(ip_display_frame, 
+            values=self._interface_choices(),
+            command=self._choose_interface,
             font=("Segoe UI", 18, "bold"),
+            dropdown_font=("Segoe UI", 14),
+            fg_color=self.custom_colors["ip_bg_start"],
+            button_color=self.custom_colors["ip_bg_start"],
+            button_hover_color=self.custom_colors["ip_bg_end"],
             text_color=self.custom_colors["ip_text"],
-            padx=15, 
-            pady=8
+            corner_radius=12,
+            height=40
         )
-        self.lbl_server_ip.pack()
+        self.menu_server_ip.pack(padx=8, pady=4)
+        self._refresh_interfaces()
 
         # Server Mode Stream Status Indicator 
         self.lbl_stream_status = ctk.CTkLabel(
@@ -197,7 +293,21 @@ class LANStreamerApp(ctk.CTk):
             compound="left",
             image=None 
         )
-        self.btn_browse.grid(row=4, column=0, columnspan=2, pady=(0, 5), sticky="ew")
+        self.btn_browse.grid(row=4, column=0, pady=(0, 5), sticky="ew", padx=(0, 10))
+
+        self.btn_library = ctk.CTkButton(server_content_frame, 
+            text="📚 Media Library", 
+            command=self.open_library,
+            fg_color="#F5F5F5", 
+            hover_color="#DBEAFE", 
+            text_color=self.custom_colors["text_dark"],
+            border_width=2,
+            border_color=self.custom_colors["input_border"], 
+            corner_radius=12,
+            height=40,
+            font=("Segoe UI", 14, "bold")
+        )
+        self.btn_library.grid(row=4, column=1, pady=(0, 5), sticky="ew", padx=(10, 0))
         
         self.lbl_file_path = ctk.CTkLabel(server_content_frame, 
             text="No source loaded", 
@@ -207,6 +317,8 @@ class LANStreamerApp(ctk.CTk):
         )
         self.lbl_file_path.grid(row=5, column=0, columnspan=2, pady=(0, 15), sticky="w")
         self.selected_file = None
+        self.selected_info = None
+        self.selected_files = []        # more than one: a gapless, looping playlist
 
         # --- Protocol and Port (Parallel Layout) ---
         
@@ -220,7 +332,7 @@ class LANStreamerApp(ctk.CTk):
         
         # Protocol Combobox (Row 7, Column 0)
         self.combo_proto = ctk.CTkComboBox(server_content_frame, 
-            values=["HTTP", "RTP", "UDP"], # RTSP REMOVED HERE
+            values=SERVER_PROTOCOLS, # RTSP REMOVED HERE
             corner_radius=12, 
             height=40,
             fg_color=self.custom_colors["input_bg"],
@@ -250,8 +362,56 @@ class LANStreamerApp(ctk.CTk):
         self.entry_port.grid(row=7, column=1, pady=(0, 25), sticky="ew", padx=(10, 0)) 
         
         # --- End Parallel Layout ---
+
+        # Viewer profile (Row 8): decides what the sout planner has to transcode
+        lbl_profile = ctk.CTkLabel(server_content_frame, text="Viewers", font=("Segoe UI", 12), text_color=self.custom_colors["text_medium"], anchor="w")
+        lbl_profile.grid(row=8, column=0, sticky="w", pady=(0, 10), padx=(0, 10))
+        self.menu_profile = ctk.CTkOptionMenu(server_content_frame, 
+            values=list(CLIENT_PROFILES),
+            command=self._choose_profile,
+            fg_color=self.custom_colors["input_bg"],
+            button_color=self.custom_colors["input_border"],
+            button_hover_color=self.custom_colors["input_border"],
+            text_color=self.custom_colors["text_dark"],
+            font=("Segoe UI", 13),
+            corner_radius=12,
+            height=32
+        )
+        profile = self._load_config().get("client_profile", DEFAULT_PROFILE)
+        self.menu_profile.set(profile if profile in CLIENT_PROFILES else DEFAULT_PROFILE)
+        self.menu_profile.grid(row=8, column=1, pady=(0, 10), sticky="ew", padx=(10, 0))
+
+        # Native sender option (Row 9): RTP/UDP sent from Python, paced by PCR, no VLC display
+        self.native_sender_var = ctk.BooleanVar(value=False)
+        self.chk_native_sender = ctk.CTkCheckBox(server_content_frame,
+            text="Paced native sender for RTP/UDP (no local display)",
+            variable=self.native_sender_var,
+            font=("Segoe UI", 12),
+            text_color=self.custom_colors["text_medium"]
+        )
+        self.chk_native_sender.grid(row=9, column=0, columnspan=2, pady=(0, 5), sticky="w")
+
+        # Bitrate ladder option (Row 10): the source plus smaller renditions from one VLC
+        self.ladder_var = ctk.BooleanVar(value=False)
+        self.chk_ladder = ctk.CTkCheckBox(server_content_frame,
+            text=f"Multi-bitrate ladder for HTTP/RTP/UDP (source + {', '.join(self._ladder_rungs())})",
+            variable=self.ladder_var,
+            font=("Segoe UI", 12),
+            text_color=self.custom_colors["text_medium"]
+        )
+        self.chk_ladder.grid(row=10, column=0, columnspan=2, pady=(0, 5), sticky="w")
+
+        # FEC option (Row 11): row/column parity on port+2/port+4 so clients can repair losses
+        self.fec_var = ctk.BooleanVar(value=False)
+        self.chk_fec = ctk.CTkCheckBox(server_content_frame,
+            text="Forward error correction for RTP/UDP (SMPTE 2022-1 row/column parity)",
+            variable=self.fec_var,
+            font=("Segoe UI", 12),
+            text_color=self.custom_colors["text_medium"]
+        )
+        self.chk_fec.grid(row=11, column=0, columnspan=2, pady=(0, 15), sticky="w")
         
-        # Start/Stop Buttons (Rows 8 and 9, use columnspan=2)
+        # Start/Stop Buttons (Rows 12 and 13, use columnspan=2)
         self.btn_start_server = ctk.CTkButton(server_content_frame, 
             text="▶️ START STREAM", 
             command=self.start_stream,
@@ -262,7 +422,7 @@ class LANStreamerApp(ctk.CTk):
             font=("Segoe UI", 16, "bold"),
             text_color="#FFFFFF"
         )
-        self.btn_start_server.grid(row=8, column=0, columnspan=2, pady=(0, 10), sticky="ew")
+        self.btn_start_server.grid(row=12, column=0, columnspan=2, pady=(0, 10), sticky="ew")
         
         self.btn_stop_server = ctk.CTkButton(server_content_frame, 
             text="⏹️ STOP STREAM", 
@@ -270,77 +430,331 @@ class LANStreamerApp(ctk.CTk):
             hover_color=self.custom_colors["hover_stop"],
             corner_radius=15, 
             state="disabled", 
-            command=self.stop_vlc,
+            command=self.stop_server,
             height=50,
             font=("Segoe UI", 16, "bold"),
             text_color="#FFFFFF"
         )
-        self.btn_stop_server.grid(row=9, column=0, columnspan=2, pady=(0, 10), sticky="ew")
+        self.btn_stop_server.grid(row=13, column=0, columnspan=2, pady=(0, 10), sticky="ew")
 
 
     def browse_file(self):
-        filename = filedialog.askopenfilename(filetypes=[("Video Files", "*.mp4 *.mkv *.avi *.mp3")])
-        if filename:
-            self.selected_file = filename
-            self.lbl_file_path.configure(text=f"File: {os.path.basename(filename)}", text_color=self.custom_colors["blue_primary"])
+        # Picking several files queues them up as a playlist
+        from tkinter import filedialog
+        filenames = filedialog.askopenfilenames(filetypes=[("Video Files", "*.mp4 *.mkv *.avi *.mp3 *.ts")])
+        if len(filenames) > 1:
+            self._select_playlist(list(filenames))
+        elif filenames:
+            self._select_source(filenames[0])
+
+    def _select_source(self, filename, info=None):
+        # info: the library's probe row, reused by the sout planner
+        self.selected_file = filename
+        self.selected_info = info
+        self.selected_files = []
+        self._show_selection()
+
+    def _select_playlist(self, filenames):
+        self.selected_file = filenames[0]
+        self.selected_info = None
+        self.selected_files = filenames
+        self._show_selection()
+
+    def _show_selection(self, now_playing=None):
+        if self.selected_files:
+            names = ", ".join(os.path.basename(f) for f in self.selected_files[:3])
+            more = ", ..." if len(self.selected_files) > 3 else ""
+            text = f"Playlist ({len(self.selected_files)} files, looping): {names}{more}"
+            if now_playing:
+                text = f"Now playing {now_playing}"
+        elif self.selected_info and not self.selected_info.get("error"):
+            from media_library import describe
+            text = f"File: {describe(self.selected_info)}"
+        else:
+            text = f"File: {os.path.basename(self.selected_file)}"
+        self.lbl_file_path.configure(text=text, text_color=self.custom_colors["blue_primary"])
+
+    # ================= MEDIA LIBRARY =================
+    def _get_library(self):
+        if self.library is None:
+            # SQLite and the scanner only load once the library is opened
+            from media_library import LIBRARY_DB_FILE, MediaLibrary
+            self.library = MediaLibrary(LIBRARY_DB_FILE, self._load_config().get("library_roots", []))
+        return self.library
+
+    def open_library(self):
+        if self.library_window is not None and self.library_window.winfo_exists():
+            self.library_window.focus()
+            return
+        library = self._get_library()
+
+        win = ctk.CTkToplevel(self)
+        win.title("Media Library")
+        win.geometry("640x480")
+        win.configure(fg_color=self.custom_colors["bg_main"])
+        win.grid_columnconfigure(0, weight=1)
+        win.grid_rowconfigure(1, weight=1)
+        self.library_window = win
+
+        top = ctk.CTkFrame(win, fg_color="transparent")
+        top.grid(row=0, column=0, sticky="ew", padx=15, pady=(15, 5))
+        top.grid_columnconfigure(0, weight=1)
+        self.entry_library_search = ctk.CTkEntry(top, placeholder_text="Search file names...", corner_radius=12, height=36,
+            fg_color=self.custom_colors["input_bg"], border_width=1, border_color=self.custom_colors["input_border"],
+            font=("Segoe UI", 13), text_color=self.custom_colors["text_dark"])
+        self.entry_library_search.grid(row=0, column=0, sticky="ew", padx=(0, 10))
+        self.entry_library_search.bind("<KeyRelease>", lambda e: self._refresh_library_results())
+        ctk.CTkButton(top, text="Add Folder", width=100, height=36, corner_radius=12,
+            fg_color=self.custom_colors["blue_primary"], command=self._add_library_root).grid(row=0, column=1, padx=(0, 10))
+        ctk.CTkButton(top, text="Rescan", width=80, height=36, corner_radius=12,
+            fg_color=self.custom_colors["blue_primary"], command=self._rescan_library).grid(row=0, column=2)
+
+        # A plain Tk listbox: it stays fast with a few hundred rows, CTk widgets don't
+        list_frame = ctk.CTkFrame(win, fg_color=self.custom_colors["fg_card"], corner_radius=12)
+        list_frame.grid(row=1, column=0, sticky="nsew", padx=15, pady=5)
+        list_frame.grid_columnconfigure(0, weight=1)
+        list_frame.grid_rowconfigure(0, weight=1)
+        # Several rows (shift/ctrl-click) make a playlist
+        self.list_library = tk.Listbox(list_frame, activestyle="none", borderwidth=0, highlightthickness=0, selectmode="extended",
+            font=("Segoe UI", 10), selectbackground=self.custom_colors["ip_bg_end"], selectforeground=self.custom_colors["ip_text"])
+        self.list_library.grid(row=0, column=0, sticky="nsew", padx=(8, 0), pady=8)
+        scrollbar = ctk.CTkScrollbar(list_frame, command=self.list_library.yview)
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        self.list_library.configure(yscrollcommand=scrollbar.set)
+        self.list_library.bind("<Double-Button-1>", lambda e: self._use_library_selection())
+
+        bottom = ctk.CTkFrame(win, fg_color="transparent")
+        bottom.grid(row=2, column=0, sticky="ew", padx=15, pady=(5, 15))
+        bottom.grid_columnconfigure(0, weight=1)
+        self.lbl_library_status = ctk.CTkLabel(bottom, text="", font=("Segoe UI", 11), text_color=self.custom_colors["text_medium"], anchor="w")
+        self.lbl_library_status.grid(row=0, column=0, sticky="ew")
+        ctk.CTkButton(bottom, text="Use Selected", width=120, height=36, corner_radius=12,
+            fg_color=self.custom_colors["start_stream_fg"], hover_color=self.custom_colors["hover_start"],
+            command=self._use_library_selection).grid(row=0, column=1)
+
+        self.library_results = []
+        self._refresh_library_results()
+        if library.roots:
+            # Only changed files get probed, so opening the window can always rescan
+            library.start_scan()
+        self._poll_library()
+
+    def _add_library_root(self):
+        from tkinter import filedialog
+        folder = filedialog.askdirectory(parent=self.library_window)
+        if not folder:
+            return
+        config = self._load_config()
+        roots = config.setdefault("library_roots", [])
+        if folder not in roots:
+            roots.append(folder)
+            self._save_config(config)
+        library = self._get_library()
+        if os.path.abspath(folder) not in library.roots:
+            library.roots.append(os.path.abspath(folder))
+        self._rescan_library()
+
+    def _rescan_library(self):
+        library = self._get_library()
+        library.start_scan()
+        self._poll_library()
+
+    def _refresh_library_results(self):
+        if self.library_window is None or not self.library_window.winfo_exists():
+            return
+        from media_library import describe
+        self.library_results = self.library.search(self.entry_library_search.get())
+        self.list_library.delete(0, "end")
+        for row in self.library_results:
+            self.list_library.insert("end", describe(row))
+        self._update_library_status()
+
+    def _update_library_status(self):
+        library = self.library
+        if not library.roots:
+            text = "No library folders yet. Use Add Folder to index a share."
+        elif library.scanning and library.progress:
+            p = library.progress
+            text = f"Scanning... {p['files']} files seen, {p['probed']} probed"
+        else:
+            text = f"{library.count()} files indexed"
+            if library.last_scan:
+                last = library.last_scan
+                text += f" · last scan {last['seconds']}s, {last['probed']} probed, {last['removed']} removed"
+                if last["offline_roots"]:
+                    text += f", {last['offline_roots']} folder(s) offline"
+        self.lbl_library_status.configure(text=text)
+
+    def _poll_library(self):
+        if self.library_window is None or not self.library_window.winfo_exists():
+            return
+        if self.library.scanning:
+            self._update_library_status()
+            self.after(SESSION_POLL_MS, self._poll_library)
+        else:
+            self._refresh_library_results()
+
+    def _use_library_selection(self):
+        selection = self.list_library.curselection()
+        if not selection:
+            return
+        if len(selection) > 1:
+            self._select_playlist([self.library_results[i]["path"] for i in selection])
+        else:
+            row = self.library_results[selection[0]]
+            self._select_source(row["path"], row)
+        self.library_window.destroy()
 
     def start_stream(self):
         if not self.selected_file:
             messagebox.showerror("Error", "Please select a video file first.")
             return
 
-        # Check for VLC path existence
-        if not os.path.exists(self.vlc_path):
-            messagebox.showerror("Error", "VLC executable not found. Please ensure the path is set correctly in vlc_config.json, or install VLC at the default path.")
-            return
+        files = list(self.selected_files) or [self.selected_file]
+        for path in files:
+            if not os.path.exists(path):
+                messagebox.showerror("Error", f"File not found or path is invalid: {path}")
+                return
 
-        windows_file_path = os.path.normpath(self.selected_file)
         port = self.entry_port.get()
         protocol = self.combo_proto.get()
+        if not port.isdigit() or not 0 < int(port) < 65536:
+            messagebox.showerror("Error", f"Invalid port: {port}")
+            return
         local_ip = self.get_local_ip()
+
+        if len(files) > 1 and protocol == "Direct HTTP":
+            messagebox.showerror("Error", "Direct HTTP serves a single file. Pick one file, or another protocol for a playlist.")
+            return
+
+        # Check for VLC path existence (Direct HTTP serves the file without VLC)
+        if protocol != "Direct HTTP" and not os.path.exists(self.vlc_path):
+            messagebox.showerror("Error", "VLC executable not found. Please ensure the path is set correctly in vlc_config.json, or install VLC at the default path.")
+            return
         
-        # --- Server Mode VLC Output (sout) Configuration ---
-        if protocol == "HTTP":
-            # HTTP uses standard IP or 0.0.0.0 (default) to serve the stream
-            sout_cmd = f'#transcode{{scodec=none}}:duplicate{{dst=http{{mux=mkv,dst=:{port}/}},dst=display}}'
-            stream_target = f"{local_ip}:{port}"
-            
-        # RTSP case removed
-             
-        elif protocol == "RTP":
-             # RTP streams sent to the Multicast IP (239.255.1.1)
-             sout_cmd = f'#transcode{{scodec=none}}:duplicate{{dst=rtp{{dst={MULTICAST_IP},port={port},mux=ts}},dst=display}}'
-             stream_target = f"{MULTICAST_IP}:{port}"
-             
-        elif protocol == "UDP":
-             # UDP streams sent to the Local Unicast IP
-             sout_cmd = f'#transcode{{scodec=none}}:duplicate{{dst=udp{{dst={local_ip},port={port},mux=ts}},dst=display}}'
-             stream_target = f"{local_ip}:{port}"
-             
-        else:
+        if protocol not in SERVER_PROTOCOLS:
             messagebox.showerror("Error", f"Unknown protocol selected: {protocol}")
             return
-        # ---------------------------------------------------
 
-        if not os.path.exists(self.selected_file):
-            messagebox.showerror("Error", f"File not found or path is invalid: {self.selected_file}")
+        native = protocol in ("RTP", "UDP") and self.native_sender_var.get()
+        ladder = self._ladder_rungs() if self.ladder_var.get() else None
+        if ladder and (protocol not in LADDER_PROTOCOLS or native or len(files) > 1):
+            messagebox.showerror("Error", f"A bitrate ladder streams one file through VLC over {', '.join(LADDER_PROTOCOLS)}.")
             return
+        fec = None
+        if self.fec_var.get():
+            try:
+                # NumPy is only needed here, so it's imported on demand
+                from fec import FEC_MATRIX, parse_matrix
+                # vlc_config.json "fec": the matrix as "LxD", e.g. "10x10"
+                matrix = self._load_config().get("fec")
+                fec = parse_matrix(matrix) if matrix else FEC_MATRIX
+            except ImportError:
+                messagebox.showerror("Error", "Forward error correction needs NumPy (pip install numpy).")
+                return
+            except ValueError as e:
+                messagebox.showerror("Error", f"Check \"fec\" in {VLC_PATH_CONFIG_FILE}: {e}")
+                return
+            if protocol not in ("RTP", "UDP") or ladder:
+                messagebox.showerror("Error", "Forward error correction protects a single RTP or UDP stream.")
+                return
+        vlc_path = self.vlc_path
+        profile = self.menu_profile.get()
+        info = self.selected_info
+        # Groups other servers announce are skipped without probing them
+        in_use = [(s["ip"], s["port"]) for s in self.sap_directory.streams()] if self.sap_directory else []
 
-        cmd_string = f'"{self.vlc_path}" "{windows_file_path}" :sout={sout_cmd} :no-sout-all :sout-keep'
-        print(f"Server Command: {cmd_string}") # For debugging
+        def build():
+            # Runs on a launcher thread (binding ports, probing multicast
+            # groups and spawning VLC can be slow): no Tk calls in there
+            return start_server(self.sessions, files, protocol, port, local_ip, vlc_path, native, profile, info,
+                                pool=self.multicast_pool, in_use=in_use, ladder=ladder, fec=fec)
 
-        try:
-            self.process = subprocess.Popen(cmd_string, shell=True)
-            
-            self.lbl_stream_status.configure(text=f"STATUS: STREAMING via {protocol} to {stream_target}", text_color=self.custom_colors["start_stream_fg"])
+        self.lbl_stream_status.configure(text=f"STATUS: STARTING {protocol}...", text_color=self.custom_colors["text_medium"])
+        self.btn_start_server.configure(state="disabled")
+        self.sessions.launch(build, lambda session, error: self._on_server_started(session, error, protocol, port))
+        self._poll_launches()
 
-            self.status_dot.configure(text_color=self.custom_colors["start_stream_fg"])
-            self.status_label.configure(text=f"STATUS: Streaming via {protocol} to {stream_target}", text_color=self.custom_colors["text_dark"])
-            self.btn_start_server.configure(state="disabled")
-            self.btn_stop_server.configure(state="normal")
+    def _on_server_started(self, session, error, protocol, port):
+        # Back on the Tk thread, via sessions.dispatch()
+        if error is not None:
+            self._reset_server_ui()
+            if isinstance(error, FileNotFoundError):
+                messagebox.showerror("Error", "VLC not found! Check the path in the settings.")
+            else:
+                messagebox.showerror("Error", f"Could not start the {protocol} server on port {port}: {error}")
+            return
 
-        except FileNotFoundError:
-            messagebox.showerror("Error", "VLC not found! Check the path in the settings.")
+        self.server_session_id = session.id
+        self._server_stalled = False
+        self._server_watch_state = 0
+        self.watchdog.watch(session)
+        self._show_server_status(session)
+        self.btn_start_server.configure(state="disabled")
+        self.btn_stop_server.configure(state="normal")
+        self._refresh_status_bar()
+
+    def _show_server_status(self, session, stalled=False):
+        native = " (native)" if any(isinstance(s, TsSender) for s in session.services) else ""
+        if "fec" in session.details:
+            native += f" + FEC {session.details['fec'].columns}x{session.details['fec'].rows}"
+        plan = session.details.get("plan")
+        cost = f" [{plan.kind}, ~{plan.cost:.2f} cores]" if plan else ""
+        if "playlist" in session.details:
+            cost = f" [playlist of {len(session.details['playlist'].items)}]"
+        if "ladder" in session.details:
+            cost = " [ladder: " + ", ".join(_rendition_label(r, session.details["ladder_cpu"])
+                                            for r, _ in session.details["ladder"]) + "]"
+        restarts = session.details.get("restarts")
+        if restarts:
+            downtime = restarts[-1]["downtime_seconds"]
+            cost += f" [restarted {len(restarts)}x" + (f", last down {downtime:.1f} s]" if downtime is not None else "]")
+        if stalled:
+            self.lbl_stream_status.configure(text=f"⚠️ OUTPUT STALLED: {session.protocol}{native} to {session.target}", text_color=self.custom_colors["red_error"])
+        else:
+            self.lbl_stream_status.configure(text=f"STATUS: STREAMING via {session.protocol}{native} to {session.target}{cost}", text_color=self.custom_colors["start_stream_fg"])
+
+    def _refresh_stall_warning(self):
+        # The metrics thread flags a stream whose output bitrate stalls
+        session = self.sessions.get(self.server_session_id) if self.server_session_id else None
+        if not session or not session.alive:
+            return
+        stalled = self.metrics.stalled(session.id)
+        if stalled != self._server_stalled:
+            self._server_stalled = stalled
+            self._show_server_status(session, stalled)
+
+    def _refresh_restart(self):
+        # The watchdog brings a failed server back under the same session id
+        if not self.server_session_id:
+            return
+        session = self.sessions.get(self.server_session_id)
+        restarting = self.watchdog.restarting(self.server_session_id)
+        restarts = session.details.get("restarts", []) if session else []
+        state = restarting or (len(restarts), restarts[-1]["downtime_seconds"] if restarts else None)
+        if state == self._server_watch_state:
+            return
+        self._server_watch_state = state
+        if restarting:
+            cause, attempt = restarting
+            self.lbl_stream_status.configure(text=f"⟳ RESTARTING {session.protocol} to {session.target}: {cause} (attempt {attempt})", text_color=self.custom_colors["red_error"])
+        elif session and session.alive:
+            self._server_stalled = False
+            self._show_server_status(session)
+        self._refresh_status_bar()
+
+    def _poll_launches(self):
+        # Fast poll only while a launch is in flight; callbacks run here
+        if self._launch_poll_scheduled:
+            return
+        self.sessions.dispatch()
+        if self.sessions.launching:
+            self._launch_poll_scheduled = True
+            self.after(LAUNCH_POLL_MS, self._launch_poll_tick)
+
+    def _launch_poll_tick(self):
+        self._launch_poll_scheduled = False
+        self._poll_launches()
 
     # ================= CLIENT UI & LOGIC =================
     def setup_client_ui(self):
@@ -355,11 +769,23 @@ class LANStreamerApp(ctk.CTk):
         # Header
         lbl_title_client = ctk.CTkLabel(client_content_frame, text="Connect to Remote Stream", font=("Segoe UI", 18, "bold"), text_color=self.custom_colors["blue_primary"])
         lbl_title_client.grid(row=0, column=0, columnspan=2, pady=(5, 5))
-        lbl_subtitle_client = ctk.CTkLabel(client_content_frame, text="Enter target details to start playback", font=("Segoe UI", 12), text_color=self.custom_colors["text_medium"])
-        lbl_subtitle_client.grid(row=1, column=0, columnspan=2, pady=(0, 25))
+        # Streams announced over SAP fill in the fields below when picked
+        self.menu_discovered = ctk.CTkOptionMenu(client_content_frame, 
+            values=[DISCOVERY_EMPTY_TEXT],
+            command=self._use_discovered_stream,
+            fg_color=self.custom_colors["ip_bg_start"],
+            button_color=self.custom_colors["ip_bg_start"],
+            button_hover_color=self.custom_colors["ip_bg_end"],
+            text_color=self.custom_colors["ip_text"],
+            font=("Segoe UI", 13),
+            dropdown_font=("Segoe UI", 13),
+            corner_radius=12,
+            height=36
+        )
+        self.menu_discovered.grid(row=1, column=0, columnspan=2, pady=(0, 20), sticky="ew")
 
         # Server IP Input
-        lbl_server_ip_client = ctk.CTkLabel(client_content_frame, text=f"Target IP Address (Use {MULTICAST_IP} for RTP)", font=("Segoe UI", 12), text_color=self.custom_colors["text_medium"], anchor="w")
+        lbl_server_ip_client = ctk.CTkLabel(client_content_frame, text="Target IP Address (the stream's multicast group for RTP)", font=("Segoe UI", 12), text_color=self.custom_colors["text_medium"], anchor="w")
         lbl_server_ip_client.grid(row=2, column=0, columnspan=2, sticky="w", pady=(5, 2))
         self.entry_server_ip = ctk.CTkEntry(client_content_frame, 
             placeholder_text="e.g., 192.168.8.xxx (for UDP/HTTP) or 239.255.1.1 (for RTP)",
@@ -385,7 +811,7 @@ class LANStreamerApp(ctk.CTk):
         
         # Protocol Combobox (Row 5, Column 0)
         self.combo_client_proto = ctk.CTkComboBox(client_content_frame, 
-            values=["HTTP", "RTP", "UDP"], # RTSP REMOVED HERE
+            values=CLIENT_PROTOCOLS, # RTSP REMOVED HERE
             corner_radius=12, 
             height=40,
             fg_color=self.custom_colors["input_bg"],
@@ -398,7 +824,7 @@ class LANStreamerApp(ctk.CTk):
             text_color=self.custom_colors["text_dark"]
         )
         self.combo_client_proto.set("HTTP") 
-        self.combo_client_proto.grid(row=5, column=0, pady=(0, 30), sticky="ew", padx=(0, 10))
+        self.combo_client_proto.grid(row=5, column=0, pady=(0, 15), sticky="ew", padx=(0, 10))
         
         # Port Entry (Row 5, Column 1)
         self.entry_client_port = ctk.CTkEntry(client_content_frame, 
@@ -412,11 +838,49 @@ class LANStreamerApp(ctk.CTk):
             text_color=self.custom_colors["text_dark"]
         )
         self.entry_client_port.insert(0, "8000") 
-        self.entry_client_port.grid(row=5, column=1, pady=(0, 30), sticky="ew", padx=(10, 0))
+        self.entry_client_port.grid(row=5, column=1, pady=(0, 15), sticky="ew", padx=(10, 0))
 
         # --- End Parallel Layout ---
 
-        # Connect & Play Button (Row 6, Use columnspan=2)
+        # Latency mode (Row 6): tuned modes probe the stream and size VLC's caching to it
+        lbl_latency = ctk.CTkLabel(client_content_frame, text="Latency", font=("Segoe UI", 12), text_color=self.custom_colors["text_medium"], anchor="w")
+        lbl_latency.grid(row=6, column=0, sticky="w", pady=(0, 20), padx=(0, 10))
+        self.menu_latency = ctk.CTkOptionMenu(client_content_frame, 
+            values=list(LATENCY_MODES),
+            command=self._choose_latency,
+            fg_color=self.custom_colors["input_bg"],
+            button_color=self.custom_colors["input_border"],
+            button_hover_color=self.custom_colors["input_border"],
+            text_color=self.custom_colors["text_dark"],
+            font=("Segoe UI", 13),
+            corner_radius=12,
+            height=32
+        )
+        latency = self._load_config().get("client_latency", DEFAULT_LATENCY_MODE)
+        self.menu_latency.set(latency if latency in LATENCY_MODES else DEFAULT_LATENCY_MODE)
+        self.menu_latency.grid(row=6, column=1, pady=(0, 20), sticky="ew", padx=(10, 0))
+
+        # Timeshift option (Row 7): the stream goes through a local ring buffer the player can pause/rewind in
+        self.timeshift_var = ctk.BooleanVar(value=False)
+        self.chk_timeshift = ctk.CTkCheckBox(client_content_frame,
+            text=f"Timeshift: pause, rewind and save the last {TIMESHIFT_MINUTES} min",
+            variable=self.timeshift_var,
+            font=("Segoe UI", 12),
+            text_color=self.custom_colors["text_medium"]
+        )
+        self.chk_timeshift.grid(row=7, column=0, columnspan=2, pady=(0, 5), sticky="w")
+
+        # FEC option (Row 8): repair an RTP/UDP stream from its parity before VLC sees it
+        self.client_fec_var = ctk.BooleanVar(value=False)
+        self.chk_client_fec = ctk.CTkCheckBox(client_content_frame,
+            text="Forward error correction (the server must send FEC)",
+            variable=self.client_fec_var,
+            font=("Segoe UI", 12),
+            text_color=self.custom_colors["text_medium"]
+        )
+        self.chk_client_fec.grid(row=8, column=0, columnspan=2, pady=(0, 15), sticky="w")
+
+        # Connect & Play Button (Row 9, Use columnspan=2)
         self.btn_connect = ctk.CTkButton(client_content_frame, 
             text="🔗 CONNECT & PLAY", 
             fg_color=self.custom_colors["connect_play_fg"],
@@ -427,96 +891,374 @@ class LANStreamerApp(ctk.CTk):
             font=("Segoe UI", 16, "bold"),
             text_color="#FFFFFF"
         )
-        self.btn_connect.grid(row=6, column=0, columnspan=2, pady=(0, 10), sticky="ew")
+        self.btn_connect.grid(row=9, column=0, columnspan=2, pady=(0, 10), sticky="ew")
         
-        # Stop Playback Button (Row 7, Use columnspan=2)
+        # Stop Playback Button (Row 10, Use columnspan=2)
         self.btn_stop_client = ctk.CTkButton(client_content_frame, 
             text="⏹️ STOP PLAYBACK", 
             fg_color=self.custom_colors["stop_stream_fg"], 
             hover_color=self.custom_colors["hover_stop"],
             corner_radius=15, 
             state="disabled", 
-            command=self.stop_vlc,
+            command=self.stop_client,
             height=50,
             font=("Segoe UI", 16, "bold"),
             text_color="#FFFFFF"
         )
-        self.btn_stop_client.grid(row=7, column=0, columnspan=2, pady=(0, 0), sticky="ew")
+        self.btn_stop_client.grid(row=10, column=0, columnspan=2, pady=(0, 10), sticky="ew")
 
+        # Timeshift controls (Row 11): only live while a timeshift client plays
+        timeshift_frame = ctk.CTkFrame(client_content_frame, fg_color="transparent")
+        timeshift_frame.grid(row=11, column=0, columnspan=2, pady=(0, 10), sticky="ew")
+        timeshift_frame.grid_columnconfigure((0, 1, 2), weight=1)
+        self.timeshift_buttons = []
+        for column, (text, command) in enumerate((
+                (f"⏪ {TIMESHIFT_REWIND_SECONDS} S", self.rewind_client),
+                ("⏩ LIVE", self.client_to_live),
+                (f"💾 SAVE {TIMESHIFT_MINUTES} MIN", self.save_timeshift))):
+            button = ctk.CTkButton(timeshift_frame,
+                text=text,
+                fg_color="#F5F5F5",
+                hover_color="#E0E0E0",
+                text_color=self.custom_colors["text_dark"],
+                corner_radius=12,
+                state="disabled",
+                command=command,
+                height=32,
+                font=("Segoe UI", 12, "bold")
+            )
+            button.grid(row=0, column=column, padx=(0 if column == 0 else 5, 0), sticky="ew")
+            self.timeshift_buttons.append(button)
 
-    def connect_stream(self):
-        if not os.path.exists(self.vlc_path):
-            messagebox.showerror("Error", "VLC executable not found. Please ensure the path is set correctly in vlc_config.json, or install VLC at the default path.")
+        # Stream Health Analyzer (Row 12 toggle, Row 13 live readout)
+        self.btn_analyze = ctk.CTkButton(client_content_frame,
+            text="📊 ANALYZE STREAM",
+            fg_color="#F5F5F5",
+            hover_color="#DBEAFE",
+            text_color=self.custom_colors["text_dark"],
+            border_width=2,
+            border_color=self.custom_colors["input_border"],
+            corner_radius=15,
+            command=self.toggle_analyzer,
+            height=40,
+            font=("Segoe UI", 14, "bold")
+        )
+        self.btn_analyze.grid(row=12, column=0, columnspan=2, pady=(0, 5), sticky="ew")
+
+        self.lbl_analyzer = ctk.CTkLabel(client_content_frame,
+            text="",
+            text_color=self.custom_colors["text_medium"],
+            wraplength=480,
+            font=("Segoe UI", 11)
+        )
+        self.lbl_analyzer.grid(row=13, column=0, columnspan=2, sticky="w")
+        self.analyzer_session_id = None
+
+
+    def _start_directory(self):
+        # (Re)join the SAP group on the selected interface
+        if self.sap_directory:
+            self.sap_directory.stop()
+        try:
+            self.sap_directory = SapDirectory(interface=self.local_ip).start()
+        except OSError as e:
+            self.sap_directory = None
+            print(f"Stream discovery disabled: {e}")
+        self._directory_version = -1
+
+    def _refresh_discovered(self):
+        if not self.sap_directory or self.sap_directory.version == self._directory_version:
+            return
+        self._directory_version = self.sap_directory.version
+        self.discovered_streams = group_ladders(self.sap_directory.streams())
+        labels = [_discovered_label(s) for s in self.discovered_streams]
+        self.menu_discovered.configure(values=labels or [DISCOVERY_EMPTY_TEXT])
+        if not labels:
+            self.menu_discovered.set(DISCOVERY_EMPTY_TEXT)
+        elif self.menu_discovered.get() not in labels:
+            self.menu_discovered.set(f"📡 {len(labels)} stream(s) on the network - pick one")
+
+    def _use_discovered_stream(self, label):
+        labels = [_discovered_label(s) for s in self.discovered_streams]
+        if label not in labels:
             return
+        stream = self.discovered_streams[labels.index(label)]
+        self.selected_ladder = stream if "renditions" in stream else None
+        self.entry_server_ip.delete(0, "end")
+        self.entry_server_ip.insert(0, stream["ip"])
+        self.combo_client_proto.set(stream["protocol"])
+        self.entry_client_port.delete(0, "end")
+        self.entry_client_port.insert(0, str(stream["port"]))
+        self.client_fec_var.set(bool(stream.get("fec")))
 
+    def _build_client_url(self):
+        # Returns (url, ip, port, protocol) for the client tab inputs, or None
         ip = self.entry_server_ip.get().strip()
         port = self.entry_client_port.get()
         protocol = self.combo_client_proto.get()
         
         if not ip:
             messagebox.showwarning("Input", "Please enter the Target IP address.")
-            return
+            return None
 
         if not port:
             messagebox.showwarning("Input", "Please enter the Port number.")
-            return
+            return None
 
         # --- Client URL Construction ---
-        if protocol == "HTTP":
-            url = f"http://{ip}:{port}/"
-            
-        # RTSP case removed
-            
-        elif protocol == "RTP" or protocol == "UDP":
-            # RTP/UDP requires the listener format: protocol://@IP:Port
-            url = f"{protocol.lower()}://@{ip}:{port}" 
-            
-        else:
+        try:
+            url = client_url(protocol, ip, port)
+        except ValueError:
             messagebox.showwarning("Protocol Error", "Invalid protocol selected.")
-            return
+            return None
         # -------------------------------
+        return url, ip, port, protocol
 
-        print(f"Client Command: {self.vlc_path} {url}")
-        cmd_string = f'"{self.vlc_path}" "{url}"'
+    def connect_stream(self):
+        if not os.path.exists(self.vlc_path):
+            messagebox.showerror("Error", "VLC executable not found. Please ensure the path is set correctly in vlc_config.json, or install VLC at the default path.")
+            return
+
+        target = self._build_client_url()
+        if not target:
+            return
+        url, ip, port, protocol = target
+
+        vlc_path = self.vlc_path
+        latency = self.menu_latency.get()
+        timeshift = TIMESHIFT_MINUTES if self.timeshift_var.get() else None
+        fec = self.client_fec_var.get()
+        if fec and protocol not in ("RTP", "UDP"):
+            messagebox.showerror("Error", "Forward error correction works on RTP and UDP streams.")
+            return
+        # A picked ladder plays the rendition its throughput allows, unless the fields were edited since
+        ladder = self.selected_ladder
+        if ladder and (ladder["ip"], str(ladder["port"]), ladder["protocol"]) != (ip, port, protocol):
+            ladder = None
+        # (HTTP ladder renditions are TS under their own path, unlike plain HTTP's MKV)
+        if timeshift and not timeshift_supported(protocol, ladder["renditions"][0]["path"] if ladder else ""):
+            messagebox.showerror("Error", f"Timeshift works on live {', '.join(TIMESHIFT_PROTOCOLS)} streams "
+                                          f"and ladder renditions, not {protocol}.")
+            return
+        if ladder and fec:
+            messagebox.showerror("Error", "Bitrate ladders are sent without forward error correction.")
+            return
+        self.btn_connect.configure(state="disabled")
+        if ladder:
+            self.status_label.configure(text=f"STATUS: Measuring throughput for {ladder['name']}...", text_color=self.custom_colors["text_medium"])
+            self.sessions.launch(lambda: start_ladder_client(self.sessions, protocol, ladder["renditions"], vlc_path,
+                                                             latency, timeshift),
+                                 self._on_client_started)
+            self._poll_launches()
+            return
+        if LATENCY_MODES.get(latency):
+            self.status_label.configure(text=f"STATUS: Measuring {ip}:{port} for {latency}...", text_color=self.custom_colors["text_medium"])
+        # The latency probe listens to the stream for a moment: off the Tk thread
+        self.sessions.launch(lambda: start_client(self.sessions, protocol, ip, port, vlc_path, latency, timeshift,
+                                                  fec=fec),
+                             self._on_client_started)
+        self._poll_launches()
+
+    def _on_client_started(self, session, error):
+        if error is not None:
+            self._reset_client_ui()
+            if isinstance(error, FileNotFoundError):
+                messagebox.showerror("Error", "VLC not found! Check the path in the settings.")
+            elif isinstance(error, ImportError):
+                messagebox.showerror("Error", "Forward error correction needs NumPy (pip install numpy).")
+            else:
+                messagebox.showerror("Error", f"Could not start VLC: {error}")
+            return
+
+        self.client_session_id = session.id
+        self.status_dot.configure(text_color=self.custom_colors["connect_play_fg"])
+        record = session.details.get("latency")
+        caching = f" (caching {record['network_caching_ms']} ms)" if record and record["network_caching_ms"] is not None else ""
+        rendition = session.details.get("rendition")
+        if rendition:
+            caching += f" [{rendition['name']}, measured {rendition['throughput_kbps']} kb/s]"
+        if "fec" in session.details:
+            caching += " + FEC"
+        self.status_label.configure(text=f"STATUS: Client Connected to {session.target}{caching}", text_color=self.custom_colors["text_dark"])
+        self.btn_connect.configure(state="disabled")
+        self.btn_stop_client.configure(state="normal")
+        if "timeshift" in session.details:
+            for button in self.timeshift_buttons:
+                button.configure(state="normal")
 
+    def _client_timeshift(self):
+        session = self.sessions.get(self.client_session_id) if self.client_session_id else None
+        return session if session and session.alive and "timeshift" in session.details else None
+
+    def rewind_client(self):
+        session = self._client_timeshift()
+        if session:
+            # From wherever the player is now, not from the live edge
+            back = session.details["timeshift"].behind() + TIMESHIFT_REWIND_SECONDS
+            if not seek_client(session, back):
+                messagebox.showwarning("Timeshift", "The player didn't answer; is VLC still open?")
+
+    def client_to_live(self):
+        session = self._client_timeshift()
+        if session and not seek_client(session, 0):
+            messagebox.showwarning("Timeshift", "The player didn't answer; is VLC still open?")
+
+    def save_timeshift(self):
+        session = self._client_timeshift()
+        if not session:
+            return
+        timeshift = session.details["timeshift"]
+
+        def saved(result, error):
+            if error is not None:
+                messagebox.showerror("Error", f"Could not save the recording: {error}")
+            else:
+                messagebox.showinfo("Timeshift", f"Saved the last {result['seconds']:.0f} s to {result['path']}")
+
+        # Copying a few hundred MB can take a moment: off the Tk thread
+        self.sessions.launch(lambda: timeshift.save(TIMESHIFT_MINUTES * 60), saved)
+        self._poll_launches()
+
+    def toggle_analyzer(self):
+        if self.analyzer_session_id:
+            self.sessions.stop(self.analyzer_session_id)
+            self.analyzer_session_id = None
+            self.btn_analyze.configure(text="📊 ANALYZE STREAM")
+            return
+
+        target = self._build_client_url()
+        if not target:
+            return
+        url, ip, port, protocol = target
         try:
-            self.process = subprocess.Popen(cmd_string, shell=True)
-            
-            self.status_dot.configure(text_color=self.custom_colors["connect_play_fg"])
-            self.status_label.configure(text=f"STATUS: Client Connected to {ip}:{port}", text_color=self.custom_colors["text_dark"])
-            self.btn_connect.configure(state="disabled")
-            self.btn_stop_client.configure(state="normal")
+            # NumPy is only needed here, so it's imported on demand
+            from stream_analyzer import StreamAnalyzer
+            analyzer = StreamAnalyzer(url).start()
+        except ImportError:
+            messagebox.showerror("Error", "The stream analyzer needs NumPy (pip install numpy).")
+            return
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not open {url} for analysis: {e}")
+            return
 
-        except FileNotFoundError:
-            messagebox.showerror("Error", "VLC not found! Check the path in the settings.")
+        session = self.sessions.start("analyzer", protocol, url, services=[analyzer])
+        self.analyzer_session_id = session.id
+        self.btn_analyze.configure(text="⏹️ STOP ANALYZER")
+        self.lbl_analyzer.configure(text="Waiting for data...")
+
+    def _refresh_analyzer_label(self):
+        session = self.sessions.get(self.analyzer_session_id) if self.analyzer_session_id else None
+        if not session or not session.services:
+            return
+        from stream_analyzer import summarize
+        self.lbl_analyzer.configure(text=summarize(session.services[0].last_report))
 
     # ================= SHARED LOGIC =================
+    def stop_server(self):
+        if self.server_session_id:
+            # Only this session's process tree is stopped; other VLCs are left alone
+            self.watchdog.unwatch(self.server_session_id)
+            self.sessions.stop(self.server_session_id)
+            self.server_session_id = None
+        self._reset_server_ui()
+
+    def stop_client(self):
+        if self.client_session_id:
+            self.sessions.stop(self.client_session_id)
+            self.client_session_id = None
+        self._reset_client_ui()
+
     def stop_vlc(self):
-        # NOTE: This implementation uses taskkill /IM vlc.exe /F 
-        # which will kill ALL running VLC instances, not just the one started by this app.
-        if self.process:
-            try:
-                # Kills all processes named vlc.exe
-                subprocess.call("taskkill /IM vlc.exe /F", shell=True)
-            except Exception:
-                pass 
-            self.process = None
-            
+        self.stop_server()
+        self.stop_client()
+
+    def _reset_server_ui(self):
         if hasattr(self, 'lbl_stream_status'):
             self.lbl_stream_status.configure(text="STATUS: OFFLINE", text_color=self.custom_colors["stop_stream_fg"])
-
-        self.status_dot.configure(text_color=self.custom_colors["stop_stream_fg"])
-        self.status_label.configure(text="STATUS: OFFLINE", text_color=self.custom_colors["text_medium"])
-        
+        if self.selected_files:
+            self._show_selection()
         self.btn_start_server.configure(state="normal")
         self.btn_stop_server.configure(state="disabled")
+        self._refresh_status_bar()
+
+    def _reset_client_ui(self):
         self.btn_connect.configure(state="normal")
         self.btn_stop_client.configure(state="disabled")
+        for button in self.timeshift_buttons:
+            button.configure(state="disabled")
+        self._refresh_status_bar()
+
+    def _refresh_status_bar(self):
+        # Footer reflects whatever is still running after a stop/exit
+        server = self.sessions.get(self.server_session_id) if self.server_session_id else None
+        client = self.sessions.get(self.client_session_id) if self.client_session_id else None
+        if server and (server.alive or self.watchdog.restarting(server.id)):
+            self.status_dot.configure(text_color=self.custom_colors["start_stream_fg"])
+            self.status_label.configure(text=f"STATUS: Streaming via {server.protocol} to {server.target}", text_color=self.custom_colors["text_dark"])
+        elif client and client.alive:
+            self.status_dot.configure(text_color=self.custom_colors["connect_play_fg"])
+            self.status_label.configure(text=f"STATUS: Client Connected to {client.target}", text_color=self.custom_colors["text_dark"])
+        else:
+            self.status_dot.configure(text_color=self.custom_colors["stop_stream_fg"])
+            self.status_label.configure(text="STATUS: OFFLINE", text_color=self.custom_colors["text_medium"])
+
+    def _refresh_now_playing(self):
+        # Playlist streams: current item and how long the last switch took
+        session = self.sessions.get(self.server_session_id) if self.server_session_id else None
+        feed = session.details.get("playlist") if session else None
+        if not feed or not feed.current:
+            return
+        index, name = feed.current
+        text = f"{index + 1}/{len(feed.items)}: {name}"
+        if feed.transitions:
+            text += f" (last switch {feed.transitions[-1]['stall_ms']} ms)"
+        self._show_selection(now_playing=text)
+
+    def _poll_sessions(self):
+        # Runs on the Tk thread; reap() never blocks
+        for session in self.sessions.reap():
+            if session.id == self.server_session_id:
+                if self.watchdog.restarting(session.id):
+                    continue        # _refresh_restart() shows it
+                self.server_session_id = None
+                self._reset_server_ui()
+            elif session.id == self.client_session_id:
+                self.client_session_id = None
+                self._reset_client_ui()
+        self._refresh_analyzer_label()
+        self._refresh_now_playing()
+        self._refresh_stall_warning()
+        self._refresh_restart()
+        if self.interfaces.poll():
+            self._refresh_interfaces()
+        self._refresh_discovered()
+        self.after(SESSION_POLL_MS, self._poll_sessions)
 
     def on_close(self):
-        self.stop_vlc()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        self.watchdog.stop()
+        self.metrics.stop()
+        self.sessions.shutdown()
+        self.interfaces.close()
+        if self.sap_directory:
+            self.sap_directory.stop()
+        if self.library:
+            self.library.close()
         self.destroy()
 
+def _discovered_label(stream):
+    if "renditions" in stream:
+        return f"📡 {stream['name']}  ({stream['protocol']} ladder, {len(stream['renditions'])} renditions)"
+    return f"📡 {stream['name']}  ({stream['protocol']} {stream['ip']}:{stream['port']})"
+
+def _rendition_label(rendition, measured):
+    # Planned cost, and what ladder.py measured for it where available
+    text = f"{rendition.name} ~{rendition.cost:.2f} cores"
+    if rendition.name in measured:
+        text += f" ({measured[rendition.name]:.0f}% measured)"
+    return text
+
 if __name__ == "__main__":
     app = LANStreamerApp()
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,521 @@
+"""
+Client-side timeshift for VLC Stream Hub.
+
+A Timeshift receives a live stream once (udp://@, rtp://@ or http://) and
+writes it into a fixed-size ring file that is memory-mapped, so it holds the
+last TIMESHIFT_MINUTES of the stream (at up to TIMESHIFT_MAX_MBPS) and never
+more, however long the session runs. The local player reads it back over
+HTTP on 127.0.0.1:
+
+  GET  /live.ts            from the live edge
+  GET  /live.ts?back=90    from 90 seconds behind it
+  GET  /status             window, live edge and where the player is (JSON)
+  POST /save?seconds=300   write the last 5 minutes to a .ts file
+
+A player that pauses just stops reading: its place in the ring is kept and
+playback resumes there, as long as it is still inside the window (if not,
+it moves up to the oldest data). Rewinding and going back to live reopen
+the URL with another ?back= through the player's rc interface. Saving copies
+straight from the ring file into the new one (copy_file_range/sendfile
+where the OS has them), never through a Python-side copy of the buffer.
+
+  python timeshift.py rtp://@239.255.1.17:5004 --minutes 5 --port 8470
+"""
+import argparse
+import bisect
+import collections
+import json
+import mmap
+import os
+import socket
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+from file_server import CappedHTTPServer
+from mpegts import TS_PACKET_SIZE, TS_SYNC_BYTE, find_sync, mark_discontinuity, parse_rtp_header
+from multicast_pool import join_group
+
+# --- TIMESHIFT CONFIGURATION ---
+TIMESHIFT_MINUTES = 10
+TIMESHIFT_MAX_MBPS = 12.0            # sizes the ring: 10 min at 12 Mbit/s = 900 MB of disk
+TIMESHIFT_DIR = None                 # ring file location (None: the system temp dir)
+TIMESHIFT_SAVE_DIR = "recordings"
+TIMESHIFT_INDEX_SECONDS = 0.5        # time -> position granularity for seeking
+TIMESHIFT_READ_SIZE = 256 * 1024
+TIMESHIFT_GUARD = 2 * 1024 * 1024    # readers keep this far from the oldest (being overwritten) edge
+TIMESHIFT_MAX_CONNECTIONS = 4
+TIMESHIFT_RECONNECT_SECONDS = 1.0    # HTTP source dropped: try again after this long
+TIMESHIFT_RCVBUF = 4 * 1024 * 1024
+TIMESHIFT_SCHEMES = ("udp", "rtp", "http")
+TIMESHIFT_HTTP_HEADER_MAX = 64 * 1024
+TIMESHIFT_SYNC_SEARCH_BYTES = 1024 * 1024    # no TS sync in this much: not an MPEG-TS stream
+# Live TS only: not HLS or Direct HTTP files, nor plain HTTP (MKV). A ladder
+# rendition is TS over HTTP, so HTTP with a rendition path is taken too.
+TIMESHIFT_PROTOCOLS = ("HTTP Relay", "RTP", "UDP")
+
+
+def timeshift_supported(protocol, path=""):
+    return protocol in TIMESHIFT_PROTOCOLS or (protocol == "HTTP" and bool(path))
+
+
+class RingFile:
+    """Fixed-size, memory-mapped ring of TS packets with a time index.
+
+    Positions are absolute byte counts since the start (they grow forever;
+    the byte lives at pos % size while pos >= oldest). One writer, any
+    number of readers.
+    """
+
+    def __init__(self, size, directory=TIMESHIFT_DIR, index_entries=4096):
+        size -= size % TS_PACKET_SIZE
+        if size < 2 * TIMESHIFT_GUARD:
+            raise ValueError("Timeshift buffer is too small")
+        self.size = size
+        # Deleted as soon as it's closed (on POSIX, already unlinked now)
+        self._file = tempfile.TemporaryFile(prefix="timeshift-", suffix=".ts", dir=directory)
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self.head = 0                   # bytes written so far
+        self._index = collections.deque(maxlen=index_entries)     # (wall time, pos), oldest first
+        self._cond = threading.Condition()
+        self.closed = False
+
+    @property
+    def oldest(self):
+        return max(0, self.head - self.size)
+
+    @property
+    def first_readable(self):
+        # Oldest position a reader may start from, clear of the writer
+        head = self.head
+        if head <= self.size - TIMESHIFT_GUARD:
+            return 0
+        start = head - self.size + TIMESHIFT_GUARD
+        return start + (-start % TS_PACKET_SIZE)
+
+    def write(self, data):
+        # data: whole TS packets, shorter than the guard
+        n = len(data)
+        if not n or self.closed:
+            return
+        offset = self.head % self.size
+        first = min(n, self.size - offset)
+        self._map[offset:offset + first] = data[:first]
+        if first < n:
+            self._map[0:n - first] = data[first:]
+        now = time.time()
+        with self._cond:
+            if not self._index or now - self._index[-1][0] >= TIMESHIFT_INDEX_SECONDS:
+                self._index.append((now, self.head))
+            self.head += n
+            oldest = self.oldest
+            while self._index and self._index[0][1] < oldest:
+                self._index.popleft()
+            self._cond.notify_all()
+
+    def read(self, pos, size=TIMESHIFT_READ_SIZE, timeout=1.0):
+        # -> (data, next pos, skipped). Waits up to timeout for data past
+        # pos; data is None once the ring is closed. A reader left behind
+        # the window is moved up to its oldest data (skipped=True).
+        with self._cond:
+            if pos >= self.head and not self.closed:
+                self._cond.wait(timeout)
+            if self.closed:
+                return None, pos, False
+            skipped = pos < self.first_readable
+            if skipped:
+                pos = self.first_readable
+            end = min(self.head, pos + size)
+        if end <= pos:
+            return b"", pos, skipped
+        offset = pos % self.size
+        first = min(end - pos, self.size - offset)
+        data = self._map[offset:offset + first]
+        if first < end - pos:
+            data += self._map[0:end - pos - first]
+        if pos < self.head - self.size:
+            # Overwritten while we copied it (only possible if we stalled for a long time)
+            data, end, _ = self.read(self.first_readable, size, 0)
+            return data, end, True
+        return data, end, skipped
+
+    def position(self, back=0.0):
+        # Position of the data received back seconds ago, on a packet boundary
+        if back <= 0:
+            return self.head
+        target = time.time() - back
+        with self._cond:
+            times = [t for t, _ in self._index]
+            k = bisect.bisect_right(times, target) - 1
+            pos = self._index[max(k, 0)][1] if self._index else 0
+        return max(pos, self.first_readable)
+
+    def time_at(self, pos):
+        # Wall time the data at pos arrived (to TIMESHIFT_INDEX_SECONDS), or None
+        with self._cond:
+            positions = [p for _, p in self._index]
+            k = bisect.bisect_right(positions, pos) - 1
+            return self._index[k][0] if k >= 0 else None
+
+    def save(self, path, seconds):
+        # Writes the last seconds of the ring to path -> (bytes, seconds covered)
+        start = self.position(seconds)
+        end = self.head
+        started_at = self.time_at(start)
+        with open(path, "wb") as out:
+            pos = start
+            while pos < end:
+                offset = pos % self.size
+                count = min(end - pos, self.size - offset)
+                _copy_range(self._file, self._map, out, offset, count)
+                pos += count
+        if start < self.head - self.size:
+            print(f"Timeshift: the start of {path} was overwritten while saving")  # For debugging
+        return end - start, round(time.time() - started_at, 1) if started_at else 0.0
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self._map.close()
+        self._file.close()
+
+
+def _copy_range(src, src_map, out, offset, count):
+    # Kernel-side copy from the ring file where possible; otherwise straight
+    # from the mapping (a memoryview slice, so still no copy of the buffer)
+    out.flush()
+    if hasattr(os, "copy_file_range"):
+        try:
+            while count > 0:
+                done = os.copy_file_range(src.fileno(), out.fileno(), count, offset)
+                if done <= 0:
+                    break
+                offset += done
+                count -= done
+            if count <= 0:
+                return
+        except OSError:
+            pass        # e.g. across filesystems on older kernels
+    if hasattr(os, "sendfile") and os.name != "nt":
+        try:
+            while count > 0:
+                done = os.sendfile(out.fileno(), src.fileno(), offset, count)
+                if done <= 0:
+                    break
+                offset += done
+                count -= done
+            if count <= 0:
+                return
+        except OSError:
+            pass
+    with memoryview(src_map) as view:
+        out.write(view[offset:offset + count])
+
+
+class _TimeshiftRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"
+    server_version = "VLCStreamHub"
+    # No socket timeout: a paused player stops reading for as long as it likes
+    timeout = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path, params = self._parse()
+        timeshift = self.server.timeshift
+        if path == "/live.ts":
+            try:
+                back = float(params.get("back", ["0"])[0])
+            except ValueError:
+                self.send_error(400, "back= takes seconds")
+                return
+            self._stream(timeshift, back)
+        elif path == "/status":
+            self._json(timeshift.status())
+        else:
+            self.send_error(404, "Not found")
+
+    def do_POST(self):
+        path, params = self._parse()
+        if path != "/save":
+            self.send_error(404, "Not found")
+            return
+        try:
+            seconds = float(params.get("seconds", [str(TIMESHIFT_MINUTES * 60)])[0])
+            self._json(self.server.timeshift.save(seconds))
+        except (OSError, ValueError) as e:
+            self.send_error(500, f"Could not save: {e}")
+
+    def _parse(self):
+        parts = urlsplit(self.path)
+        return parts.path, parse_qs(parts.query)
+
+    def _json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, timeshift, back):
+        self.send_response(200)
+        self.send_header("Content-Type", "video/MP2T")
+        self.send_header("Cache-Control", "no-cache, no-store")
+        self.end_headers()
+        ring = timeshift.ring
+        pos = ring.position(back)
+        try:
+            while True:
+                data, pos, skipped = ring.read(pos)
+                if data is None:
+                    return
+                if not data:
+                    continue
+                if skipped:
+                    # Jumped ahead: tell the demuxer its counters restart here
+                    data = bytearray(data)
+                    mark_discontinuity(data)
+                    timeshift.stats["skipped"] += 1
+                self.wfile.write(data)
+                timeshift.playing = pos
+        except (ConnectionError, OSError, ValueError):
+            pass        # player gone, or the ring was closed under us
+
+
+class _TimeshiftServer(CappedHTTPServer):
+    thread_name = "timeshift-http"
+
+    def __init__(self, timeshift, port=0, host="127.0.0.1"):
+        self.timeshift = timeshift
+        super().__init__(port, _TimeshiftRequestHandler, host, TIMESHIFT_MAX_CONNECTIONS)
+
+
+class Timeshift:
+    """Receives url into a RingFile and serves it to the local player.
+
+    A session service: start() opens the source and the local HTTP server
+    (errors surface there), stop() ends both and deletes the ring file.
+    """
+
+    def __init__(self, url, minutes=TIMESHIFT_MINUTES, max_mbps=TIMESHIFT_MAX_MBPS, port=0,
+                 interface="0.0.0.0", directory=TIMESHIFT_DIR, save_dir=TIMESHIFT_SAVE_DIR):
+        parts = urlsplit(url)
+        self.url = url
+        self.scheme = parts.scheme.lower()
+        if self.scheme not in TIMESHIFT_SCHEMES or not parts.port:
+            raise ValueError(f"Timeshift needs a udp://@, rtp://@ or http:// stream URL, not {url}")
+        self.host = (parts.hostname or "").lstrip("@")
+        self.source_port = parts.port
+        self.path = parts.path or "/"
+        self.minutes = minutes
+        self.interface = interface
+        self.save_dir = save_dir
+        # The index covers the window four times over, for streams well below max_mbps
+        self.ring = RingFile(int(minutes * 60 * max_mbps * 1e6 / 8), directory,
+                             int(minutes * 60 / TIMESHIFT_INDEX_SECONDS) * 4)
+        self.port = port
+        self.playing = None             # ring position the player last read up to
+        self.stats = {"received": 0, "skipped": 0, "saves": 0}
+        self.error = None               # why receiving gave up, if it did
+        self._server = None
+        self._sock = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------- lifecycle (session manager service) ----------
+    def start(self):
+        try:
+            if self.scheme != "http":
+                self._sock = self._open_udp()
+            self._server = _TimeshiftServer(self, self.port).start()
+        except OSError:
+            self.stop()
+            raise
+        self.port = self._server.port
+        self._thread = threading.Thread(target=self._run, name=f"timeshift-{self.source_port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._sock:
+            self._sock.close()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        if self._server:
+            self._server.stop()
+        if not self.ring.closed:
+            self.ring.close()
+
+    def local_url(self, back=0):
+        return f"http://127.0.0.1:{self.port}/live.ts" + (f"?back={int(back)}" if back > 0 else "")
+
+    # ---------- player side ----------
+    def behind(self):
+        # Seconds the player is behind the live edge (0 if it's not reading yet)
+        if self.playing is None:
+            return 0.0
+        played = self.ring.time_at(self.playing)
+        return max(0.0, time.time() - played) if played else 0.0
+
+    def status(self):
+        ring = self.ring
+        oldest_time = ring.time_at(ring.first_readable)
+        return {
+            "source": self.url,
+            "buffer_bytes": ring.size,
+            "stored_bytes": ring.head - ring.oldest,
+            "window_seconds": round(time.time() - oldest_time, 1) if oldest_time else 0.0,
+            "behind_seconds": round(self.behind(), 1),
+            "error": self.error,
+            **self.stats,
+        }
+
+    def save(self, seconds, path=None):
+        # Last seconds of the stream as a .ts file -> {"path", "bytes", "seconds"}
+        if path is None:
+            os.makedirs(self.save_dir, exist_ok=True)
+            path = os.path.join(self.save_dir, time.strftime("timeshift-%Y%m%d-%H%M%S.ts"))
+        size, covered = self.ring.save(path, seconds)
+        self.stats["saves"] += 1
+        print(f"Timeshift: saved {covered} s ({size / 1e6:.1f} MB) to {path}")  # For debugging
+        return {"path": os.path.abspath(path), "bytes": size, "seconds": covered}
+
+    # ---------- receiving ----------
+    def _open_udp(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, TIMESHIFT_RCVBUF)
+        try:
+            if self.host and socket.inet_aton(self.host)[0] >> 4 == 0xE:     # 224.0.0.0/4
+                join_group(sock, self.host, self.source_port, self.interface)
+            else:
+                sock.bind((self.host, self.source_port))
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(0.5)
+        return sock
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.scheme == "http":
+                    self._receive_http()
+                else:
+                    self._receive_udp()
+                    return
+            except OSError as e:
+                if self._stop.is_set():
+                    return
+                print(f"Timeshift: source lost ({e}), reconnecting")  # For debugging
+            except ValueError as e:
+                # Not a TS stream: reconnecting won't change that
+                self.error = str(e)
+                print(f"Timeshift: {e}")  # For debugging
+                return
+            self._stop.wait(TIMESHIFT_RECONNECT_SECONDS)
+
+    def _receive_udp(self):
+        buf = bytearray(65536)
+        view = memoryview(buf)
+        rtp = self.scheme == "rtp"
+        while not self._stop.is_set():
+            try:
+                n = self._sock.recv_into(buf)
+            except socket.timeout:
+                continue
+            start = 0
+            if rtp:
+                header = parse_rtp_header(view[:n])
+                if header is None:
+                    continue
+                start = header[3]
+            whole = (n - start) // TS_PACKET_SIZE * TS_PACKET_SIZE
+            if whole and buf[start] == TS_SYNC_BYTE:
+                self.ring.write(view[start:start + whole])
+                self.stats["received"] += whole
+
+    def _receive_http(self):
+        # pending only ever holds the unread tail: the response header, under
+        # three packets while hunting for sync, under one once synced
+        with socket.create_connection((self.host, self.source_port), timeout=5.0) as sock:
+            sock.sendall(f"GET {self.path} HTTP/1.0\r\nHost: {self.host}:{self.source_port}\r\n\r\n".encode())
+            sock.settimeout(0.5)
+            pending = bytearray()
+            header_done = False
+            searched = 0            # bytes dropped while looking for sync
+            while not self._stop.is_set():
+                try:
+                    chunk = sock.recv(TIMESHIFT_READ_SIZE)
+                except socket.timeout:
+                    continue
+                if not chunk:
+                    raise ConnectionError("server closed the stream")
+                pending += chunk
+                if not header_done:
+                    end = pending.find(b"\r\n\r\n")
+                    if end < 0:
+                        if len(pending) >= TIMESHIFT_HTTP_HEADER_MAX:
+                            raise ValueError(f"{self.url} sent no HTTP response header")
+                        continue
+                    del pending[:end + 4]
+                    header_done = True
+                if pending[:1] != bytes([TS_SYNC_BYTE]):
+                    pos = find_sync(pending)
+                    if pos < 0:
+                        # Keep only the bytes that could still start a sync run
+                        drop = max(0, len(pending) - 2 * TS_PACKET_SIZE)
+                        searched += drop
+                        if searched > TIMESHIFT_SYNC_SEARCH_BYTES:
+                            raise ValueError(f"{self.url} is not an MPEG-TS stream (no sync in {searched} bytes)")
+                        del pending[:drop]
+                        continue
+                    searched = 0
+                    del pending[:pos]
+                whole = len(pending) // TS_PACKET_SIZE * TS_PACKET_SIZE
+                if whole:
+                    self.ring.write(pending[:whole])
+                    self.stats["received"] += whole
+                    del pending[:whole]
+
+
+def vlc_rc(port, command, host="127.0.0.1", timeout=1.0):
+    # One command on a VLC's rc interface; False if VLC doesn't answer
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(command.encode() + b"\n")
+        return True
+    except OSError:
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Timeshift buffer for a live stream")
+    parser.add_argument("url", help="udp://@ip:port, rtp://@ip:port or http://ip:port/")
+    parser.add_argument("--minutes", type=float, default=TIMESHIFT_MINUTES)
+    parser.add_argument("--max-mbps", type=float, default=TIMESHIFT_MAX_MBPS)
+    parser.add_argument("--port", type=int, default=0, help="local HTTP port for the player")
+    parser.add_argument("--interface", default="0.0.0.0", help="local address to join multicast on")
+    args = parser.parse_args(argv)
+    timeshift = Timeshift(args.url, args.minutes, args.max_mbps, args.port, args.interface).start()
+    print(f"Timeshift: {args.url} -> {timeshift.local_url()} "
+          f"({timeshift.ring.size / 1e6:.0f} MB ring, Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+            print(json.dumps(timeshift.status()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        timeshift.stop()
+
+
+if __name__ == "__main__":
+    main()
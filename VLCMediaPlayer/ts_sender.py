@@ -0,0 +1,264 @@
+"""
+Native paced MPEG-TS sender for the UDP and RTP modes.
+
+Reads a TS file (or the stdout of a VLC remux) and sends it as 7x188-byte
+datagrams, spaced out by the stream's own PCR clock instead of in bursts.
+Datagrams that fall due together are handed to the kernel in one call
+(UDP GSO on Linux), so a channel costs a few hundred syscalls per second
+rather than one per packet. No display, no decoder.
+"""
+import argparse
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+from mpegts import (PCR_HZ, RTP_CLOCK_HZ, TS_DATAGRAM_SIZE, TS_PACKET_SIZE, TS_SYNC_BYTE,
+                    find_sync, packet_pcr, packet_pid, pcr_delta, rtp_header)
+
+# --- SENDER CONFIGURATION ---
+SENDER_READ_SIZE = 64 * 1024
+SENDER_BATCH_WINDOW = 0.002          # datagrams due within this window go out together
+SENDER_MAX_BATCH = 48                # GSO limit is 64 segments / 64 KiB per call
+SENDER_MAX_LATE = 0.5                # further behind than this: re-anchor instead of bursting
+SENDER_MAX_PCR_GAP = PCR_HZ          # PCR jumps over 1 s are treated as discontinuities
+SENDER_MAX_PENDING = 2000            # datagrams held while waiting for a PCR
+SENDER_FALLBACK_BITRATE = 8_000_000  # used until/unless the stream gives us PCRs
+
+# Linux UDP generic segmentation offload (not exported by the socket module)
+SOL_UDP = 17
+UDP_SEGMENT = 103
+
+
+class TsSender:
+    def __init__(self, source, dest_ip, port, rtp=False, ttl=1, interface=None,
+                 fallback_bitrate=SENDER_FALLBACK_BITRATE):
+        # source: path to a .ts file, or a binary file object (e.g. a pipe)
+        self.source = source
+        self.dest = (dest_ip, int(port))
+        self.rtp = rtp
+        self.ttl = ttl
+        self.interface = interface
+        self.fallback_bitrate = fallback_bitrate
+
+        self.stats = {"datagrams": 0, "bytes": 0, "batches": 0, "late_resets": 0,
+                      "resyncs": 0, "pcr_pid": None}
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._sock = None
+        self._gso = sys.platform.startswith("linux")
+        self._rate = fallback_bitrate / 8      # bytes/s, refined from PCRs
+        self._rtp_seq = random.randrange(1 << 16)
+        self._rtp_ssrc = random.getrandbits(32)
+        self._rtp_ts0 = random.getrandbits(32)
+
+    # ---------- lifecycle (session manager service) ----------
+    def start(self):
+        self._sock = self._open_socket()
+        self._thread = threading.Thread(target=self.run, name=f"ts-sender-{self.dest[1]}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+
+    @property
+    def finished(self):
+        return self._thread is not None and not self._thread.is_alive()
+
+    def _open_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.ttl)
+        if self.interface:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+        return sock
+
+    # ---------- main loop ----------
+    def run(self):
+        if self._sock is None:
+            self._sock = self._open_socket()
+        f = open(self.source, "rb") if isinstance(self.source, (str, os.PathLike)) else self.source
+        try:
+            self._send_paced(self._paced(self._datagrams(f)))
+        except (OSError, ValueError):
+            # Pipe closed under us or socket gone: the session is over
+            if not self._stop.is_set():
+                raise
+        finally:
+            if f is not self.source:
+                f.close()
+            self._sock.close()
+
+    def _datagrams(self, f):
+        # Yields (datagram, pcr) with datagrams aligned on packet boundaries
+        buf = bytearray()
+        synced = False
+        pcr_pid = None
+        while not self._stop.is_set():
+            chunk = f.read(SENDER_READ_SIZE)
+            if not chunk:
+                break
+            buf += chunk
+            pos = 0
+            if not synced:
+                pos = find_sync(buf)
+                if pos < 0:
+                    del buf[:max(0, len(buf) - 2 * TS_PACKET_SIZE)]
+                    continue
+                synced = True
+
+            end = len(buf) - TS_DATAGRAM_SIZE
+            while pos <= end:
+                if buf[pos] != TS_SYNC_BYTE:
+                    self.stats["resyncs"] += 1
+                    synced = False
+                    break
+                pcr = None
+                for off in range(pos, pos + TS_DATAGRAM_SIZE, TS_PACKET_SIZE):
+                    if buf[off] != TS_SYNC_BYTE:
+                        break
+                    if pcr_pid is not None and packet_pid(buf, off) != pcr_pid:
+                        continue
+                    value = packet_pcr(buf, off)
+                    if value is not None:
+                        if pcr_pid is None:
+                            pcr_pid = self.stats["pcr_pid"] = packet_pid(buf, off)
+                        pcr = value
+                yield bytes(buf[pos:pos + TS_DATAGRAM_SIZE]), pcr
+                pos += TS_DATAGRAM_SIZE
+            del buf[:pos]
+
+        # Trailing whole packets at EOF
+        tail = len(buf) - len(buf) % TS_PACKET_SIZE
+        if synced and tail:
+            yield bytes(buf[:tail]), None
+
+    def _paced(self, datagrams):
+        # Yields (stream_time_seconds, datagram). Datagrams between two PCRs
+        # are spread evenly over the interval the PCRs describe.
+        pending = []
+        clock = 0.0
+        last_pcr = None
+
+        def spread(span):
+            nonlocal clock
+            n = len(pending)
+            for k, dg in enumerate(pending):
+                yield clock + span * (k + 1) / n, dg
+            clock += span
+            pending.clear()
+
+        for dg, pcr in datagrams:
+            pending.append(dg)
+            if pcr is None:
+                if len(pending) >= SENDER_MAX_PENDING:
+                    yield from spread(len(pending) * TS_DATAGRAM_SIZE / self._rate)
+                continue
+
+            if last_pcr is None:
+                # Nothing to measure against yet: send the lead-in at once
+                yield from spread(0.0)
+            else:
+                nbytes = len(pending) * TS_DATAGRAM_SIZE
+                delta = pcr_delta(pcr, last_pcr)
+                if 0 < delta <= SENDER_MAX_PCR_GAP:
+                    span = delta / PCR_HZ
+                    self._rate = nbytes / span
+                else:
+                    # Discontinuity (new file, PCR reset): keep the last rate
+                    span = nbytes / self._rate
+                yield from spread(span)
+            last_pcr = pcr
+
+        if pending:
+            yield from spread(len(pending) * TS_DATAGRAM_SIZE / self._rate)
+
+    def _send_paced(self, paced):
+        start = time.perf_counter()
+        batch = []
+        batch_t = 0.0
+        for t, dg in paced:
+            if self._stop.is_set():
+                return
+            due = start + t
+            now = time.perf_counter()
+            if due - now > SENDER_BATCH_WINDOW:
+                self._flush(batch, batch_t)
+                batch = []
+                time.sleep(due - now)
+            elif now - due > SENDER_MAX_LATE:
+                # We fell behind (stalled pipe, suspended VM): shift the
+                # timeline instead of blasting out the backlog
+                start += now - due
+                self.stats["late_resets"] += 1
+            if not batch:
+                batch_t = t
+            batch.append(dg)
+            if len(batch) >= SENDER_MAX_BATCH:
+                self._flush(batch, batch_t)
+                batch = []
+        self._flush(batch, batch_t)
+
+    def _flush(self, batch, t):
+        if not batch:
+            return
+        if self.rtp:
+            ts = self._rtp_ts0 + int(t * RTP_CLOCK_HZ)
+            framed = []
+            for dg in batch:
+                framed.append(rtp_header(self._rtp_seq, ts, self._rtp_ssrc))
+                framed.append(dg)
+                self._rtp_seq = (self._rtp_seq + 1) & 0xFFFF
+            segment = len(framed[0]) + len(framed[1])
+            payload = b"".join(framed)
+        else:
+            segment = len(batch[0])
+            payload = b"".join(batch)
+
+        self._sendto_batch(payload, segment, len(batch))
+        self.stats["datagrams"] += len(batch)
+        self.stats["bytes"] += len(payload)
+        self.stats["batches"] += 1
+
+    def _sendto_batch(self, payload, segment, count):
+        if self._gso and count > 1:
+            try:
+                self._sock.setsockopt(SOL_UDP, UDP_SEGMENT, segment)
+                self._sock.sendto(payload, self.dest)
+                return
+            except OSError:
+                # Kernel or NIC without GSO: fall back for good
+                self._gso = False
+        view = memoryview(payload)
+        for off in range(0, len(payload), segment):
+            self._sock.sendto(view[off:off + segment], self.dest)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Paced MPEG-TS UDP/RTP sender")
+    parser.add_argument("source", help="TS file to send, or - for stdin")
+    parser.add_argument("dest_ip")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--rtp", action="store_true", help="add RTP headers (payload type 33)")
+    parser.add_argument("--ttl", type=int, default=1)
+    parser.add_argument("--interface", help="local IPv4 address to send multicast from")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin.buffer if args.source == "-" else args.source
+    sender = TsSender(source, args.dest_ip, args.port, rtp=args.rtp, ttl=args.ttl,
+                      interface=args.interface)
+    try:
+        sender.run()
+    except KeyboardInterrupt:
+        pass
+    print(sender.stats)
+
+
+if __name__ == "__main__":
+    main()
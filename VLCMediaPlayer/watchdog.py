@@ -0,0 +1,276 @@
+"""
+Crash watchdog for VLC Stream Hub server sessions.
+
+A Watchdog thread keeps an eye on every server session it was asked to
+watch(): the VLC child exiting on its own (SessionManager.reap() reports
+that through on_exit) and the session's output, via the MetricsCollector's
+stall flag (a hung VLC). A failed session is started again under the same
+id, port and multicast groups (stream_launcher.restart_server): straight
+away the first time, then after 1, 2, 4 ... seconds while it keeps failing.
+
+Playback resumes near where it was instead of at the top of the file. The
+position comes from VLC's rc interface ("get_time") where the session has
+one, and is counted from the wall clock otherwise (the native sender's
+remux runs in real time); playlists resume at the item that was playing.
+
+Every restart is recorded with its cause and the measured downtime (from
+the failure until output flows again) in the session's details
+("restarts", exported by metrics.py) and in restarts.jsonl.
+"""
+import json
+import re
+import socket
+import threading
+import time
+
+from session_manager import STATE_STOPPED
+from stream_launcher import restart_server
+
+# --- WATCHDOG CONFIGURATION ---
+WATCHDOG_INTERVAL = 1.0              # seconds between position/output checks
+WATCHDOG_BACKOFF_BASE = 1.0          # first restart at once, then 1, 2, 4 ... seconds
+WATCHDOG_BACKOFF_MAX = 60.0
+WATCHDOG_STABLE_SECONDS = 120.0      # up this long: the next failure starts the backoff over
+WATCHDOG_END_MARGIN = 5.0            # failing this close to the end starts the file over
+WATCHDOG_UP_TIMEOUT = 30.0           # no output this long after a restart: downtime ends at the relaunch
+WATCHDOG_RC_TIMEOUT = 0.5            # per rc "get_time" query
+WATCHDOG_LOG_FILE = "restarts.jsonl"
+
+_RC_NUMBER = re.compile(rb"^(?:>\s*)?(-?\d+)\s*$", re.M)
+
+
+class _Watch:
+    # One watched session id, across its restarts
+    def __init__(self, session, now):
+        self.session_id = session.id
+        self.attempts = 0           # failures in a row (reset once the stream stays up)
+        self.cause = None           # set while the session is down
+        self.down_since = None      # monotonic
+        self.retry_at = None
+        self.record = None          # the last restart, until its downtime is known
+        self.running(session, now)
+
+    def running(self, session, now):
+        self.up_since = now
+        self.seconds = session.details.get("start_time", 0.0)
+        self.length = None
+        self.item = None
+        self.base = (now, self.seconds)    # position at a known time, for the wall-clock estimate
+        plan = session.details.get("plan")
+        if plan and plan.info:
+            self.length = plan.info.get("duration")
+
+    def failed(self, cause, down_since, now):
+        if now - self.up_since >= WATCHDOG_STABLE_SECONDS:
+            self.attempts = 0
+        self.cause = cause
+        if self.record is None:
+            self.down_since = down_since    # else the outage before the last restart never ended
+        self.retry_at = now + backoff(self.attempts)
+        self.attempts += 1
+
+    def resume_seconds(self):
+        # Near the end (or past it) the file starts over
+        if self.length and self.seconds >= self.length - WATCHDOG_END_MARGIN:
+            return 0.0
+        return self.seconds
+
+
+class Watchdog:
+    def __init__(self, sessions, collector=None, interval=WATCHDOG_INTERVAL, log_path=WATCHDOG_LOG_FILE):
+        # collector: the MetricsCollector, for stalls and for telling when
+        # the output is back; without one only exits are noticed
+        self.sessions = sessions
+        self.collector = collector
+        self.interval = interval
+        self.log_path = log_path
+        self.history = []           # every restart record, oldest first
+        self._watched = {}          # session id -> _Watch
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------- lifecycle ----------
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="watchdog", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+
+    def watch(self, session):
+        # Sessions without a VLC child (native playlists, .ts files sent
+        # from disk) can still stall; Direct HTTP has no output counter and
+        # is left alone in effect
+        with self._lock:
+            self._watched[session.id] = _Watch(session, time.monotonic())
+
+    def unwatch(self, session_id):
+        # Before a deliberate stop, so it isn't taken for a failure
+        with self._lock:
+            self._watched.pop(session_id, None)
+
+    def on_exit(self, session):
+        # SessionManager's on_exit hook: called from reap() (the Tk thread in
+        # the app), so it only takes note and wakes the watchdog thread
+        now = time.monotonic()
+        with self._lock:
+            watch = self._watched.get(session.id)
+            if not watch or watch.cause:
+                return
+            code = session.exit_code
+            watch.failed(f"killed by signal {-code}" if code and code < 0 else f"exited with code {code}", now, now)
+        print(f"Watchdog: {session.id} {watch.cause}")  # For debugging
+        self._wake.set()
+
+    # ---------- queries ----------
+    def restarting(self, session_id):
+        # -> (cause, attempt) while the session is down and due for a restart, else None
+        with self._lock:
+            watch = self._watched.get(session_id)
+            return (watch.cause, watch.attempts) if watch and watch.cause else None
+
+    # ---------- polling ----------
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self._next_wait())
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            self.poll()
+
+    def _next_wait(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [w.retry_at - now for w in self._watched.values() if w.cause]
+        return max(0.0, min(due + [self.interval]))
+
+    def poll(self):
+        with self._lock:
+            watches = list(self._watched.values())
+        for watch in watches:
+            now = time.monotonic()
+            session = self.sessions.get(watch.session_id)
+            if session is None:
+                self.unwatch(watch.session_id)
+            elif watch.cause is None:
+                if session.state == STATE_STOPPED:
+                    self.unwatch(watch.session_id)  # stopped by someone else
+                if not session.alive:
+                    continue                        # (an exit: on_exit is on its way)
+                self._track(watch, session, now)
+                self._check_output(watch, session, now)
+            elif not session.alive and now >= watch.retry_at:
+                self._restart(watch, session)
+
+    def _track(self, watch, session, now):
+        feed = session.details.get("playlist")
+        if feed:
+            watch.item = feed.current[0] if feed.current else watch.item
+            return
+        position = query_vlc_position(session.details["stats_port"]) if session.details.get("stats_port") else None
+        if position:
+            watch.seconds, length = position
+            watch.length = length or watch.length
+            watch.base = (now, watch.seconds)
+        else:
+            since, seconds = watch.base
+            watch.seconds = seconds + now - since
+
+    def _check_output(self, watch, session, now):
+        m = self.collector.get(session.id) if self.collector else None
+        if m and m.details is not session.details:
+            m = None                # still the failed run's metrics
+        if watch.record:
+            if m and m.out_kbps.latest:
+                self._finish(watch, now, True)
+            elif now - watch.up_since >= WATCHDOG_UP_TIMEOUT:
+                self._finish(watch, watch.up_since, False)
+        if m and m.stalled:
+            with self._lock:
+                watch.failed("output stalled", m.zero_since or now, now)
+            print(f"Watchdog: {session.id} output stalled, stopping it")  # For debugging
+            self.sessions.stop(session.id, grace=0)     # a hung VLC won't stop by itself
+
+    def _restart(self, watch, session):
+        seconds = None if "playlist" in session.details else round(watch.resume_seconds(), 1)
+        started = time.monotonic()
+        try:
+            new = restart_server(self.sessions, session, seconds, watch.item)
+        except Exception as e:
+            with self._lock:
+                watch.retry_at = time.monotonic() + backoff(watch.attempts)
+                watch.attempts += 1
+            print(f"Watchdog: restarting {session.id} failed: {e}")  # For debugging
+            return
+        now = time.monotonic()
+        with self._lock:
+            current = self._watched.get(session.id) is watch
+            if current:
+                record = {"session": session.id, "time": time.time(), "cause": watch.cause,
+                          "attempt": watch.attempts, "resume_seconds": seconds, "resume_item": watch.item,
+                          "restart_ms": round((now - started) * 1000), "downtime_seconds": None}
+                new.details["restarts"] = session.details.get("restarts", []) + [record]
+                if watch.record:
+                    self._finish(watch, started, False)    # the last restart never got output going
+                watch.record = record
+                watch.cause = None
+                watch.running(new, now)
+        if not current:
+            self.sessions.stop(new.id)  # stopped by the user while we were starting it
+            return
+        where = f"item {record['resume_item']}" if seconds is None else f"{seconds} s"
+        print(f"Watchdog: restarted {session.id} after {record['cause']} "
+              f"(attempt {record['attempt']}, resuming at {where})")  # For debugging
+        if self.collector is None:
+            self._finish(watch, now, False)
+
+    def _finish(self, watch, up_at, output_seen):
+        # Downtime: from the failure until output flowed again (or, if that
+        # can't be seen, until the relaunch)
+        record, watch.record = watch.record, None
+        record["downtime_seconds"] = round(up_at - watch.down_since, 2)
+        record["output_seen"] = output_seen
+        self.history.append(record)
+        print(f"Watchdog: {record['session']} down {record['downtime_seconds']} s ({record['cause']})")  # For debugging
+        log_restart(record, self.log_path)
+
+
+def backoff(attempts):
+    # Delay before restart number attempts + 1
+    return 0.0 if attempts == 0 else min(WATCHDOG_BACKOFF_MAX, WATCHDOG_BACKOFF_BASE * 2 ** (attempts - 1))
+
+
+def log_restart(record, path=WATCHDOG_LOG_FILE):
+    # One JSON line per restart, for reviewing a channel's failures
+    try:
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Could not record the restart in {path}: {e}")  # For debugging
+
+
+def query_vlc_position(port, host="127.0.0.1", timeout=WATCHDOG_RC_TIMEOUT):
+    # "get_time" and "get_length" on VLC's rc interface -> (seconds, length
+    # in seconds, 0 for live inputs), or None if VLC doesn't answer
+    data = b""
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(b"get_time\nget_length\n")
+            deadline = time.monotonic() + timeout
+            while len(_RC_NUMBER.findall(data)) < 2 and time.monotonic() < deadline:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+    except OSError:
+        return None
+    numbers = _RC_NUMBER.findall(data)
+    if len(numbers) < 2:
+        return None
+    return int(numbers[-2]), int(numbers[-1])